@@ -1,59 +1,146 @@
-from collections import defaultdict
-from itertools import cycle
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, cycle
+import heapq
+import io
+import math
+import mmap as mmap_module
+import os
+import random
 import re
+import struct
+import sys
+import tempfile
+import weakref
+import zlib
+
+from adder.utils import InvalidArgumentError, ParsingError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Digraph:
     def __init__(self):
         self.__edges = defaultdict(set)
         self.__edge_costs = dict()
+        # Number of edge endpoints at each node, a node exists while it has
+        # at least one edge
+        self.__node_refs = dict()
+        # Incremented on every mutation so derived data can detect staleness
+        self.version = 0
+        # Component labels by strong, dropped on every mutation
+        self.__components = {}
+        self.__listeners = []
+        # Optional Coordinates of the nodes
+        self.coordinates = None
 
     def get_nodes(self):
-        nodes = set(self.__edges.keys())
-        for edge in self.__edges.values():
-            for dest in edge:
-                nodes.add(dest)
+        return set(self.__node_refs)
+
+    def has_node(self, node):
+        return node in self.__node_refs
 
-        return nodes
+    def node_count(self):
+        return len(self.__node_refs)
+
+    def edge_count(self):
+        # Each direction of an undirected edge is counted separately
+        return len(self.__edge_costs)
 
     def children_iter(self, node):
-        return iter(self.__edges[node])
+        return iter(self.__edges.get(node, ()))
 
     def edge_cost(self, source, destination):
         return self.__edge_costs[(source, destination)]
 
     def add_edge(self, source, destination, cost):
-        self.__edges[source].add(destination)
+        self.version += 1
+        self.__components.clear()
+        old_cost = self.__edge_costs.get((source, destination))
+        if old_cost is None:
+            self.__edges[source].add(destination)
+            self.__add_ref(source)
+            self.__add_ref(destination)
         self.__edge_costs[(source, destination)] = cost
+        self.__notify(source, destination, old_cost, cost)
 
     def remove_edge(self, source, destination):
         self.__edges[source].remove(destination)
-        self.__edge_costs.pop((source, destination))
+        old_cost = self.__edge_costs.pop((source, destination))
+        self.version += 1
+        self.__components.clear()
+        if len(self.__edges[source]) == 0:
+            del self.__edges[source]
+        self.__remove_ref(source)
+        self.__remove_ref(destination)
+        self.__notify(source, destination, old_cost, None)
+
+    def update_cost(self, source, destination, cost):
+        # Unlike removing and adding the edge again, the components and the
+        # node registry are left untouched
+        old_cost = self.__edge_costs[(source, destination)]
+        self.__edge_costs[(source, destination)] = cost
+        self.version += 1
+        self.__notify(source, destination, old_cost, cost)
+
+    def add_listener(self, listener):
+        # listener(source, destination, old_cost, new_cost) is called after
+        # every change of an edge, a missing edge has a cost of None
+        self.__listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.__listeners.remove(listener)
+
+    def __notify(self, source, destination, old_cost, new_cost):
+        for listener in self.__listeners:
+            listener(source, destination, old_cost, new_cost)
+
+    def __add_ref(self, node):
+        self.__node_refs[node] = self.__node_refs.get(node, 0) + 1
+
+    def __remove_ref(self, node):
+        refs = self.__node_refs[node] - 1
+        if refs == 0:
+            del self.__node_refs[node]
+        else:
+            self.__node_refs[node] = refs
+
+    def components(self, strong=False):
+        # Maps every node to the label of its weakly or strongly connected
+        # component. Nodes in different weak components never reach each
+        # other, nodes in the same strong component always do.
+        labels = self.__components.get(strong)
+        if labels is None:
+            if strong:
+                labels = strongly_connected_components(self)
+            else:
+                labels = weakly_connected_components(self)
+            self.__components[strong] = labels
+        return labels
+
+    def freeze(self):
+        edges = ((source, destination, self.__edge_costs[(source, destination)])
+                 for source, destinations in self.__edges.items()
+                 for destination in destinations)
+        frozen = FrozenGraph.from_edges(edges, directed=True,
+                                        nodes=self.get_nodes())
+        frozen.coordinates = self.coordinates
+        return frozen
+
+    def bfs_iter(self, start=None, all_components=False, edges=False):
+        return traverse(self, start, all_components, edges, depth_first=False)
+
+    def dfs_iter(self, start=None, all_components=False, edges=False):
+        return traverse(self, start, all_components, edges, depth_first=True)
 
     def __iter__(self):
-        return Digraph.Iterator(self)
-
-    class Iterator:
-        def __init__(self, digraph):
-            self.digraph = digraph
-            self.current = digraph.get_nodes().pop()
-            self.children = digraph.children_iter(self.current)
-            self.visited = {self.current}
-            self.frontier = []
-
-        def __next__(self):
-            try:
-                child = next(self.children)
-                if child not in self.visited:
-                    self.visited.add(child)
-                    self.frontier.append(child)
-                return child
-            except StopIteration:
-                if len(self.frontier) == 0:
-                    raise
-                self.current = self.frontier.pop()
-                self.children = self.digraph.children_iter(self.current)
-                return next(self)
+        return self.dfs_iter()
 
 
 class Graph(Digraph):
@@ -65,48 +152,1129 @@ class Graph(Digraph):
         Digraph.remove_edge(self, source, destination)
         Digraph.remove_edge(self, destination, source)
 
+    def update_cost(self, source, destination, cost):
+        Digraph.update_cost(self, source, destination, cost)
+        Digraph.update_cost(self, destination, source, cost)
+
+    def components(self, strong=False):
+        # Both kinds of components are the same in undirected graphs
+        return Digraph.components(self, False)
+
+    def freeze(self):
+        frozen = Digraph.freeze(self)
+        frozen.is_directed = False
+        return frozen
+
+
+class FrozenGraph:
+    # Immutable graph in compressed sparse row form. The children of the node
+    # with id i are targets[offsets[i]:offsets[i + 1]], sorted by id, and
+    # costs holds the cost of each edge at the same position. Names are
+    # sorted, so a node's id is its rank among all names.
+    def __init__(self, names, offsets, targets, costs, directed=True,
+                 component_ids=None):
+        self.names = names
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.is_directed = directed
+        self.version = 0
+        self.__components = {}
+        # Weak component labels by node id, stored in binary graph files so
+        # that they need not be computed after mapping the file
+        if component_ids is not None:
+            self.__components[False] = _ComponentLabels(component_ids,
+                                                        self)
+        self.coordinates = None
+        # Names loaded from a binary file are looked up with a binary search
+        # instead of decoding all of them into a dict
+        self.__ids = None
+        if isinstance(names, list):
+            self.__ids = {name: index for index, name in enumerate(names)}
+
+    def from_edges(edges, directed=True, nodes=()):
+        # Builds the rows with a counting sort on the sources, so apart from
+        # the names only flat arrays proportional to the edges are allocated.
+        # When an edge appears more than once its last cost wins.
+        ids = {}
+        names = []
+
+        def intern(name):
+            index = ids.get(name)
+            if index is None:
+                index = ids[name] = len(names)
+                names.append(name)
+            return index
+
+        for node in nodes:
+            intern(node)
+        sources = array("i")
+        targets = array("i")
+        costs = array("d")
+        for source, destination, cost in edges:
+            sources.append(intern(source))
+            targets.append(intern(destination))
+            costs.append(cost)
+
+        order = sorted(range(len(names)), key=names.__getitem__)
+        rank = array("i", bytes(4 * len(names)))
+        for new_id, old_id in enumerate(order):
+            rank[old_id] = new_id
+        names = [names[old_id] for old_id in order]
+
+        offsets = array("q", bytes(8 * (len(names) + 1)))
+        for source in sources:
+            offsets[rank[source] + 1] += 1
+        for index in range(len(names)):
+            offsets[index + 1] += offsets[index]
+
+        cursor = offsets[:-1]
+        row_targets = array("i", bytes(4 * len(targets)))
+        row_costs = array("d", bytes(8 * len(costs)))
+        for source, target, cost in zip(sources, targets, costs):
+            position = cursor[rank[source]]
+            cursor[rank[source]] = position + 1
+            row_targets[position] = rank[target]
+            row_costs[position] = cost
+        del sources, targets, costs, cursor
+
+        # Sort every row by target and drop duplicated edges in place
+        write = 0
+        for node in range(len(names)):
+            start, end = offsets[node], offsets[node + 1]
+            row = {}
+            for position in range(start, end):
+                row[row_targets[position]] = row_costs[position]
+            offsets[node] = write
+            for target in sorted(row):
+                row_targets[write] = target
+                row_costs[write] = row[target]
+                write += 1
+        offsets[len(names)] = write
+        del row_targets[write:]
+        del row_costs[write:]
+
+        return FrozenGraph(names, offsets, row_targets, row_costs, directed)
+
+    def node_id(self, node):
+        if self.__ids is not None:
+            return self.__ids[node]
+        index = bisect_left(self.names, node)
+        if index == len(self.names) or self.names[index] != node:
+            raise KeyError(node)
+        return index
+
+    def get_nodes(self):
+        return set(self.names)
+
+    def has_node(self, node):
+        try:
+            self.node_id(node)
+        except KeyError:
+            return False
+        return True
+
+    def node_count(self):
+        return len(self.names)
+
+    def edge_count(self):
+        return len(self.targets)
+
+    def children_iter(self, node):
+        index = self.node_id(node)
+        names = self.names
+        return (names[target] for target in
+                self.targets[self.offsets[index]:self.offsets[index + 1]])
+
+    def children_ids(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return zip(self.targets[start:end], self.costs[start:end])
+
+    def edge_cost(self, source, destination):
+        index = self.node_id(source)
+        target = self.node_id(destination)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        position = bisect_left(self.targets, target, start, end)
+        if position == end or self.targets[position] != target:
+            raise KeyError((source, destination))
+        return self.costs[position]
+
+    def components(self, strong=False):
+        strong = strong and self.is_directed
+        labels = self.__components.get(strong)
+        if labels is None:
+            if strong:
+                labels = strongly_connected_components(self)
+            else:
+                labels = weakly_connected_components(self)
+            self.__components[strong] = labels
+        return labels
+
+    def freeze(self):
+        return self
+
+    def bfs_iter(self, start=None, all_components=False, edges=False):
+        return traverse(self, start, all_components, edges, depth_first=False)
+
+    def dfs_iter(self, start=None, all_components=False, edges=False):
+        return traverse(self, start, all_components, edges, depth_first=True)
+
+    def __iter__(self):
+        return self.dfs_iter()
+
+
+def traverse(graph, start=None, all_components=False, edges=False,
+             depth_first=False):
+    # Yields every node reachable from start once, in breadth-first or
+    # depth-first preorder. Without a start node, or with all_components,
+    # the traversal restarts from unvisited nodes until all are visited.
+    # With edges set it yields the (source, destination, cost) of every
+    # edge leaving a visited node instead.
+    # The work list is explicit, so the stack depth stays constant.
+    if start is not None and not graph.has_node(start):
+        raise InvalidArgumentError("{0} is not a node in the graph"
+                                   .format(start))
+    roots = [] if start is None else [start]
+    if start is None or all_components:
+        roots = chain(roots, graph.get_nodes())
+
+    visited = set()
+    for root in roots:
+        if root in visited:
+            continue
+        visited.add(root)
+        if not edges:
+            yield root
+        # Each entry holds a node and the iterator over its children
+        work = deque([(root, graph.children_iter(root))])
+        while len(work) != 0:
+            node, children = work[-1] if depth_first else work[0]
+            child = next(children, _NO_CHILD)
+            if child is _NO_CHILD:
+                if depth_first:
+                    work.pop()
+                else:
+                    work.popleft()
+                continue
+
+            if edges:
+                yield (node, child, graph.edge_cost(node, child))
+            if child not in visited:
+                visited.add(child)
+                if not edges:
+                    yield child
+                work.append((child, graph.children_iter(child)))
+
+
+_NO_CHILD = object()
+
+
+def weakly_connected_components(graph):
+    # Union-find over the edges, ignoring their direction
+    parents = {node: node for node in graph.get_nodes()}
+
+    def find(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for node in parents:
+        for child in graph.children_iter(node):
+            root, child_root = find(node), find(child)
+            if root != child_root:
+                parents[child_root] = root
+
+    labels = {}
+    roots = {}
+    for node in parents:
+        labels[node] = roots.setdefault(find(node), len(roots))
+    return labels
+
+
+def strongly_connected_components(graph):
+    # Iterative Tarjan's algorithm
+    indices = {}
+    low_links = {}
+    stack = []
+    on_stack = set()
+    labels = {}
+    component_count = 0
+    for root in graph.get_nodes():
+        if root in indices:
+            continue
+        indices[root] = low_links[root] = len(indices)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, graph.children_iter(root))]
+        while len(work) != 0:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in indices:
+                    indices[child] = low_links[child] = len(indices)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, graph.children_iter(child)))
+                elif child in on_stack:
+                    low_links[node] = min(low_links[node], indices[child])
+                continue
+
+            work.pop()
+            if len(work) != 0:
+                parent = work[-1][0]
+                low_links[parent] = min(low_links[parent], low_links[node])
+            if low_links[node] == indices[node]:
+                # The node is the root of a component, pop all of it
+                label = component_count
+                component_count += 1
+                while True:
+                    member = stack.pop()
+                    on_stack.remove(member)
+                    labels[member] = label
+                    if member == node:
+                        break
+    return labels
+
+
+EUCLIDEAN = "euclidean"
+HAVERSINE = "haversine"
+# Mean earth radius in kilometres
+EARTH_RADIUS = 6371.0088
+
+
+class Coordinates:
+    # Node positions packed in a flat array of doubles, two per node.
+    # Euclidean coordinates are (x, y), haversine ones are (latitude,
+    # longitude) in degrees with distances in kilometres.
+    def __init__(self, metric=EUCLIDEAN, names=None, values=None,
+                 position=None):
+        if metric not in (EUCLIDEAN, HAVERSINE):
+            raise InvalidArgumentError("Unknown metric {0}".format(metric))
+        self.metric = metric
+        # A binary file gives the names, the values in node id order and
+        # the function mapping a name to its id. Missing nodes are NaN.
+        self.__names = [] if names is None else names
+        self.__values = array("d") if values is None else values
+        self.__positions = {} if position is None else None
+        self.__position = self.__positions.__getitem__ if position is None \
+            else position
+        self.__grid = None
+        # Incremented on every change, like Digraph.version
+        self.version = 0
+
+    def add(self, node, first, second):
+        if self.__positions is None:
+            raise InvalidArgumentError("These coordinates are read-only")
+        self.version += 1
+        position = self.__positions.get(node)
+        if position is None:
+            self.__positions[node] = len(self.__names)
+            self.__names.append(node)
+            self.__values.extend((first, second))
+        else:
+            self.__values[2 * position] = first
+            self.__values[2 * position + 1] = second
+        self.__grid = None
+
+    def __getitem__(self, node):
+        position = self.__position(node)
+        first = self.__values[2 * position]
+        if math.isnan(first):
+            raise KeyError(node)
+        return (first, self.__values[2 * position + 1])
+
+    def __contains__(self, node):
+        try:
+            self[node]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def items(self):
+        for position, name in enumerate(self.__names):
+            first = self.__values[2 * position]
+            if not math.isnan(first):
+                yield (name, (first, self.__values[2 * position + 1]))
+
+    def distance(self, first, second):
+        return self.point_distance(self[first], self[second])
+
+    def point_distance(self, first, second):
+        if self.metric == EUCLIDEAN:
+            return math.hypot(first[0] - second[0], first[1] - second[1])
+        latitude, other_latitude = math.radians(first[0]), \
+            math.radians(second[0])
+        half_chord = math.sin((other_latitude - latitude) / 2) ** 2 + \
+            math.cos(latitude) * math.cos(other_latitude) * \
+            math.sin(math.radians(second[1] - first[1]) / 2) ** 2
+        return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(half_chord)))
+
+    def spatial_index(self):
+        if self.__grid is None:
+            self.__grid = SpatialGrid(self)
+        return self.__grid
+
+
+class SpatialGrid:
+    # Buckets the nodes into square cells of a planar projection: the
+    # coordinates themselves, or for haversine ones an equirectangular
+    # projection around the mean latitude, which is exact enough for
+    # regions the size of a country.
+    def __init__(self, coordinates, cell_size=None):
+        self.coordinates = coordinates
+        points = list(coordinates.items())
+        self.__scale = (1, 1)
+        if coordinates.metric == HAVERSINE and len(points) != 0:
+            mean_latitude = sum(point[0] for _, point in points) / len(points)
+            kilometres_per_degree = math.radians(EARTH_RADIUS)
+            self.__scale = (kilometres_per_degree, kilometres_per_degree *
+                            math.cos(math.radians(mean_latitude)))
+
+        projected = [(name, self.__project(point)) for name, point in points]
+        if cell_size is None:
+            # About two points per cell on evenly spread graphs
+            xs = [x for _, (x, _) in projected] or [0]
+            ys = [y for _, (_, y) in projected] or [0]
+            area = max(max(xs) - min(xs), 1e-9) * max(max(ys) - min(ys), 1e-9)
+            cell_size = math.sqrt(2 * area / max(len(projected), 1))
+        self.cell_size = cell_size
+        self.__cells = defaultdict(list)
+        for name, point in projected:
+            self.__cells[self.__cell(point)].append((point, name))
+
+    def __project(self, point):
+        return (point[0] * self.__scale[0], point[1] * self.__scale[1])
+
+    def __cell(self, point):
+        return (int(math.floor(point[0] / self.cell_size)),
+                int(math.floor(point[1] / self.cell_size)))
+
+    def within(self, point, radius):
+        # Nodes whose projected distance from point is at most radius
+        center = self.__project(point)
+        low = self.__cell((center[0] - radius, center[1] - radius))
+        high = self.__cell((center[0] + radius, center[1] + radius))
+        found = []
+        for cell_x in range(low[0], high[0] + 1):
+            for cell_y in range(low[1], high[1] + 1):
+                for other, name in self.__cells.get((cell_x, cell_y), ()):
+                    if math.dist(center, other) <= radius:
+                        found.append(name)
+        return found
+
+    def nearest(self, point):
+        # Searches rings of cells around the point until no closer node can
+        # be in the next ring
+        if len(self.__cells) == 0:
+            return None
+        center = self.__project(point)
+        cell_x, cell_y = self.__cell(center)
+        best, best_distance = None, float("inf")
+        ring = 0
+        max_ring = max(max(abs(x - cell_x), abs(y - cell_y))
+                       for x, y in self.__cells)
+        while ring <= max_ring and (ring - 1) * self.cell_size < best_distance:
+            for x in range(cell_x - ring, cell_x + ring + 1):
+                for y in range(cell_y - ring, cell_y + ring + 1):
+                    if max(abs(x - cell_x), abs(y - cell_y)) != ring:
+                        continue
+                    for other, name in self.__cells.get((x, y), ()):
+                        distance = math.dist(center, other)
+                        if distance < best_distance:
+                            best, best_distance = name, distance
+            ring += 1
+        return best
+
+
+def grid_graph(rows, columns, obstacle_ratio=0, diagonal=False, seed=None,
+               frozen=False):
+    # Nodes are named "row_column", a share of the cells are obstacles
+    # without edges. Diagonal moves cost sqrt(2).
+    generator = random.Random(seed)
+    free = [[generator.random() >= obstacle_ratio for _ in range(columns)]
+            for _ in range(rows)]
+    moves = [(0, 1, 1), (1, 0, 1)]
+    if diagonal:
+        moves += [(1, 1, math.sqrt(2)), (1, -1, math.sqrt(2))]
+
+    def edges():
+        for row in range(rows):
+            for column in range(columns):
+                if not free[row][column]:
+                    continue
+                for row_delta, column_delta, cost in moves:
+                    other_row = row + row_delta
+                    other_column = column + column_delta
+                    if 0 <= other_row < rows and \
+                       0 <= other_column < columns and \
+                       free[other_row][other_column]:
+                        yield ("{0}_{1}".format(row, column),
+                               "{0}_{1}".format(other_row, other_column),
+                               cost)
+    graph = _undirected_graph(edges(), frozen)
+    # Free cells are placed at (column, row)
+    graph.coordinates = Coordinates()
+    for row in range(rows):
+        for column in range(columns):
+            if free[row][column]:
+                graph.coordinates.add("{0}_{1}".format(row, column), column,
+                                      row)
+    return graph
+
+
+def random_geometric_graph(node_count, radius, seed=None, frozen=False):
+    # Points are spread uniformly over a square of area node_count, so the
+    # expected degree is about pi * radius ** 2. Points closer than radius
+    # are connected with their euclidean distance as the cost.
+    generator = random.Random(seed)
+    side = math.sqrt(node_count)
+    coordinates = Coordinates()
+    for index in range(node_count):
+        coordinates.add("n{0}".format(index), generator.uniform(0, side),
+                        generator.uniform(0, side))
+
+    # Only points in neighbouring cells of size radius can be connected
+    cells = defaultdict(list)
+    for name, (x, y) in coordinates.items():
+        cells[(int(x // radius), int(y // radius))].append(name)
+
+    def edges():
+        for (cell_x, cell_y), names in cells.items():
+            for delta_x, delta_y in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+                others = cells.get((cell_x + delta_x, cell_y + delta_y), ())
+                same_cell = delta_x == delta_y == 0
+                for index, name in enumerate(names):
+                    for other in (names[index + 1:] if same_cell else others):
+                        distance = coordinates.distance(name, other)
+                        if distance <= radius:
+                            yield (name, other, distance)
+    graph = _undirected_graph(edges(), frozen)
+    graph.coordinates = coordinates
+    return graph
+
+
+def scale_free_graph(node_count, edges_per_node=2, seed=None, frozen=False):
+    # Barabasi-Albert preferential attachment, costs are integers in
+    # [1, 100]
+    if node_count <= edges_per_node:
+        raise InvalidArgumentError("node_count must exceed edges_per_node")
+    generator = random.Random(seed)
+
+    def edges():
+        # Every node appears in the pool once per incident edge
+        pool = []
+        for node in range(edges_per_node + 1):
+            for other in range(node):
+                pool += [node, other]
+                yield ("n{0}".format(node), "n{0}".format(other),
+                       generator.randint(1, 100))
+        for node in range(edges_per_node + 1, node_count):
+            targets = set()
+            while len(targets) < edges_per_node:
+                targets.add(generator.choice(pool))
+            for target in targets:
+                pool += [node, target]
+                yield ("n{0}".format(node), "n{0}".format(target),
+                       generator.randint(1, 100))
+    return _undirected_graph(edges(), frozen)
+
+
+def road_graph(rows, columns, seed=None, frozen=False):
+    # A planar road-like network: intersections on a jittered grid joined
+    # to their right and lower neighbours, a few of those roads missing,
+    # and at most one diagonal per block. Costs are the euclidean length
+    # times a slowdown in [1, 1.5], never below the straight-line distance.
+    generator = random.Random(seed)
+    coordinates = Coordinates()
+    for row in range(rows):
+        for column in range(columns):
+            coordinates.add("{0}_{1}".format(row, column),
+                            column + generator.uniform(-0.3, 0.3),
+                            row + generator.uniform(-0.3, 0.3))
+
+    def road(first, second):
+        distance = coordinates.distance(first, second)
+        return (first, second, distance * generator.uniform(1, 1.5))
+
+    def edges():
+        for row in range(rows):
+            for column in range(columns):
+                name = "{0}_{1}".format(row, column)
+                if column + 1 < columns and generator.random() < 0.9:
+                    yield road(name, "{0}_{1}".format(row, column + 1))
+                if row + 1 < rows and generator.random() < 0.9:
+                    yield road(name, "{0}_{1}".format(row + 1, column))
+                if row + 1 < rows and column + 1 < columns:
+                    diagonal = generator.random()
+                    if diagonal < 0.1:
+                        yield road(name, "{0}_{1}".format(row + 1, column + 1))
+                    elif diagonal < 0.2:
+                        yield road("{0}_{1}".format(row, column + 1),
+                                   "{0}_{1}".format(row + 1, column))
+    graph = _undirected_graph(edges(), frozen)
+    graph.coordinates = coordinates
+    return graph
+
+
+def _undirected_graph(edges, frozen):
+    if frozen:
+        both_ways = ((edge, (edge[1], edge[0], edge[2])) for edge in edges)
+        return FrozenGraph.from_edges(chain.from_iterable(both_ways),
+                                      directed=False)
+    graph = Graph()
+    for source, destination, cost in edges:
+        graph.add_edge(source, destination, cost)
+    return graph
+
+
+def _write_atomically(path, chunks, mode):
+    # Written next to the destination and moved over it at once, so a crash
+    # never leaves a truncated file behind
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, mode) as file:
+            for chunk in chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates files only their owner can read
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class _ComponentLabels(Mapping):
+    # Read-only mapping from node names to component labels stored by node
+    # id, a lookup only touches the node itself
+    def __init__(self, labels, graph):
+        self.__labels = labels
+        self.__graph = graph
+
+    def __getitem__(self, node):
+        return self.__labels[self.__graph.node_id(node)]
+
+    def __len__(self):
+        return len(self.__labels)
+
+    def __iter__(self):
+        return iter(self.__graph.names)
+
+
+class _NameTable:
+    # Read-only sequence of the node names stored in a binary graph file,
+    # decoded on access
+    def __init__(self, name_offsets, blob):
+        self.__name_offsets = name_offsets
+        self.__blob = blob
+
+    def __len__(self):
+        return len(self.__name_offsets) - 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start = self.__name_offsets[index]
+        end = self.__name_offsets[index + 1]
+        return str(self.__blob[start:end], "utf-8")
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
 
 class GraphLoader:
     DIRECTED_EDGE_SEPARATOR = "->"
     BIDIRECTED_EDGE_SEPARATOR = "<->"
     COMMENT = "#"
+    # Binary layout: the header, then node name offsets (int64), row offsets
+    # (int64), targets (int32, padded to 8 bytes), costs (float64), since
+    # version 2 optionally two coordinates per node (float64, NaN for nodes
+    # without a position), since version 3 the weak component label of every
+    # node (int32, padded to 8 bytes) and the UTF-8 names. The checksum is the
+    # CRC32 of everything after the header.
+    BINARY_MAGIC = b"ADDERGPH"
+    BINARY_VERSION = 3
+    __BINARY_HEADER = struct.Struct("<8sIIQQQI4x")
+    __DIRECTED_FLAG = 1
+    __BIG_ENDIAN_FLAG = 2
+    __COORDINATES_FLAG = 4
+    __HAVERSINE_FLAG = 8
+    __COMPONENTS_FLAG = 16
+    # A line in the form "source <->" has no destinations
+    __NO_DESTINATIONS = re.compile(r"\s*\S*\s*<?->\s*")
+    # Every line after "[coordinates metric]" is "node first second", the
+    # metric is euclidean (x y) or haversine (latitude longitude)
+    __COORDINATES_HEADER = re.compile(r"\[coordinates(?:\s+(\w+))?\]")
+
+    # When frozen is set a FrozenGraph is built directly from the edges
+    def from_string(self, text, frozen=False):
+        return self.__load(lambda: io.StringIO(text), frozen)
+
+    def from_file(self, path, frozen=False):
+        graph = self.__load(lambda: open(path), frozen)
+        # Lets derived data such as landmarks be stored next to the file
+        graph.source_path = path
+        graph.source_version = graph.version
+        return graph
+
+    def save_text(self, graph, path):
+        # Undirected graphs are written with one "<->" line per node holding
+        # the edges not written yet, directed ones with "->" lines
+        undirected = isinstance(graph, Graph) or \
+            getattr(graph, "is_directed", True) is False
+        separator = GraphLoader.BIDIRECTED_EDGE_SEPARATOR if undirected \
+            else GraphLoader.DIRECTED_EDGE_SEPARATOR
+        written = set()
+
+        def lines():
+            for source in graph.get_nodes():
+                edges = ["{0} {1!r}".format(child,
+                                            graph.edge_cost(source, child))
+                         for child in graph.children_iter(source)
+                         if not undirected or child not in written]
+                written.add(source)
+                if len(edges) != 0:
+                    yield "{0} {1} {2}\n".format(source, separator,
+                                                 ", ".join(edges))
+            if graph.coordinates is not None:
+                yield "[coordinates {0}]\n".format(graph.coordinates.metric)
+                for node, (first, second) in graph.coordinates.items():
+                    yield "{0} {1!r} {2!r}\n".format(node, first, second)
+
+        _write_atomically(path, lines(), "w")
+
+    def save_binary(self, graph, path):
+        graph = graph.freeze()
+        blob = bytearray()
+        name_offsets = array("q", [0])
+        for name in graph.names:
+            blob += name.encode("utf-8")
+            name_offsets.append(len(blob))
+        targets = array("i", graph.targets)
+        if len(targets) % 2 == 1:
+            padding = array("i", [0])
+        else:
+            padding = array("i")
+        flags = GraphLoader.__DIRECTED_FLAG if graph.is_directed else 0
+        if sys.byteorder == "big":
+            flags |= GraphLoader.__BIG_ENDIAN_FLAG
+        positions = array("d")
+        if graph.coordinates is not None:
+            flags |= GraphLoader.__COORDINATES_FLAG
+            if graph.coordinates.metric == HAVERSINE:
+                flags |= GraphLoader.__HAVERSINE_FLAG
+            for name in graph.names:
+                if name in graph.coordinates:
+                    positions.extend(graph.coordinates[name])
+                else:
+                    positions.extend((math.nan, math.nan))
+        flags |= GraphLoader.__COMPONENTS_FLAG
+        labels = graph.components()
+        component_ids = array("i", (labels[name] for name in graph.names))
+        if len(component_ids) % 2 == 1:
+            component_ids.append(0)
+        sections = (name_offsets, array("q", graph.offsets), targets, padding,
+                    array("d", graph.costs), positions, component_ids, blob)
+
+        checksum = 0
+        for section in sections:
+            checksum = zlib.crc32(section, checksum)
+        header = GraphLoader.__BINARY_HEADER.pack(
+            GraphLoader.BINARY_MAGIC, GraphLoader.BINARY_VERSION, flags,
+            graph.node_count(), graph.edge_count(), len(blob), checksum)
+
+        _write_atomically(path, (header,) + sections, "wb")
+
+    def from_binary(self, path, mmap=True, verify=False):
+        # With mmap the arrays are views of the mapped file, so loading
+        # takes constant time and the pages are shared between processes.
+        # Verifying the checksum reads the whole file.
+        with open(path, "rb") as file:
+            if mmap:
+                buffer = mmap_module.mmap(file.fileno(), 0,
+                                          access=mmap_module.ACCESS_READ)
+            else:
+                buffer = file.read()
+        view = memoryview(buffer)
+
+        header_size = GraphLoader.__BINARY_HEADER.size
+        if len(view) < header_size:
+            raise ParsingError("{0}: truncated graph file".format(path))
+        magic, version, flags, node_count, edge_count, names_size, checksum = \
+            GraphLoader.__BINARY_HEADER.unpack(view[:header_size])
+        if magic != GraphLoader.BINARY_MAGIC:
+            raise ParsingError("{0}: not a binary graph file".format(path))
+        if not 1 <= version <= GraphLoader.BINARY_VERSION:
+            raise ParsingError("{0}: unsupported version {1}"
+                               .format(path, version))
+        is_big_endian = flags & GraphLoader.__BIG_ENDIAN_FLAG != 0
+        if is_big_endian != (sys.byteorder == "big"):
+            raise ParsingError("{0}: written with a different byte order"
+                               .format(path))
+
+        has_coordinates = flags & GraphLoader.__COORDINATES_FLAG != 0
+        has_components = flags & GraphLoader.__COMPONENTS_FLAG != 0
+        sizes = (8 * (node_count + 1), 8 * (node_count + 1),
+                 4 * (edge_count + edge_count % 2), 8 * edge_count,
+                 16 * node_count if has_coordinates else 0,
+                 4 * (node_count + node_count % 2) if has_components else 0,
+                 names_size)
+        if len(view) != header_size + sum(sizes):
+            raise ParsingError("{0}: truncated graph file".format(path))
+        if verify and zlib.crc32(view[header_size:]) != checksum:
+            raise ParsingError("{0}: checksum mismatch".format(path))
+
+        sections = []
+        start = header_size
+        for size in sizes:
+            sections.append(view[start:start + size])
+            start += size
+        name_offsets, offsets, targets, costs, positions, component_ids, \
+            blob = sections
+        names = _NameTable(name_offsets.cast("q"), blob)
+        if has_components:
+            component_ids = component_ids.cast("i")[:node_count]
+        else:
+            # Older files get their components computed on first use
+            component_ids = None
+        graph = FrozenGraph(names, offsets.cast("q"),
+                            targets.cast("i")[:edge_count], costs.cast("d"),
+                            flags & GraphLoader.__DIRECTED_FLAG != 0,
+                            component_ids)
+        if has_coordinates:
+            metric = HAVERSINE if flags & GraphLoader.__HAVERSINE_FLAG != 0 \
+                else EUCLIDEAN
+            graph.coordinates = Coordinates(metric, names, positions.cast("d"),
+                                            graph.node_id)
+        graph.source_path = path
+        graph.source_version = graph.version
+        return graph
 
-    def from_string(self, text):
-        edges = set()
-        is_graph_bidirected = True
-        for line in text.split("\n"):
+    def __load(self, open_lines, frozen):
+        # The first pass only decides whether the graph is directed, so the
+        # second one can stream the edges straight into the right graph
+        with open_lines() as lines:
+            is_graph_bidirected = not any(
+                GraphLoader.DIRECTED_EDGE_SEPARATOR in line and
+                GraphLoader.BIDIRECTED_EDGE_SEPARATOR not in line and
+                not line.startswith(GraphLoader.COMMENT)
+                for line in lines)
+
+        # Graph.add_edge adds the reverse edges on its own
+        with_reverse = frozen or not is_graph_bidirected
+        # Filled by the edge iterator once it reaches a coordinate section
+        sections = {}
+        with open_lines() as lines:
+            edges = self.__edges_iter(lines, with_reverse, sections)
+            if frozen:
+                graph = FrozenGraph.from_edges(
+                    edges, directed=not is_graph_bidirected)
+            else:
+                graph = Graph() if is_graph_bidirected else Digraph()
+                for source, destination, cost in edges:
+                    graph.add_edge(source, destination, cost)
+        graph.coordinates = sections.get("coordinates")
+        return graph
+
+    def __edges_iter(self, lines, with_reverse, sections):
+        coordinates = None
+        for line_number, line in enumerate(lines, 1):
             # skip comments and empty lines
             if line.startswith(GraphLoader.COMMENT) or len(line.strip()) == 0:
                 continue
-            # if the line is in the form "source <->" there are no destinations
-            if re.match(line, r"\w*\s*<->\s*"):
+            header = GraphLoader.__COORDINATES_HEADER.fullmatch(line.strip())
+            if header is not None:
+                metric = header.group(1) or EUCLIDEAN
+                if metric not in (EUCLIDEAN, HAVERSINE):
+                    raise ParsingError("line {0}: unknown metric {1}"
+                                       .format(line_number, metric))
+                coordinates = sections["coordinates"] = Coordinates(metric)
+                continue
+            if coordinates is not None:
+                self.__add_coordinates(coordinates, line, line_number)
+                continue
+            if GraphLoader.__NO_DESTINATIONS.fullmatch(line):
                 continue
 
             is_line_bidirected = GraphLoader.BIDIRECTED_EDGE_SEPARATOR in line
-            is_graph_bidirected = is_graph_bidirected and is_line_bidirected
             if is_line_bidirected:
                 separator = GraphLoader.BIDIRECTED_EDGE_SEPARATOR
             else:
                 separator = GraphLoader.DIRECTED_EDGE_SEPARATOR
-            lhs, rhs = line.split(separator)
-            source = lhs.strip()
-            # split the right side of the separator by commas.
-            # Split each CSV by space.
-            # the first part is the destination, the second is the cost
-            destinations = ((edge.split()[0], float(edge.split()[1]))
-                            for edge in rhs.split(",")
-                            if len(edge.strip()) != 0)
-            for destination, cost in destinations:
-                edges.add((source, destination, cost))
-                if is_line_bidirected:
-                    edges.add((destination, source, cost))
-
-        graph = Graph() if is_graph_bidirected else Digraph()
-        for source, dest, cost in edges:
-            graph.add_edge(source, dest, cost)
+            parts = line.split(separator)
+            if len(parts) != 2:
+                raise ParsingError("line {0}: expected exactly one edge "
+                                   "separator".format(line_number))
+            source = parts[0].strip()
+            if len(source) == 0:
+                raise ParsingError("line {0}: missing source node"
+                                   .format(line_number))
+
+            # The right side is a comma separated list of "destination cost"
+            for edge in parts[1].split(","):
+                if len(edge.strip()) == 0:
+                    continue
+                try:
+                    destination, cost = edge.split()
+                    cost = float(cost)
+                except ValueError:
+                    raise ParsingError("line {0}: invalid edge '{1}'"
+                                       .format(line_number, edge.strip()))
+                yield (source, destination, cost)
+                if is_line_bidirected and with_reverse:
+                    yield (destination, source, cost)
+
+    def __add_coordinates(self, coordinates, line, line_number):
+        try:
+            node, first, second = line.split()
+            coordinates.add(node, float(first), float(second))
+        except ValueError:
+            raise ParsingError("line {0}: invalid coordinates '{1}'"
+                               .format(line_number, line.strip()))
+
+
+# Graphs with at least this many edges per ordered pair of nodes are solved
+# with Floyd-Warshall, sparser ones with a Dijkstra from every node
+DENSE_GRAPH_DENSITY = 0.1
+# Fewer sources than this are not worth starting processes for
+MIN_PARALLEL_SOURCES = 256
+_distance_matrices = weakref.WeakKeyDictionary()
+
+
+class DistanceMatrix:
+    # Shortest distances between all pairs of nodes as float32, row major by
+    # node id with the ids of FrozenGraph, infinity when there is no path.
+    # Values are rounded down so they never overestimate a distance.
+    # Binary layout: the header, node name offsets (int64), the matrix
+    # (padded to 8 bytes) and the UTF-8 names, checksum as in graph files.
+    MAGIC = b"ADDERAPD"
+    VERSION = 1
+    __HEADER = struct.Struct("<8sIIQQI4x")
+    __BIG_ENDIAN_FLAG = 1
+
+    def __init__(self, names, values, version=0):
+        self.names = names
+        self.values = values
+        self.version = version
+        self.__ids = {name: index for index, name in enumerate(names)}
+
+    def node_count(self):
+        return len(self.__ids)
+
+    def distance(self, source, target):
+        return self.values[self.__ids[source] * len(self.__ids) +
+                           self.__ids[target]]
+
+    def heuristic(self, goal):
+        # The exact distance to goal, so A* only expands nodes on shortest
+        # paths
+        values, ids, size = self.values, self.__ids, len(self.__ids)
+        column = ids[goal]
+        return lambda node: values[ids[node] * size + column]
+
+    def save(self, path):
+        blob = bytearray()
+        name_offsets = array("q", [0])
+        for name in self.names:
+            blob += name.encode("utf-8")
+            name_offsets.append(len(blob))
+        values = array("f", self.values)
+        padding = array("f", [0]) if len(values) % 2 == 1 else array("f")
+        sections = (name_offsets, values, padding, blob)
+
+        checksum = 0
+        for section in sections:
+            checksum = zlib.crc32(section, checksum)
+        flags = DistanceMatrix.__BIG_ENDIAN_FLAG \
+            if sys.byteorder == "big" else 0
+        header = DistanceMatrix.__HEADER.pack(
+            DistanceMatrix.MAGIC, DistanceMatrix.VERSION, flags,
+            len(self.names), len(blob), checksum)
+        _write_atomically(path, (header,) + sections, "wb")
+
+    def load(path, graph=None, mmap=True, verify=False):
+        # With graph given the matrix must hold exactly its nodes, and is
+        # then used for that graph by distance_matrix_for
+        with open(path, "rb") as file:
+            if mmap:
+                buffer = mmap_module.mmap(file.fileno(), 0,
+                                          access=mmap_module.ACCESS_READ)
+            else:
+                buffer = file.read()
+        view = memoryview(buffer)
+
+        header_size = DistanceMatrix.__HEADER.size
+        if len(view) < header_size:
+            raise ParsingError("{0}: truncated distance matrix".format(path))
+        magic, version, flags, node_count, names_size, checksum = \
+            DistanceMatrix.__HEADER.unpack(view[:header_size])
+        if magic != DistanceMatrix.MAGIC:
+            raise ParsingError("{0}: not a distance matrix".format(path))
+        if version != DistanceMatrix.VERSION:
+            raise ParsingError("{0}: unsupported version {1}"
+                               .format(path, version))
+        is_big_endian = flags & DistanceMatrix.__BIG_ENDIAN_FLAG != 0
+        if is_big_endian != (sys.byteorder == "big"):
+            raise ParsingError("{0}: written with a different byte order"
+                               .format(path))
+        cells = node_count * node_count
+        sizes = (8 * (node_count + 1), 4 * (cells + cells % 2), names_size)
+        if len(view) != header_size + sum(sizes):
+            raise ParsingError("{0}: truncated distance matrix".format(path))
+        if verify and zlib.crc32(view[header_size:]) != checksum:
+            raise ParsingError("{0}: checksum mismatch".format(path))
+
+        sections = []
+        start = header_size
+        for size in sizes:
+            sections.append(view[start:start + size])
+            start += size
+        name_offsets, values, blob = sections
+        names = list(_NameTable(name_offsets.cast("q"), blob))
+        matrix = DistanceMatrix(names, values.cast("f")[:cells])
+        if graph is not None:
+            if graph.node_count() != node_count or \
+                    not all(graph.has_node(name) for name in names):
+                raise InvalidArgumentError("{0} holds the distances of "
+                                           "another graph".format(path))
+            matrix.version = graph.version
+            _distance_matrices[graph] = matrix
+        return matrix
+
+
+def all_pairs_distances(graph, dense=None, processes=None):
+    # Floyd-Warshall for dense graphs, vectorised when NumPy is installed,
+    # otherwise a Dijkstra from every node, spread over processes for large
+    # graphs. dense forces either method, processes=1 disables the pool.
+    frozen = graph.freeze()
+    size = frozen.node_count()
+    if dense is None:
+        dense = frozen.edge_count() >= DENSE_GRAPH_DENSITY * size * size
+    if dense and numpy is not None:
+        values = __numpy_floyd_warshall(frozen)
+    else:
+        values = array("f")
+        rows = __floyd_warshall(frozen) if dense else \
+            __dijkstra_rows(frozen, processes)
+        for row in rows:
+            values.extend(_float32_below(row))
+    matrix = DistanceMatrix(list(frozen.names), values, graph.version)
+    _distance_matrices[graph] = matrix
+    return matrix
+
+
+def distance_matrix_for(graph):
+    # The matrix computed or loaded for graph, None if there is none or the
+    # graph changed since
+    matrix = _distance_matrices.get(graph)
+    if matrix is not None and matrix.version == graph.version:
+        return matrix
+    return None
+
+
+def _float32_below(row):
+    # Converts to float32 rounding down instead of to the nearest value
+    rounded = array("f", row)
+    for index, value in enumerate(rounded):
+        if value > row[index]:
+            bits = struct.unpack("<I", struct.pack("<f", value))[0]
+            rounded[index] = struct.unpack("<f",
+                                           struct.pack("<I", bits - 1))[0]
+    return rounded
+
+
+def __floyd_warshall(graph):
+    size = graph.node_count()
+    rows = [[math.inf] * size for _ in range(size)]
+    for node in range(size):
+        rows[node][node] = 0
+        for child, cost in graph.children_ids(node):
+            if cost < rows[node][child]:
+                rows[node][child] = cost
+    for middle in range(size):
+        middle_row = rows[middle]
+        for node in range(size):
+            to_middle = rows[node][middle]
+            if to_middle == math.inf:
+                continue
+            rows[node] = [distance if distance <= to_middle + through
+                          else to_middle + through
+                          for distance, through in zip(rows[node],
+                                                       middle_row)]
+    return rows
+
+
+def __numpy_floyd_warshall(graph):
+    size = graph.node_count()
+    matrix = numpy.full((size, size), numpy.inf)
+    for node in range(size):
+        for child, cost in graph.children_ids(node):
+            matrix[node, child] = min(matrix[node, child], cost)
+    numpy.fill_diagonal(matrix, 0)
+    for middle in range(size):
+        numpy.minimum(matrix, matrix[:, middle, None] +
+                      matrix[None, middle, :], out=matrix)
+    rounded = matrix.astype(numpy.float32)
+    above = rounded > matrix
+    rounded[above] = numpy.nextafter(rounded[above], numpy.float32(0))
+    return array("f", rounded.tobytes())
+
+
+def __dijkstra_rows(graph, processes):
+    size = graph.node_count()
+    csr = (array("q", graph.offsets), array("i", graph.targets),
+           array("d", graph.costs))
+    if processes == 1 or (processes is None and size < MIN_PARALLEL_SOURCES):
+        return (_dijkstra_row(csr, source) for source in range(size))
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(processes) as executor:
+        # Each task carries the graph, so the sources are sent in a few
+        # large chunks
+        chunk = max(1, size // (4 * processes))
+        chunks = [range(start, min(start + chunk, size))
+                  for start in range(0, size, chunk)]
+        results = executor.map(_dijkstra_rows_chunk, [csr] * len(chunks),
+                               chunks)
+        return [row for rows in results for row in rows]
+
+
+def _dijkstra_rows_chunk(csr, sources):
+    return [_dijkstra_row(csr, source) for source in sources]
+
+
+def _dijkstra_row(csr, source):
+    offsets, targets, costs = csr
+    distances = array("d", [math.inf]) * (len(offsets) - 1)
+    distances[source] = 0
+    frontier = [(0, source)]
+    while len(frontier) != 0:
+        distance, node = heapq.heappop(frontier)
+        if distance > distances[node]:
+            continue
+        for position in range(offsets[node], offsets[node + 1]):
+            child = targets[position]
+            child_distance = distance + costs[position]
+            if child_distance < distances[child]:
+                distances[child] = child_distance
+                heapq.heappush(frontier, (child_distance, child))
+    return distances
+
+
+def main(arguments):
+    if len(arguments) != 2:
+        print("Usage: python -m adder.graphs <text graph> <binary graph>")
+        return 1
+    loader = GraphLoader()
+    loader.save_binary(loader.from_file(arguments[0], frozen=True),
+                       arguments[1])
+    return 0
 
-        return graph
 
-    def from_file(self, path):
-        with open(path) as file:
-            return self.from_string(file.read())
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -381,7 +381,7 @@ def unify_substitutions(theta1, theta2):
     return theta
 
 
-@utils.memoize
+@utils.memoize(max_size=4096)
 def __split_expression(expr, cache={}):
     expr = expr.strip()
     left_index = expr.find(Braces.Left)
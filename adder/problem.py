@@ -1,6 +1,8 @@
 from functools import partial
+import math
 import random
 
+from adder import graphs, routing
 from adder.utils import InvalidArgumentError
 
 
@@ -50,6 +52,16 @@ SOLUTION_UNKNOWN = "SOLUTION_UNKNOWN"
 
 
 class Problem:
+    # Set when every step cost is an integer, which lets searches use
+    # integer-indexed frontiers. Heuristics returning only integers
+    # are marked with an integer_valued attribute.
+    integer_costs = False
+
+    # True only when the goal is known to be unreachable from the initial
+    # state, which lets searches fail without exploring anything
+    def goal_unreachable(self):
+        return False
+
     def child_node(self, node, action):
         parent = node
         state = self.result(node.state, action)
@@ -68,6 +80,11 @@ class Problem:
     def result(self, state, action):
         raise NotImplementedError("_Problem is abc")
 
+    def results(self, state, action):
+        # All the states an action may lead to. Deterministic problems have
+        # a single outcome; nondeterministic ones override this.
+        return (self.result(state, action), )
+
     def goal_test(self, state):
         raise NotImplementedError("_Problem is abc")
 
@@ -97,9 +114,9 @@ class Problem:
 
 class _GraphProblem(Problem):
     def __init__(self, graph, root, goal):
-        if root not in graph.get_nodes():
+        if not graph.has_node(root):
             raise InvalidArgumentError("root must be be a node in the graph")
-        if goal not in graph.get_nodes():
+        if not graph.has_node(goal):
             raise InvalidArgumentError("goal must be be a node in the graph")
 
         self.graph = graph
@@ -118,8 +135,13 @@ class _GraphProblem(Problem):
     def goal_test(self, state):
         return state == self.goal
 
+    def goal_unreachable(self):
+        labels = self.graph.components()
+        return labels[self.initial.state] != labels[self.goal]
+
 
 class _NPuzzleProblem(Problem):
+    integer_costs = True
 
     UP = "UP"
     DOWN = "DOWN"
@@ -152,7 +174,7 @@ class _NPuzzleProblem(Problem):
 
         # index = i * size + j
         j = index % self.board_size
-        i = (index - j) / self.board_size
+        i = (index - j) // self.board_size
         return (i, int(j))
 
     def actions_iter(self, state):
@@ -190,6 +212,8 @@ class _NPuzzleProblem(Problem):
 
 
 class _NQueensProblem(Problem):
+    integer_costs = True
+
     def __init__(self, size, initial=None):
         self.size = size
         initial = initial
@@ -238,6 +262,196 @@ class _NQueensProblem(Problem):
         return _NQueensProblem.attacking(state) == 0
 
 
+_NQueensProblem.attacking.integer_valued = True
+
+
+class _GridProblem(Problem):
+    ORTHOGONAL_MOVES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+    DIAGONAL_MOVES = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+    DIAGONAL_COST = math.sqrt(2)
+
+    def __init__(self, rows, columns, obstacles, start, goal, diagonal):
+        self.rows = rows
+        self.columns = columns
+        self.diagonal = diagonal
+        self.integer_costs = not diagonal
+        # One bit per cell
+        self.obstacles = bytearray((rows * columns + 7) // 8)
+        for row, col in obstacles:
+            if not self.is_inside(row, col):
+                raise InvalidArgumentError("Obstacles must be on the grid")
+            index = row * columns + col
+            self.obstacles[index >> 3] |= 1 << (index & 7)
+
+        if not self.is_free(*start):
+            raise InvalidArgumentError("start must be a free cell")
+        if not self.is_free(*goal):
+            raise InvalidArgumentError("goal must be a free cell")
+        self.initial = Node(start, None, None, 0)
+        self.goal = goal
+
+        self.moves = _GridProblem.ORTHOGONAL_MOVES
+        if diagonal:
+            self.moves += _GridProblem.DIAGONAL_MOVES
+
+    def is_inside(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.columns
+
+    def is_free(self, row, col):
+        if not self.is_inside(row, col):
+            return False
+        index = row * self.columns + col
+        return not self.obstacles[index >> 3] & (1 << (index & 7))
+
+    def can_move(self, state, action):
+        row, col = state
+        drow, dcol = action
+        if not self.is_free(row + drow, col + dcol):
+            return False
+        # Diagonal moves may not cut corners
+        return drow == 0 or dcol == 0 or \
+            (self.is_free(row + drow, col) and self.is_free(row, col + dcol))
+
+    def actions_iter(self, state):
+        return (action for action in self.moves
+                if self.can_move(state, action))
+
+    def step_cost(self, state, action):
+        if action[0] != 0 and action[1] != 0:
+            return _GridProblem.DIAGONAL_COST
+        return 1
+
+    def result(self, state, action):
+        return (state[0] + action[0], state[1] + action[1])
+
+    def goal_test(self, state):
+        return state == self.goal
+
+
+class Game:
+    def actions_iter(self, state):
+        raise NotImplementedError("Game is abc")
+
+    def result(self, state, action):
+        raise NotImplementedError("Game is abc")
+
+    def terminal_test(self, state):
+        raise NotImplementedError("Game is abc")
+
+    def utility(self, state, player):
+        raise NotImplementedError("Game is abc")
+
+    def to_move(self, state):
+        raise NotImplementedError("Game is abc")
+
+    def evaluate(self, state, player):
+        # Estimated utility of a nonterminal state, used when the search is
+        # cut off before reaching the end of the game
+        return 0
+
+    def features(self, state):
+        # Hashable (position, piece) pairs describing the state.
+        # Used to build Zobrist keys for transposition tables.
+        raise NotImplementedError("Game is abc")
+
+    def feature_delta(self, state, action, next_state):
+        # The features removed and added by a move. Games should override
+        # this with something cheaper than comparing whole states.
+        before = set(self.features(state))
+        after = set(self.features(next_state))
+        return before - after, after - before
+
+
+class _KInARowGame(Game):
+    EMPTY = "-"
+    PLAYERS = ("X", "O")
+
+    def __init__(self, rows, columns, k, gravity):
+        self.rows = rows
+        self.columns = columns
+        self.k = k
+        self.gravity = gravity
+        self.initial = (_KInARowGame.EMPTY, ) * (rows * columns)
+        self.lines = list(self.__lines())
+
+    def __lines(self):
+        directions = ((0, 1), (1, 0), (1, 1), (1, -1))
+        for row in range(self.rows):
+            for col in range(self.columns):
+                for drow, dcol in directions:
+                    end_row = row + drow * (self.k - 1)
+                    end_col = col + dcol * (self.k - 1)
+                    if 0 <= end_row < self.rows and \
+                       0 <= end_col < self.columns:
+                        yield tuple((row + drow * i) * self.columns +
+                                    col + dcol * i for i in range(self.k))
+
+    def __winner(self, state):
+        for line in self.lines:
+            first = state[line[0]]
+            if first != _KInARowGame.EMPTY and \
+               all(state[index] == first for index in line):
+                return first
+        return None
+
+    def actions_iter(self, state):
+        if self.gravity:
+            # Pieces fall to the bottom, so the action is the column
+            return (col for col in range(self.columns)
+                    if state[col] == _KInARowGame.EMPTY)
+        return (index for index, cell in enumerate(state)
+                if cell == _KInARowGame.EMPTY)
+
+    def __cell_of(self, state, action):
+        if not self.gravity:
+            return action
+        index = action + (self.rows - 1) * self.columns
+        while state[index] != _KInARowGame.EMPTY:
+            index -= self.columns
+        return index
+
+    def result(self, state, action):
+        next_state = list(state)
+        next_state[self.__cell_of(state, action)] = self.to_move(state)
+        return tuple(next_state)
+
+    def to_move(self, state):
+        first, second = _KInARowGame.PLAYERS
+        return first if state.count(first) == state.count(second) else second
+
+    def terminal_test(self, state):
+        return _KInARowGame.EMPTY not in state or \
+            self.__winner(state) is not None
+
+    def utility(self, state, player):
+        winner = self.__winner(state)
+        if winner is None:
+            return 0
+        return 1 if winner == player else -1
+
+    def evaluate(self, state, player):
+        # Lines still open for a single player, weighted by how many of their
+        # pieces they hold, normalized to stay strictly between -1 and 1
+        score = 0
+        for line in self.lines:
+            marks = {state[index] for index in line}
+            marks.discard(_KInARowGame.EMPTY)
+            if len(marks) != 1:
+                continue
+            owner = marks.pop()
+            pieces = sum(1 for index in line if state[index] == owner)
+            score += pieces ** 2 if owner == player else -pieces ** 2
+        return score / (len(self.lines) * self.k ** 2 + 1)
+
+    def features(self, state):
+        return ((index, cell) for index, cell in enumerate(state)
+                if cell != _KInARowGame.EMPTY)
+
+    def feature_delta(self, state, action, next_state):
+        index = self.__cell_of(state, action)
+        return (), ((index, next_state[index]), )
+
+
 class ProblemFactory:
     def from_graph(self, graph, root, goal):
         return _GraphProblem(graph, root, goal)
@@ -253,25 +467,72 @@ class ProblemFactory:
 
         return problem
 
+    def from_nondeterministic_functions(self, initial_state, actions,
+                                        results, goal_test):
+        problem = Problem()
+        problem.initial = Node(initial_state, None, None, 0)
+        problem.actions_iter = actions
+        problem.results = results
+        problem.goal_test = goal_test
+
+        return problem
+
     def from_npuzzle(self, initial, goal):
         return _NPuzzleProblem(initial, goal)
 
     def from_nqueens(self, size, initial=None):
         return _NQueensProblem(size, initial)
 
+    def from_grid(self, rows, columns, obstacles, start, goal,
+                  diagonal=False):
+        return _GridProblem(rows, columns, obstacles, start, goal, diagonal)
+
+    def from_tictactoe(self):
+        return _KInARowGame(3, 3, 3, gravity=False)
+
+    def from_connect_four(self):
+        return _KInARowGame(6, 7, 4, gravity=True)
+
     def _manhattan_heuristic(problem_instance, state):
-        scoords = [problem_instance.coords_of(state, num) for num in state]
-        gcoords = [problem_instance.coords_of(state, num)
-                   for num in problem_instance.goal]
-        diff = [abs(scoords[i][0] - gcoords[i][0]) +
-                abs(scoords[i][1] - gcoords[i][1])
-                for i in range(0, len(state) - 1)]
-        return sum(diff)
+        # The blank is not a tile; counting it would overestimate
+        size = problem_instance.board_size
+        distance = 0
+        for index, number in enumerate(problem_instance.goal):
+            if number == "0":
+                continue
+            row, col = problem_instance.coords_of(state, number)
+            distance += abs(row - index // size) + abs(col - index % size)
+        return distance
+
+    def _grid_heuristic(problem_instance, state):
+        drow = abs(state[0] - problem_instance.goal[0])
+        dcol = abs(state[1] - problem_instance.goal[1])
+        if not problem_instance.diagonal:
+            return drow + dcol
+        # Octile distance
+        straight, diagonal = max(drow, dcol), min(drow, dcol)
+        return straight - diagonal + _GridProblem.DIAGONAL_COST * diagonal
 
     def heuristic_for(self, problem):
         if isinstance(problem, _NPuzzleProblem):
-            return partial(ProblemFactory._manhattan_heuristic, problem)
+            heuristic = partial(ProblemFactory._manhattan_heuristic, problem)
+            heuristic.integer_valued = True
+            return heuristic
+        elif isinstance(problem, _GridProblem):
+            heuristic = partial(ProblemFactory._grid_heuristic, problem)
+            heuristic.integer_valued = not problem.diagonal
+            return heuristic
         elif isinstance(problem, _NQueensProblem):
             return _NQueensProblem.attacking
+        elif isinstance(problem, _GraphProblem):
+            # Exact distances when all pairs were computed for the graph
+            matrix = graphs.distance_matrix_for(problem.graph)
+            if matrix is not None:
+                return matrix.heuristic(problem.goal)
+            straight_line = routing.straight_line_for(problem.graph)
+            if straight_line is not None:
+                return straight_line.heuristic(problem.goal)
+            landmarks = routing.landmarks_for(problem.graph)
+            return landmarks.heuristic(problem.goal)
         else:
             raise TypeError("No heuristic exists for this type of problem")
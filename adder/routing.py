@@ -0,0 +1,852 @@
+from array import array
+from collections import defaultdict
+from itertools import chain, count
+import heapq
+import os
+import random
+import struct
+import sys
+import weakref
+import zlib
+
+from adder import problem, utils
+from adder.graphs import Graph, _write_atomically
+from adder.utils import InvalidArgumentError
+
+
+def forward_neighbours(graph):
+    return lambda node: ((child, graph.edge_cost(node, child))
+                         for child in graph.children_iter(node))
+
+
+def is_undirected(graph):
+    return isinstance(graph, Graph) or \
+        getattr(graph, "is_directed", True) is False
+
+
+def backward_neighbours(graph):
+    if is_undirected(graph):
+        return forward_neighbours(graph)
+    # Digraphs only know the children of a node, so the predecessors are
+    # collected once
+    parents = defaultdict(list)
+    for node in graph.get_nodes():
+        for child in graph.children_iter(node):
+            parents[child].append((node, graph.edge_cost(node, child)))
+    return lambda node: iter(parents.get(node, ()))
+
+
+def dijkstra(neighbours, source, target=None):
+    # Returns the distances and the parents of every node reached from
+    # source, stopping early once target is settled
+    distances = {source: 0}
+    parents = {source: None}
+    settled = set()
+    frontier = [(0, 0, source)]
+    tie_breaker = 1
+    while len(frontier) != 0:
+        distance, _, node = heapq.heappop(frontier)
+        if node in settled:
+            continue
+        settled.add(node)
+        if node == target:
+            break
+        for child, cost in neighbours(node):
+            child_distance = distance + cost
+            if child_distance < distances.get(child, float("inf")):
+                distances[child] = child_distance
+                parents[child] = node
+                heapq.heappush(frontier, (child_distance, tie_breaker, child))
+                tie_breaker += 1
+
+    return distances, parents
+
+
+FARTHEST = "farthest"
+AVOID = "avoid"
+
+
+class Landmarks:
+    # ALT preprocessing: the distances from and to a few landmarks give
+    # lower bounds through the triangle inequality,
+    # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L)
+    def __init__(self, graph, count=8, strategy=FARTHEST):
+        if count <= 0:
+            raise InvalidArgumentError("At least one landmark is needed")
+        if strategy not in (FARTHEST, AVOID):
+            raise InvalidArgumentError("Unknown landmark strategy")
+        self.version = graph.version
+        self.landmarks = []
+        self.distances_from = []
+        self.distances_to = []
+
+        nodes = sorted(graph.get_nodes())
+        forward = forward_neighbours(graph)
+        backward = backward_neighbours(graph)
+        count = min(count, len(nodes))
+        if strategy == FARTHEST:
+            self.__select_farthest(nodes, count, forward, backward)
+        else:
+            self.__select_avoid(nodes, count, forward, backward)
+
+    def __add(self, landmark, forward, backward):
+        self.landmarks.append(landmark)
+        self.distances_from.append(dijkstra(forward, landmark)[0])
+        self.distances_to.append(dijkstra(backward, landmark)[0])
+
+    def __select_farthest(self, nodes, count, forward, backward):
+        # Each landmark is the node farthest from the chosen ones. Nodes that
+        # no landmark reaches come first, which covers every component.
+        if count == 0:
+            return
+        start = random.choice(nodes)
+        distances = dijkstra(forward, start)[0]
+        closest = {node: float("inf") for node in nodes}
+        landmark = max(nodes, key=lambda node: (distances.get(node, -1)))
+        while True:
+            self.__add(landmark, forward, backward)
+            if len(self.landmarks) == count:
+                return
+            distances = self.distances_from[-1]
+            for node in nodes:
+                distance = distances.get(node, float("inf"))
+                if distance < closest[node]:
+                    closest[node] = distance
+            for chosen in self.landmarks:
+                closest[chosen] = -1
+            landmark = max(nodes, key=closest.__getitem__)
+
+    def __select_avoid(self, nodes, count, forward, backward):
+        # Grows a shortest path tree from a random root and weighs each node
+        # by how badly the current landmarks bound its distance. The new
+        # landmark is the leaf reached by descending into the heaviest
+        # subtrees that contain no landmark yet.
+        while len(self.landmarks) < count:
+            root = random.choice(nodes)
+            distances, parents = dijkstra(forward, root)
+            bound = self.heuristic(root)
+            weights = {node: distance - bound(node)
+                       for node, distance in distances.items()}
+
+            children = defaultdict(list)
+            for node, parent in parents.items():
+                if parent is not None:
+                    children[parent].append(node)
+            order = [root]
+            for node in order:
+                order.extend(children[node])
+
+            landmark_set = set(self.landmarks)
+            sizes = {}
+            # Subtrees holding a landmark are marked with None
+            for node in reversed(order):
+                child_sizes = [sizes[child] for child in children[node]]
+                if node in landmark_set or None in child_sizes:
+                    sizes[node] = None
+                else:
+                    sizes[node] = weights[node] + sum(child_sizes)
+
+            node = root
+            while True:
+                candidates = [child for child in children[node]
+                              if sizes[child] is not None]
+                if len(candidates) == 0:
+                    break
+                node = max(candidates, key=sizes.__getitem__)
+
+            if node in landmark_set:
+                # The root's tree is covered, fall back to any free node
+                node = next(node for node in nodes if node not in landmark_set)
+            self.__add(node, forward, backward)
+
+    def heuristic(self, goal):
+        tables = [(distances_from.get(goal, INFINITY),
+                   distances_to.get(goal, INFINITY),
+                   distances_from, distances_to)
+                  for distances_from, distances_to
+                  in zip(self.distances_from, self.distances_to)]
+
+        def lower_bound(state):
+            best = 0
+            for from_goal, to_goal, distances_from, distances_to in tables:
+                from_state = distances_from.get(state, INFINITY)
+                to_state = distances_to.get(state, INFINITY)
+                # A landmark reaching the state but not the goal proves
+                # that the goal is unreachable, and so does one reachable
+                # from the goal but not from the state
+                if from_state != INFINITY and from_goal - from_state > best:
+                    best = from_goal - from_state
+                if to_goal != INFINITY and to_state - to_goal > best:
+                    best = to_state - to_goal
+            return best
+        return lower_bound
+
+    def save(self, path, graph_path):
+        nodes = sorted(set(chain.from_iterable(self.distances_from)) |
+                       set(chain.from_iterable(self.distances_to)) |
+                       set(self.landmarks))
+        ids = {node: index for index, node in enumerate(nodes)}
+        blob = bytearray()
+        name_offsets = array("q", [0])
+        for node in nodes:
+            blob += node.encode("utf-8")
+            name_offsets.append(len(blob))
+        landmark_ids = array("q", (ids[landmark]
+                                   for landmark in self.landmarks))
+        tables = array("d")
+        for table in self.distances_from + self.distances_to:
+            tables.extend(table.get(node, INFINITY) for node in nodes)
+        sections = (name_offsets, landmark_ids, tables, blob)
+
+        checksum = 0
+        for section in sections:
+            checksum = zlib.crc32(section, checksum)
+        flags = _BIG_ENDIAN_FLAG if sys.byteorder == "big" else 0
+        size, mtime = _file_fingerprint(graph_path)
+        header = _LANDMARKS_HEADER.pack(
+            _LANDMARKS_MAGIC, _LANDMARKS_VERSION, flags, len(nodes),
+            len(self.landmarks), len(blob), size, mtime, checksum)
+        _write_atomically(path, (header,) + sections, "wb")
+
+    def load(graph, path, graph_path, count=None):
+        # Returns None when the file is missing, stale, damaged or holds
+        # another number of landmarks than count
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            fingerprint = _file_fingerprint(graph_path)
+        except OSError:
+            return None
+        header_size = _LANDMARKS_HEADER.size
+        if len(data) < header_size:
+            return None
+        magic, version, flags, node_count, landmark_count, names_size, \
+            size, mtime, checksum = _LANDMARKS_HEADER.unpack_from(data)
+        is_big_endian = flags & _BIG_ENDIAN_FLAG != 0
+        sizes = (8 * (node_count + 1), 8 * landmark_count,
+                 16 * landmark_count * node_count, names_size)
+        if magic != _LANDMARKS_MAGIC or version != _LANDMARKS_VERSION or \
+                is_big_endian != (sys.byteorder == "big") or \
+                len(data) != header_size + sum(sizes) or \
+                zlib.crc32(memoryview(data)[header_size:]) != checksum or \
+                (size, mtime) != fingerprint:
+            return None
+        if count is not None and \
+                landmark_count != min(count, graph.node_count()):
+            return None
+
+        sections = []
+        start = header_size
+        for section_size in sizes:
+            sections.append(memoryview(data)[start:start + section_size])
+            start += section_size
+        name_offsets, landmark_ids, tables, blob = sections
+        name_offsets = name_offsets.cast("q")
+        try:
+            nodes = [str(blob[name_offsets[index]:name_offsets[index + 1]],
+                         "utf-8") for index in range(node_count)]
+            landmarks = Landmarks.__new__(Landmarks)
+            landmarks.landmarks = [nodes[index]
+                                   for index in landmark_ids.cast("q")]
+        except (UnicodeDecodeError, IndexError):
+            return None
+        landmarks.version = graph.version
+        tables = tables.cast("d")
+        rows = [{node: distance for node, distance in
+                 zip(nodes, tables[row * node_count:(row + 1) * node_count])
+                 if distance != INFINITY}
+                for row in range(2 * landmark_count)]
+        landmarks.distances_from = rows[:landmark_count]
+        landmarks.distances_to = rows[landmark_count:]
+        return landmarks
+
+
+INFINITY = float("inf")
+DEFAULT_LANDMARK_COUNT = 8
+# Binary sidecar layout: the header, node name offsets (int64), landmark
+# node ids (int64), the distances from and then to every landmark (float64,
+# one row of all nodes per landmark, infinity when unreachable) and the
+# UTF-8 names. The graph file's size and mtime mark the sidecar as stale.
+_LANDMARKS_MAGIC = b"ADDERLMK"
+_LANDMARKS_VERSION = 2
+_LANDMARKS_HEADER = struct.Struct("<8sIIQQQQqI4x")
+_BIG_ENDIAN_FLAG = 1
+__landmark_cache = weakref.WeakKeyDictionary()
+
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def sidecar_path(graph_path):
+    return graph_path + ".landmarks"
+
+
+def save_landmarks(graph, count=DEFAULT_LANDMARK_COUNT, strategy=FARTHEST):
+    # Stores the landmarks of a graph loaded from a file next to that file
+    path = getattr(graph, "source_path", None)
+    if path is None:
+        raise InvalidArgumentError("The graph was not loaded from a file")
+    landmarks = Landmarks(graph, count, strategy)
+    landmarks.save(sidecar_path(path), path)
+    __landmark_cache[graph] = landmarks
+    return landmarks
+
+
+def landmarks_for(graph, count=DEFAULT_LANDMARK_COUNT):
+    # Landmarks are computed once per graph version, or read from the file
+    # saved next to the graph while the graph is unchanged since loading.
+    # Either is only reused when it has count landmarks.
+    expected_count = min(count, graph.node_count())
+    landmarks = __landmark_cache.get(graph)
+    if landmarks is not None and landmarks.version == graph.version and \
+            len(landmarks.landmarks) == expected_count:
+        return landmarks
+
+    landmarks = None
+    path = getattr(graph, "source_path", None)
+    if path is not None and graph.version == graph.source_version:
+        landmarks = Landmarks.load(graph, sidecar_path(path), path, count)
+    if landmarks is None:
+        landmarks = Landmarks(graph, count)
+    __landmark_cache[graph] = landmarks
+    return landmarks
+
+
+class StraightLineHeuristic:
+    # Distances between node coordinates scaled down so that no edge costs
+    # less than the scaled distance between its ends, which keeps the
+    # estimate admissible whatever unit the costs are in
+    def __init__(self, graph):
+        coordinates = graph.coordinates
+        if coordinates is None:
+            raise InvalidArgumentError("The graph has no coordinates")
+        self.coordinates = coordinates
+        self.version = graph.version
+        self.scale = INFINITY
+        nodes = graph.get_nodes()
+        for node in nodes:
+            if node not in coordinates:
+                raise InvalidArgumentError(
+                    "Node {0} has no coordinates".format(node))
+        for node in nodes:
+            for child in graph.children_iter(node):
+                distance = coordinates.distance(node, child)
+                if distance > 0:
+                    self.scale = min(self.scale,
+                                     graph.edge_cost(node, child) / distance)
+        if self.scale == INFINITY:
+            self.scale = 0
+
+    def heuristic(self, goal):
+        goal_point = self.coordinates[goal]
+        distance = self.coordinates.point_distance
+        scale = self.scale
+        return lambda node: scale * distance(self.coordinates[node],
+                                             goal_point)
+
+
+__straight_line_cache = weakref.WeakKeyDictionary()
+
+
+def straight_line_for(graph):
+    # None unless every node of the graph has coordinates. Both outcomes are
+    # cached until the graph or its coordinates change.
+    coordinates = graph.coordinates
+    key = (graph.version, coordinates,
+           getattr(coordinates, "version", None))
+    cached = __straight_line_cache.get(graph)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        heuristic = StraightLineHeuristic(graph)
+    except InvalidArgumentError:
+        heuristic = None
+    __straight_line_cache[graph] = (key, heuristic)
+    return heuristic
+
+
+class ContractionHierarchy:
+    # Contracts the nodes one by one in order of importance, adding a
+    # shortcut u -> w for every path u -> v -> w which is the only shortest
+    # one when v is removed. Queries then only follow edges towards more
+    # important nodes, from the source forwards and from the target
+    # backwards, which settles a tiny part of the graph.
+    def __init__(self, graph, witness_settle_limit=500):
+        self.graph = graph
+        self.version = graph.version
+        self.__settle_limit = witness_settle_limit
+        # Middle node of every shortcut, used to unpack paths
+        self.__middles = {}
+        self.rank = {}
+        self.upward_edges = defaultdict(dict)
+        self.downward_edges = defaultdict(dict)
+        self.shortcut_count = 0
+
+        out_edges = defaultdict(dict)
+        in_edges = defaultdict(dict)
+        for node in graph.get_nodes():
+            for child, cost in forward_neighbours(graph)(node):
+                if node != child:
+                    out_edges[node][child] = cost
+                    in_edges[child][node] = cost
+        self.__contract_all(graph.get_nodes(), out_edges, in_edges)
+
+    def __shortcuts(self, node, out_edges, in_edges):
+        shortcuts = []
+        for source, in_cost in in_edges[node].items():
+            targets = {target: in_cost + out_cost
+                       for target, out_cost in out_edges[node].items()
+                       if target != source}
+            if len(targets) == 0:
+                continue
+            witnesses = self.__witness_search(source, node, max(
+                targets.values()), out_edges)
+            for target, cost in targets.items():
+                if witnesses.get(target, INFINITY) > cost:
+                    shortcuts.append((source, target, cost))
+        return shortcuts
+
+    def __witness_search(self, source, avoided, max_cost, out_edges):
+        # Bounded Dijkstra which ignores the node being contracted. Giving
+        # up early only adds unnecessary shortcuts.
+        distances = {source: 0}
+        frontier = [(0, 0, source)]
+        tie_breaker = 1
+        settled = 0
+        while len(frontier) != 0 and settled < self.__settle_limit:
+            distance, _, node = heapq.heappop(frontier)
+            if distance > max_cost:
+                break
+            if distance > distances[node]:
+                continue
+            settled += 1
+            for child, cost in out_edges[node].items():
+                child_distance = distance + cost
+                if child != avoided and \
+                   child_distance < distances.get(child, INFINITY):
+                    distances[child] = child_distance
+                    heapq.heappush(frontier, (child_distance, tie_breaker,
+                                              child))
+                    tie_breaker += 1
+        return distances
+
+    def __priority(self, node, out_edges, in_edges, contracted_neighbours):
+        # Edge difference plus the number of contracted neighbours, which
+        # spreads the contraction uniformly over the graph
+        shortcuts = self.__shortcuts(node, out_edges, in_edges)
+        return len(shortcuts) - len(out_edges[node]) - len(in_edges[node]) + \
+            contracted_neighbours[node]
+
+    def __contract_all(self, nodes, out_edges, in_edges):
+        contracted_neighbours = defaultdict(int)
+        queue = [(self.__priority(node, out_edges, in_edges,
+                                  contracted_neighbours), index, node)
+                 for index, node in enumerate(nodes)]
+        heapq.heapify(queue)
+        while len(queue) != 0:
+            _, index, node = heapq.heappop(queue)
+            # Lazy updates: recompute the priority and contract only if the
+            # node is still the least important one
+            priority = self.__priority(node, out_edges, in_edges,
+                                       contracted_neighbours)
+            if len(queue) != 0 and priority > queue[0][0]:
+                heapq.heappush(queue, (priority, index, node))
+                continue
+
+            self.rank[node] = len(self.rank)
+            for source, target, cost in self.__shortcuts(node, out_edges,
+                                                         in_edges):
+                if cost < out_edges[source].get(target, INFINITY):
+                    out_edges[source][target] = cost
+                    in_edges[target][source] = cost
+                    self.__middles[(source, target)] = node
+                    self.shortcut_count += 1
+
+            # The remaining neighbours are all more important than the node
+            for target, cost in out_edges.pop(node).items():
+                self.upward_edges[node][target] = cost
+                del in_edges[target][node]
+                contracted_neighbours[target] += 1
+            for source, cost in in_edges.pop(node).items():
+                self.downward_edges[node][source] = cost
+                del out_edges[source][node]
+                contracted_neighbours[source] += 1
+
+    def __search_step(self, tie_breaker, frontier, distances, parents, edges,
+                      settled):
+        distance, _, node = heapq.heappop(frontier)
+        if node in settled:
+            return None
+        settled.add(node)
+        for neighbour, cost in edges.get(node, {}).items():
+            neighbour_distance = distance + cost
+            if neighbour_distance < distances.get(neighbour, INFINITY):
+                distances[neighbour] = neighbour_distance
+                parents[neighbour] = node
+                heapq.heappush(frontier, (neighbour_distance,
+                                          next(tie_breaker), neighbour))
+        return node
+
+    def shortest_path(self, source, target):
+        # Returns the path in the format of the search algorithms, or
+        # FAILURE when the target is unreachable
+        if self.graph.version != self.version:
+            raise InvalidArgumentError("The graph changed after "
+                                       "the preprocessing")
+        for node in (source, target):
+            if node not in self.rank:
+                raise InvalidArgumentError("{0} is not a node in the graph"
+                                           .format(node))
+
+        tie_breaker = count(1)
+        forward = ([(0, 0, source)], {source: 0}, {source: None},
+                   self.upward_edges, set())
+        backward = ([(0, 0, target)], {target: 0}, {target: None},
+                    self.downward_edges, set())
+        best_cost = INFINITY
+        meeting = None
+        while True:
+            searches = [search for search in (forward, backward)
+                        if len(search[0]) != 0 and search[0][0][0] < best_cost]
+            if len(searches) == 0:
+                break
+            # Alternate by always advancing the search with the lower key
+            search = min(searches, key=lambda search: search[0][0][0])
+            node = self.__search_step(tie_breaker, *search)
+            if node is None:
+                continue
+            cost = forward[1].get(node, INFINITY) + \
+                backward[1].get(node, INFINITY)
+            if cost < best_cost:
+                best_cost = cost
+                meeting = node
+
+        if meeting is None:
+            return problem.FAILURE
+
+        path = []
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = forward[2][node]
+        path.reverse()
+        node = backward[2][meeting]
+        while node is not None:
+            path.append(node)
+            node = backward[2][node]
+        return self.__unpack(path)
+
+    def __unpack(self, path):
+        nodes = [path[0]]
+        # Edges left to unpack, the next one is on top
+        stack = list(reversed(list(zip(path, path[1:]))))
+        while len(stack) != 0:
+            source, target = stack.pop()
+            middle = self.__middles.get((source, target))
+            if middle is None:
+                nodes.append(target)
+            else:
+                stack.append((middle, target))
+                stack.append((source, middle))
+
+        solution = [(node, node) for node in nodes]
+        solution[0] = (nodes[0], None)
+        return solution
+
+
+class ShortestPathService:
+    # Answers one-to-many queries from shortest path trees, keeping the
+    # trees of the most recently used sources. Every tree is dropped as soon
+    # as the graph changes. Backward trees hold the distances to their root
+    # and the next node on the way there instead of the parents.
+    def __init__(self, graph, max_trees=64, backward=False):
+        self.graph = graph
+        self.version = graph.version
+        self.trees = utils.LruCache(max_trees)
+        self.backward = backward
+        self.__neighbours = self.__neighbours_for(graph)
+
+    def __neighbours_for(self, graph):
+        if self.backward:
+            return backward_neighbours(graph)
+        return forward_neighbours(graph)
+
+    def tree(self, source):
+        # Returns the distances and parents of the nodes reachable from source
+        if self.graph.version != self.version:
+            self.trees.clear()
+            self.version = self.graph.version
+            # The predecessors of a digraph are collected up front
+            if self.backward:
+                self.__neighbours = self.__neighbours_for(self.graph)
+        if not self.graph.has_node(source):
+            raise InvalidArgumentError("{0} is not a node in the graph"
+                                       .format(source))
+        tree = self.trees.get(source)
+        if tree is None:
+            tree = self._build_tree(source)
+            self.trees.put(source, tree)
+        return tree
+
+    def _build_tree(self, source):
+        return dijkstra(self.__neighbours, source)
+
+    def distance(self, source, target):
+        if self.backward:
+            return self.tree(target)[0].get(source, INFINITY)
+        return self.tree(source)[0].get(target, INFINITY)
+
+    def path(self, source, target):
+        # Same format as the solutions of the search algorithms. Backward
+        # services use the tree of target and walk it from source.
+        if self.backward:
+            distances, next_nodes = self.tree(target)
+            if source not in distances:
+                return problem.FAILURE
+            nodes = _tree_path(next_nodes, source)
+        else:
+            distances, parents = self.tree(source)
+            if target not in distances:
+                return problem.FAILURE
+            nodes = _tree_path(parents, target)
+            nodes.reverse()
+        solution = [(node, node) for node in nodes]
+        solution[0] = (source, None)
+        return solution
+
+    def distance_table(self, sources, targets):
+        targets = list(targets)
+        return [[self.distance(source, target) for target in targets]
+                for source in sources]
+
+
+class DynamicShortestPaths(ShortestPathService):
+    # Keeps the cached shortest path trees valid under edge changes by
+    # repairing only the nodes whose distance can change, instead of
+    # dropping the trees. Call close() to stop listening to the graph.
+    def __init__(self, graph, max_trees=64):
+        ShortestPathService.__init__(self, graph, max_trees)
+        self.__predecessors = defaultdict(dict)
+        for node, child, cost in graph.dfs_iter(edges=True):
+            self.__predecessors[child][node] = cost
+        graph.add_listener(self.on_change)
+
+    def close(self):
+        self.graph.remove_listener(self.on_change)
+
+    def tree(self, source):
+        return ShortestPathService.tree(self, source)[:2]
+
+    def _build_tree(self, source):
+        # The children of every node are kept to find subtrees quickly
+        distances, parents = ShortestPathService._build_tree(self, source)
+        children = defaultdict(set)
+        for node, parent in parents.items():
+            if parent is not None:
+                children[parent].add(node)
+        return distances, parents, children
+
+    def on_change(self, source, destination, old_cost, new_cost):
+        if new_cost is None:
+            del self.__predecessors[destination][source]
+        else:
+            self.__predecessors[destination][source] = new_cost
+
+        for _, tree in self.trees.items():
+            if new_cost is not None and (old_cost is None or
+                                         new_cost < old_cost):
+                self.__decrease(tree, source, destination, new_cost)
+            elif new_cost is None or new_cost > old_cost:
+                self.__increase(tree, source, destination)
+        # Every change has been applied to the trees
+        self.version = self.graph.version
+
+    def __set_parent(self, tree, node, parent, distance):
+        distances, parents, children = tree
+        old_parent = parents.get(node)
+        if old_parent is not None:
+            children[old_parent].discard(node)
+        distances[node] = distance
+        parents[node] = parent
+        children[parent].add(node)
+
+    def __relax(self, tree, frontier, allowed=None):
+        # Dijkstra from an initial frontier of (distance, node) pairs which
+        # are already in the tree. With allowed set only those nodes are
+        # relaxed, no other node can improve.
+        distances = tree[0]
+        tie_breaker = count(len(frontier))
+        frontier = [(distance, index, node)
+                    for index, (distance, node) in enumerate(frontier)]
+        heapq.heapify(frontier)
+        while len(frontier) != 0:
+            distance, _, node = heapq.heappop(frontier)
+            if distance > distances[node]:
+                continue
+            for child in self.graph.children_iter(node):
+                if allowed is not None and child not in allowed:
+                    continue
+                child_distance = distance + self.graph.edge_cost(node, child)
+                if child_distance < distances.get(child, INFINITY):
+                    self.__set_parent(tree, child, node, child_distance)
+                    heapq.heappush(frontier, (child_distance,
+                                              next(tie_breaker), child))
+
+    def __decrease(self, tree, source, destination, cost):
+        distances = tree[0]
+        if source not in distances:
+            return
+        distance = distances[source] + cost
+        if distance < distances.get(destination, INFINITY):
+            self.__set_parent(tree, destination, source, distance)
+            self.__relax(tree, [(distance, destination)])
+
+    def __increase(self, tree, source, destination):
+        distances, parents, children = tree
+        if destination not in parents or parents[destination] != source:
+            # Edges outside of the tree carry no shortest path
+            return
+
+        # Only the subtree hanging from the edge gets longer distances
+        affected = [destination]
+        for node in affected:
+            affected.extend(children[node])
+        affected = set(affected)
+        children[source].discard(destination)
+        for node in affected:
+            del distances[node]
+            del parents[node]
+            children.pop(node, None)
+
+        # Reconnect the subtree through its best edges from the rest
+        frontier = []
+        for node in affected:
+            best, best_parent = INFINITY, None
+            for predecessor, cost in self.__predecessors[node].items():
+                distance = distances.get(predecessor, INFINITY) + cost
+                if distance < best:
+                    best, best_parent = distance, predecessor
+            if best_parent is not None:
+                self.__set_parent(tree, node, best_parent, best)
+                frontier.append((best, node))
+        self.__relax(tree, frontier, affected)
+
+
+__backward_services = weakref.WeakKeyDictionary()
+
+
+def k_shortest_paths(graph, source, target, service=None):
+    # Yen's algorithm: lazily yields (cost, solution) for the loopless paths
+    # from source to target by increasing cost. Every spur search is an A*
+    # guided by the distances to target, taken from the backward tree of
+    # target in service, and is skipped when the tree path itself avoids
+    # the removed edges and nodes.
+    if service is None:
+        service = __backward_services.get(graph)
+        if service is None:
+            service = ShortestPathService(graph, backward=True)
+            __backward_services[graph] = service
+    elif not service.backward or service.graph is not graph:
+        raise InvalidArgumentError("A backward service of the graph is needed")
+    if not graph.has_node(source):
+        raise InvalidArgumentError("{0} is not a node in the graph"
+                                   .format(source))
+    to_target, next_nodes = service.tree(target)
+    if source not in to_target:
+        return
+    version = graph.version
+
+    def path_cost(nodes):
+        return sum(graph.edge_cost(node, child)
+                   for node, child in zip(nodes, nodes[1:]))
+
+    found = []
+    nodes = _tree_path(next_nodes, source)
+    candidates = []
+    seen = {tuple(nodes)}
+    tie_breaker = count()
+    while True:
+        found.append(nodes)
+        solution = [(node, node) for node in nodes]
+        solution[0] = (source, None)
+        yield (path_cost(nodes), solution)
+        if graph.version != version:
+            raise InvalidArgumentError("The graph changed during the query")
+
+        root_cost = 0
+        for index, spur in enumerate(nodes[:-1]):
+            root = nodes[:index + 1]
+            removed_edges = {path[index + 1] for path in found
+                             if path[:index + 1] == root}
+            removed_nodes = set(root[:-1])
+            spur_path = __spur_path(graph, spur, target, to_target,
+                                    next_nodes, removed_edges, removed_nodes)
+            if spur_path is not None:
+                candidate = root[:-1] + spur_path
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    heapq.heappush(candidates, (
+                        root_cost + path_cost(spur_path), next(tie_breaker),
+                        candidate))
+            root_cost += graph.edge_cost(spur, nodes[index + 1])
+
+        if len(candidates) == 0:
+            return
+        nodes = heapq.heappop(candidates)[2]
+
+
+def _tree_path(links, node, removed_nodes=()):
+    # The nodes from node up to the root of a tree given by parents or, in a
+    # backward tree, next nodes. None if the path crosses removed_nodes.
+    nodes = [node]
+    while links[node] is not None:
+        node = links[node]
+        if node in removed_nodes:
+            return None
+        nodes.append(node)
+    return nodes
+
+
+def __spur_path(graph, spur, target, to_target, next_nodes, removed_children,
+                removed_nodes):
+    # Shortest path from spur to target which avoids removed_nodes and the
+    # edges from spur to removed_children
+    if spur == target:
+        return None
+    if next_nodes[spur] not in removed_children:
+        nodes = _tree_path(next_nodes, spur, removed_nodes)
+        if nodes is not None:
+            return nodes
+
+    # A* with the exact distances of the unrestricted graph, which are a
+    # consistent lower bound once edges are removed
+    distances = {spur: 0}
+    parents = {spur: None}
+    frontier = [(to_target[spur], 0, spur)]
+    tie_breaker = count(1)
+    settled = set()
+    while len(frontier) != 0:
+        _, _, node = heapq.heappop(frontier)
+        if node in settled:
+            continue
+        if node == target:
+            nodes = []
+            while node is not None:
+                nodes.append(node)
+                node = parents[node]
+            nodes.reverse()
+            return nodes
+        settled.add(node)
+        for child in graph.children_iter(node):
+            if child in removed_nodes or child not in to_target or \
+                    (node == spur and child in removed_children):
+                continue
+            distance = distances[node] + graph.edge_cost(node, child)
+            if distance < distances.get(child, INFINITY):
+                distances[child] = distance
+                parents[child] = node
+                heapq.heappush(frontier, (distance + to_target[child],
+                                          next(tie_breaker), child))
+    return None
@@ -1,10 +1,17 @@
 from itertools import count
-from collections import defaultdict
+from collections import defaultdict, deque
+from array import array
+import heapq
+import os
+import pickle
 import random
 import math
-from time import sleep
+import struct
+import tempfile
+import zlib
+from time import sleep, monotonic
 
-from adder.problem import FAILURE, SOLUTION_UNKNOWN
+from adder.problem import FAILURE, SOLUTION_UNKNOWN, Node
 from adder.utils import InvalidArgumentError
 
 
@@ -13,6 +20,8 @@ def bfs(problem):
     frontier = []
 
     node = problem.initial
+    if problem.goal_unreachable():
+        return FAILURE
     if problem.goal_test(node.state):
         return problem.construct_solution(node)
 
@@ -32,6 +41,8 @@ def bfs(problem):
 
 
 def depth_limited_search(problem, max_depth):
+    if problem.goal_unreachable():
+        return FAILURE
     return __recursive_dls(problem, problem.initial,
                            {problem.initial}, max_depth)
 
@@ -71,24 +82,248 @@ def iterative_deepening_dfs(problem, max_depth=float("inf")):
             return SOLUTION_UNKNOWN
 
 
-def __astar_key_comparer(pair):
-    return pair[0]
+__EXTERNAL_MAX_OPEN_RUNS = 64
+__EXTERNAL_CHUNK_SIZE = 1 << 16
 
 
-def astar(problem, heuristic):
-    visited = set()
-    node = problem.initial
-    frontier = [node]
+def external_bfs(problem, encode, decode, temp_dir=None,
+                 buffer_size=1 << 20, max_depth=float("inf"),
+                 report_layer=lambda depth, size: None):
+    # States are encoded as unsigned 64-bit integers. Each layer lives on
+    # disk as a sorted file of codes, so at most buffer_size codes are kept
+    # in memory at once. Layer d + 1 is deduplicated against both earlier
+    # layer files, d and d - 1. That is exact when every action can be
+    # undone (undirected graphs, sliding puzzles, grids), since a child of
+    # layer d is then at depth d - 1, d or d + 1. On directed problems older
+    # states come back in later layers: the goal depth is still right, but
+    # an unreachable goal is only detected through max_depth.
+    # Only the last two layers are kept on disk, so the result is the depth
+    # of the goal rather than a solution path; this is meant for
+    # reachability and layer counting jobs that do not fit in memory.
+    if problem.goal_unreachable():
+        return FAILURE
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        paths = ("layer_{0}.bin".format(i) for i in count())
+        new_path = lambda: os.path.join(directory, next(paths))
+
+        current = new_path()
+        __write_codes([encode(problem.initial.state)], current)
+        previous = None
+        for depth in count():
+            size = os.path.getsize(current) // array("Q").itemsize
+            if size == 0:
+                return FAILURE
+            report_layer(depth, size)
+
+            runs = []
+            buffer = []
+            for code in __read_codes(current):
+                state = decode(code)
+                if problem.goal_test(state):
+                    return depth
+                if depth >= max_depth:
+                    continue
+                for action in problem.actions_iter(state):
+                    buffer.append(encode(problem.result(state, action)))
+                if len(buffer) >= buffer_size:
+                    runs.append(new_path())
+                    __write_codes(sorted(set(buffer)), runs[-1])
+                    buffer = []
+            if len(buffer) != 0:
+                runs.append(new_path())
+                __write_codes(sorted(set(buffer)), runs[-1])
+            del buffer
+            if depth >= max_depth:
+                return SOLUTION_UNKNOWN
+
+            while len(runs) > __EXTERNAL_MAX_OPEN_RUNS:
+                merged = new_path()
+                batch = runs[:__EXTERNAL_MAX_OPEN_RUNS]
+                runs = runs[__EXTERNAL_MAX_OPEN_RUNS:] + [merged]
+                __write_codes(__merge_runs(batch), merged)
+                for path in batch:
+                    os.remove(path)
+
+            # Layer depth + 1 minus layers depth and depth - 1
+            seen = [__read_codes(current)]
+            if previous is not None:
+                seen.append(__read_codes(previous))
+            following = new_path()
+            __write_codes(__subtract(__merge_runs(runs), heapq.merge(*seen)),
+                          following)
+            for reader in seen:
+                reader.close()
+
+            for path in runs:
+                os.remove(path)
+            if previous is not None:
+                os.remove(previous)
+            previous, current = current, following
+
+
+def __write_codes(codes, path):
+    chunk = array("Q")
+    with open(path, "wb") as file:
+        for code in codes:
+            chunk.append(code)
+            if len(chunk) == __EXTERNAL_CHUNK_SIZE:
+                chunk.tofile(file)
+                chunk = array("Q")
+        chunk.tofile(file)
+
+
+def __read_codes(path):
+    with open(path, "rb") as file:
+        while True:
+            chunk = array("Q")
+            try:
+                chunk.fromfile(file, __EXTERNAL_CHUNK_SIZE)
+            except EOFError:
+                # fromfile keeps whatever it managed to read
+                yield from chunk
+                return
+            yield from chunk
+
+
+def __merge_runs(paths):
+    previous = None
+    for code in heapq.merge(*(__read_codes(path) for path in paths)):
+        if code != previous:
+            yield code
+            previous = code
+
+
+def __subtract(codes, excluded):
+    # Both streams are sorted, so a single merging pass suffices
+    excluded_code = next(excluded, None)
+    for code in codes:
+        while excluded_code is not None and excluded_code < code:
+            excluded_code = next(excluded, None)
+        if code != excluded_code:
+            yield code
+
+
+FIFO = "FIFO"
+LIFO = "LIFO"
+
+
+class _HeapFrontier:
+    def __init__(self, lifo=False):
+        self.heap = []
+        self.lifo = lifo
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, priority, item):
+        self.counter += 1
+        order = -self.counter if self.lifo else self.counter
+        heapq.heappush(self.heap, (priority, order, item))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+    def items(self):
+        return (item for _, _, item in self.heap)
 
-    f_values = {node: heuristic(node.state)}
+    def map_items(self, func):
+        copy = _HeapFrontier(self.lifo)
+        copy.heap = [(priority, order, func(item))
+                     for priority, order, item in self.heap]
+        copy.counter = self.counter
+        return copy
+
+
+class _BucketFrontier:
+    # Dial's bucket queue: a list of FIFO/LIFO buckets indexed by the
+    # integer priority, giving O(1) pushes and amortized O(1) pops
+    def __init__(self, lifo=False):
+        self.buckets = []
+        self.lifo = lifo
+        self.minimum = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, priority, item):
+        while len(self.buckets) <= priority:
+            self.buckets.append(deque())
+        self.buckets[priority].append(item)
+        self.minimum = min(self.minimum, priority)
+        self.size += 1
+
+    def pop(self):
+        while len(self.buckets[self.minimum]) == 0:
+            self.minimum += 1
+        self.size -= 1
+        bucket = self.buckets[self.minimum]
+        return bucket.pop() if self.lifo else bucket.popleft()
+
+    def items(self):
+        return (item for bucket in self.buckets for item in bucket)
+
+    def map_items(self, func):
+        copy = _BucketFrontier(self.lifo)
+        copy.buckets = [deque(func(item) for item in bucket)
+                        for bucket in self.buckets]
+        copy.minimum = self.minimum
+        copy.size = self.size
+        return copy
+
+
+def __frontier_for(problem, heuristic, tie_breaking):
+    # Problems with integer step costs declare integer_costs, and
+    # heuristics which only return integers have integer_valued set
+    lifo = tie_breaking == LIFO
+    if getattr(problem, "integer_costs", False) and \
+       getattr(heuristic, "integer_valued", False):
+        return _BucketFrontier(lifo)
+    return _HeapFrontier(lifo)
+
+
+def astar(problem, heuristic, checkpoint_path=None, checkpoint_interval=60,
+          tie_breaking=FIFO):
+    if problem.goal_unreachable():
+        return FAILURE
+    node = problem.initial
+    frontier = __frontier_for(problem, heuristic, tie_breaking)
+    frontier.push(heuristic(node.state), node)
+    visited = set()
     g_values = {node: 0}
+    arguments = (problem, heuristic, checkpoint_path, checkpoint_interval)
+    if checkpoint_path is not None:
+        __check_picklable(arguments)
+    return __astar_loop(arguments, frontier, visited, g_values)
+
+
+def __zero_heuristic(state):
+    return 0
+
+
+__zero_heuristic.integer_valued = True
+
+
+def uniform_cost_search(problem, tie_breaking=FIFO):
+    return astar(problem, __zero_heuristic, tie_breaking=tie_breaking)
+
+
+def __astar_loop(arguments, frontier, visited, g_values):
+    problem, heuristic, checkpoint_path, checkpoint_interval = arguments
+    last_checkpoint = monotonic()
     while len(frontier) != 0:
-        # Expand the node with lowest f_value
-        frontier_f_scores = ((f_values[expanded], index)
-                             for index, expanded in enumerate(frontier))
-        node_index = min(frontier_f_scores, key=__astar_key_comparer)[1]
+        if checkpoint_path is not None and \
+           monotonic() - last_checkpoint >= checkpoint_interval:
+            state = __pack_astar(frontier, visited, g_values)
+            __save_checkpoint(checkpoint_path, "astar", arguments, state)
+            last_checkpoint = monotonic()
 
-        node = frontier.pop(node_index)
+        # Entries are never removed from the frontier; a node reached again
+        # through a cheaper path is pushed anew and the old entry skipped
+        node = frontier.pop()
+        if node in visited or node.path_cost > g_values[node]:
+            continue
         visited.add(node)
 
         if problem.goal_test(node.state):
@@ -99,29 +334,340 @@ def astar(problem, heuristic):
             if child in visited:
                 continue
 
-            new_g_value = g_values[node]
-            new_g_value += problem.step_cost(node.state, action)
-            child_index = -1
-            for i, element in enumerate(frontier):
-                if element == child:
-                    child_index = i
+            if child.path_cost < g_values.get(child, float("inf")):
+                g_values[child] = child.path_cost
+                f_value = child.path_cost + heuristic(child.state)
+                frontier.push(f_value, child)
+    return FAILURE
+
+
+def __pack_astar(frontier, visited, g_values):
+    nodes, ids = __flatten_nodes(frontier.items(), visited, g_values)
+    return (nodes,
+            frontier.map_items(lambda node: ids[id(node)]),
+            [ids[id(node)] for node in visited],
+            [(ids[id(node)], value) for node, value in g_values.items()])
 
-            child_in_frontier = child_index != -1
-            needs_update = child_in_frontier and new_g_value < g_values[child]
 
-            if needs_update:
-                # Update the node so that it has proper parent, action and cost
-                frontier[child_index] = child
+def __unpack_astar(state):
+    nodes, frontier, visited, g_values = state
+    nodes = __restore_nodes(nodes)
+    return (frontier.map_items(nodes.__getitem__),
+            {nodes[i] for i in visited},
+            {nodes[i]: value for i, value in g_values})
 
-            if not child_in_frontier:
-                frontier.append(child)
 
-            if not child_in_frontier or needs_update:
-                g_values[child] = new_g_value
-                f_values[child] = new_g_value + heuristic(child.state)
+def breadth_first_heuristic_search(problem, heuristic, upper_bound=None):
+    # Breadth-first frontier search for unit-cost problems with reversible
+    # actions. Only the current and the next layer are kept; each state
+    # remembers which neighbours already generated it, so the closed list is
+    # not needed. States whose f-value exceeds the upper bound are pruned.
+    # Without an upper bound, the bound starts at h(initial) and grows to
+    # the smallest pruned f-value until a solution is found.
+    # The path is rebuilt by divide and conquer through relay states kept
+    # from the middle layer.
+    if problem.goal_unreachable():
+        return FAILURE
+    start = problem.initial.state
+    bound = heuristic(start) if upper_bound is None else upper_bound
+    while True:
+        relay_depth = bound // 2 if bound != float("inf") else bound
+        found, pruned_bound = __bfhs_layers(problem, start,
+                                            problem.goal_test, heuristic,
+                                            0, bound, bound, relay_depth)
+        if found is not None:
+            break
+        if upper_bound is not None or pruned_bound == float("inf"):
+            return FAILURE
+        bound = pruned_bound
+
+    depth, goal, relay = found
+    if relay is None:
+        path = __bfhs_path(problem, start, goal, depth, heuristic, 0, depth)
+    else:
+        path = __bfhs_path(problem, start, relay, relay_depth,
+                           heuristic, 0, depth)
+        path += __bfhs_path(problem, relay, goal, depth - relay_depth,
+                            heuristic, relay_depth, depth)[1:]
+
+    solution = [(start, None)]
+    for state, next_state in zip(path, path[1:]):
+        action = next(action for action in problem.actions_iter(state)
+                      if problem.result(state, action) == next_state)
+        solution.append((next_state, action))
+    return solution
+
+
+def frontier_search(problem):
+    return breadth_first_heuristic_search(problem, __zero_heuristic,
+                                          float("inf"))
+
+
+def __bfhs_layers(problem, start, goal_test, heuristic,
+                  offset, bound, max_depth, relay_depth):
+    # Each layer maps a state to (neighbours which generated it, relay)
+    pruned_bound = float("inf")
+    current = {start: (set(), None)}
+    depth = 0
+    while len(current) != 0:
+        for state, (_, relay) in current.items():
+            if goal_test(state):
+                return (depth, state, relay), pruned_bound
+        if depth >= max_depth:
+            break
+
+        following = {}
+        for state, (used, relay) in current.items():
+            for action in problem.actions_iter(state):
+                child = problem.result(state, action)
+                if child in used:
+                    continue
+                if child in current:
+                    current[child][0].add(state)
+                    continue
+                f_value = offset + depth + 1 + heuristic(child)
+                if f_value > bound:
+                    pruned_bound = min(pruned_bound, f_value)
+                    continue
+                entry = following.get(child)
+                if entry is None:
+                    child_relay = child if depth + 1 == relay_depth else relay
+                    following[child] = ({state}, child_relay)
+                else:
+                    entry[0].add(state)
+        current = following
+        depth += 1
+    return None, pruned_bound
+
+
+def __bfhs_path(problem, start, goal, depth, heuristic, offset, bound):
+    # States of a shortest path between two states known to be depth apart.
+    # Pruning with the original heuristic and bound stays valid, as both
+    # halves lie on an optimal solution of the whole problem.
+    if depth == 0:
+        return [start]
+    if depth == 1:
+        return [start, goal]
+
+    relay_depth = depth // 2
+    found, _ = __bfhs_layers(problem, start, lambda state: state == goal,
+                             heuristic, offset, bound, depth, relay_depth)
+    _, _, relay = found
+    return __bfhs_path(problem, start, relay, relay_depth,
+                       heuristic, offset, bound) + \
+        __bfhs_path(problem, relay, goal, depth - relay_depth,
+                    heuristic, offset + relay_depth, bound)[1:]
+
+
+def depth_first_branch_and_bound(problem, heuristic,
+                                 upper_bound=float("inf")):
+    # Depth-first search which keeps the cheapest solution found so far and
+    # prunes every branch whose f-value cannot beat it. Memory is linear in
+    # the depth: only the current path and its siblings are stored.
+    # Returns the solution and the number of pruned nodes.
+    root = problem.initial
+    if problem.goal_test(root.state):
+        return problem.construct_solution(root), 0
+    if problem.goal_unreachable():
+        return FAILURE, 0
+
+    best_node = None
+    best_cost = upper_bound
+    pruned = 0
+    on_path = {root.state}
+    # Frames are [node, children sorted by f-value, index of the next child]
+    stack = [[root, __dfbnb_children(problem, root, heuristic), 0]]
+    while len(stack) != 0:
+        frame = stack[-1]
+        node, children, index = frame
+        if index == len(children):
+            stack.pop()
+            on_path.remove(node.state)
+            continue
+        frame[2] += 1
+
+        f_value, _, child = children[index]
+        # The initial bound is inclusive, later ones must be improved upon
+        if f_value > best_cost or (best_node is not None and
+                                   f_value >= best_cost):
+            # Siblings are ordered by f-value, so all of them are pruned too
+            pruned += len(children) - index
+            frame[2] = len(children)
+            continue
+        if child.state in on_path:
+            continue
+        if problem.goal_test(child.state):
+            best_node = child
+            best_cost = child.path_cost
+            continue
+
+        on_path.add(child.state)
+        stack.append([child, __dfbnb_children(problem, child, heuristic), 0])
+
+    if best_node is None:
+        return FAILURE, pruned
+    return problem.construct_solution(best_node), pruned
+
+
+def __dfbnb_children(problem, node, heuristic):
+    children = []
+    for index, action in enumerate(problem.actions_iter(node.state)):
+        child = problem.child_node(node, action)
+        children.append((child.path_cost + heuristic(child.state),
+                         index, child))
+    children.sort()
+    return children
+
+
+def jump_point_search(problem, heuristic):
+    # A* over jump points of a uniform-cost grid problem (see
+    # ProblemFactory.from_grid). Straight and diagonal runs without forced
+    # neighbours are skipped in a single step, as every path through them
+    # has a symmetric equivalent. Open areas collapse to a few jump points;
+    # scattered obstacles force many of them, and there the gain over astar
+    # is a small constant factor.
+    start = problem.initial.state
+    g_values = {start: 0}
+    parents = {start: None}
+    closed = set()
+    counter = count()
+    frontier = [(heuristic(start), next(counter), start)]
+
+    while len(frontier) != 0:
+        _, _, point = heapq.heappop(frontier)
+        if point in closed:
+            continue
+        if point == problem.goal:
+            return __jps_solution(problem, parents, point)
+        closed.add(point)
+
+        for direction in __jps_directions(problem, point, parents[point]):
+            jump_point = __jps_jump(problem, point, direction)
+            if jump_point is None or jump_point in closed:
+                continue
+            distance = __jps_distance(problem, point, jump_point)
+            g_value = g_values[point] + distance
+            if g_value < g_values.get(jump_point, float("inf")):
+                g_values[jump_point] = g_value
+                parents[jump_point] = point
+                f_value = g_value + heuristic(jump_point)
+                heapq.heappush(frontier, (f_value, next(counter), jump_point))
+
     return FAILURE
 
 
+def __jps_sign(number):
+    return (number > 0) - (number < 0)
+
+
+def __jps_directions(problem, point, parent):
+    if parent is None:
+        return [action for action in problem.actions_iter(point)]
+
+    row, col = point
+    drow = __jps_sign(row - parent[0])
+    dcol = __jps_sign(col - parent[1])
+    free = problem.is_free
+    directions = []
+    if not problem.diagonal:
+        if dcol != 0:
+            candidates = ((-1, 0), (1, 0), (0, dcol))
+        else:
+            candidates = ((0, -1), (0, 1), (drow, 0))
+        return [(r, c) for r, c in candidates if free(row + r, col + c)]
+
+    if drow != 0 and dcol != 0:
+        if free(row + drow, col):
+            directions.append((drow, 0))
+        if free(row, col + dcol):
+            directions.append((0, dcol))
+        if free(row + drow, col) and free(row, col + dcol) and \
+           free(row + drow, col + dcol):
+            directions.append((drow, dcol))
+    elif dcol != 0:
+        next_free = free(row, col + dcol)
+        for side in (-1, 1):
+            if free(row + side, col):
+                directions.append((side, 0))
+                # Forced diagonal around an obstacle behind us
+                if next_free and free(row + side, col + dcol):
+                    directions.append((side, dcol))
+        if next_free:
+            directions.append((0, dcol))
+    else:
+        next_free = free(row + drow, col)
+        for side in (-1, 1):
+            if free(row, col + side):
+                directions.append((0, side))
+                if next_free and free(row + drow, col + side):
+                    directions.append((drow, side))
+        if next_free:
+            directions.append((drow, 0))
+    return directions
+
+
+def __jps_jump(problem, point, direction):
+    # Iterative, so long runs on large maps do not recurse
+    drow, dcol = direction
+    row, col = point[0] + drow, point[1] + dcol
+    free = problem.is_free
+    while True:
+        if not free(row, col):
+            return None
+        if (row, col) == problem.goal:
+            return (row, col)
+
+        if drow != 0 and dcol != 0:
+            if __jps_jump(problem, (row, col), (0, dcol)) is not None or \
+               __jps_jump(problem, (row, col), (drow, 0)) is not None:
+                return (row, col)
+            if not (free(row + drow, col) and free(row, col + dcol)):
+                return None
+        elif dcol != 0:
+            if (free(row - 1, col) and not free(row - 1, col - dcol)) or \
+               (free(row + 1, col) and not free(row + 1, col - dcol)):
+                return (row, col)
+        else:
+            if (free(row, col - 1) and not free(row - drow, col - 1)) or \
+               (free(row, col + 1) and not free(row - drow, col + 1)):
+                return (row, col)
+            # Without diagonals, turns happen only from vertical runs
+            if not problem.diagonal and \
+               (__jps_jump(problem, (row, col), (0, 1)) is not None or
+                __jps_jump(problem, (row, col), (0, -1)) is not None):
+                return (row, col)
+
+        row += drow
+        col += dcol
+
+
+def __jps_distance(problem, first, second):
+    drow = abs(first[0] - second[0])
+    dcol = abs(first[1] - second[1])
+    diagonal = min(drow, dcol)
+    return max(drow, dcol) - diagonal + \
+        problem.step_cost(first, (1, 1)) * diagonal
+
+
+def __jps_solution(problem, parents, point):
+    points = []
+    while point is not None:
+        points.append(point)
+        point = parents[point]
+    points.reverse()
+
+    # Unfold the jumps into single steps
+    solution = [(points[0], None)]
+    for target in points[1:]:
+        state = solution[-1][0]
+        while state != target:
+            action = (__jps_sign(target[0] - state[0]),
+                      __jps_sign(target[1] - state[1]))
+            state = problem.result(state, action)
+            solution.append((state, action))
+    return solution
+
+
 def hill_climbing(problem, max_sideways_walk=100,
                   local_minima_acceptable=True):
     node = problem.initial
@@ -199,6 +745,96 @@ def simulated_annealing(problem, heuristic,
         return FAILURE
 
 
+def local_beam_search(problem_generator, k, heuristic, batched=False,
+                      max_iterations=1000, time_limit=float("inf"),
+                      local_minima_acceptable=True):
+    # Keeps the k best successors of all k states. When batched is set the
+    # heuristic receives a list of states and returns a list of scores
+    # which allows it to vectorize the evaluation.
+    return __beam_search(problem_generator, k, heuristic, batched,
+                         max_iterations, time_limit, local_minima_acceptable,
+                         __best_beams)
+
+
+def stochastic_beam_search(problem_generator, k, heuristic, batched=False,
+                           max_iterations=1000, time_limit=float("inf"),
+                           local_minima_acceptable=True, temperature=1):
+    # Samples the k successors without replacement with probabilities
+    # proportional to exp(-score / temperature)
+    select = lambda scores, k: __sampled_beams(scores, k, temperature)
+    return __beam_search(problem_generator, k, heuristic, batched,
+                         max_iterations, time_limit, local_minima_acceptable,
+                         select)
+
+
+def __beam_search(problem_generator, k, heuristic, batched, max_iterations,
+                  time_limit, local_minima_acceptable, select):
+    if k <= 0:
+        raise InvalidArgumentError("The beam width must be positive")
+    evaluate = heuristic if batched else \
+        lambda states: [heuristic(state) for state in states]
+
+    # Each beam remembers the problem it started from so that its solution
+    # can be constructed back to the right initial state
+    problems = [problem_generator() for _ in range(k)]
+    beams = [(problem, problem.initial) for problem in problems]
+    scores = list(evaluate([node.state for _, node in beams]))
+    best_score, best_beam = min(zip(scores, beams), key=lambda pair: pair[0])
+
+    deadline = monotonic() + time_limit
+    for _ in range(max_iterations):
+        for problem, node in beams:
+            if problem.goal_test(node.state):
+                return problem.construct_solution(node)
+        if monotonic() > deadline:
+            break
+
+        # Successors reached from several beams are only scored once
+        seen = {node.state for _, node in beams}
+        successors = []
+        for problem, node in beams:
+            for action in problem.actions_iter(node.state):
+                child = problem.child_node(node, action)
+                if child.state not in seen:
+                    seen.add(child.state)
+                    successors.append((problem, child))
+        if len(successors) == 0:
+            break
+
+        successor_scores = list(evaluate([child.state
+                                          for _, child in successors]))
+        chosen = select(successor_scores, k)
+        beams = [successors[index] for index in chosen]
+        scores = [successor_scores[index] for index in chosen]
+
+        current_score = min(scores)
+        if current_score < best_score:
+            best_score = current_score
+            best_beam = beams[scores.index(current_score)]
+        elif current_score > best_score and select is __best_beams:
+            # Every successor is worse so the beams are at a local minimum
+            break
+
+    if local_minima_acceptable:
+        problem, node = best_beam
+        return problem.construct_solution(node)
+    return FAILURE
+
+
+def __best_beams(scores, k):
+    return heapq.nsmallest(k, range(len(scores)), key=scores.__getitem__)
+
+
+def __sampled_beams(scores, k, temperature):
+    # Gumbel top-k trick: perturbing the log weights with Gumbel noise and
+    # taking the k largest samples without replacement
+    # random() may return 0, whose logarithm is undefined
+    keys = [-score / temperature -
+            math.log(-math.log(random.random() or 1e-300))
+            for score in scores]
+    return heapq.nlargest(k, range(len(scores)), key=keys.__getitem__)
+
+
 __MUTATION_CHANCE = 0.1
 
 
@@ -208,7 +844,9 @@ def genetic(state_generator,
             reproducer,
             mutator,
             population_size,
-            max_generations=1 << 31):
+            max_generations=1 << 31,
+            checkpoint_path=None,
+            checkpoint_interval=60):
 
     population = {}
     fitness_sum = 0
@@ -217,7 +855,27 @@ def genetic(state_generator,
         population[individual] = fitness_func(individual)
         fitness_sum += population[individual]
 
-    for _ in range(max_generations):
+    arguments = (state_generator, fitness_func, best_fitness_value,
+                 reproducer, mutator, population_size, max_generations,
+                 checkpoint_path, checkpoint_interval)
+    if checkpoint_path is not None:
+        __check_picklable(arguments)
+    return __genetic_loop(arguments, 0, population, fitness_sum)
+
+
+def __genetic_loop(arguments, first_generation, population, fitness_sum):
+    (state_generator, fitness_func, best_fitness_value,
+     reproducer, mutator, population_size, max_generations,
+     checkpoint_path, checkpoint_interval) = arguments
+
+    last_checkpoint = monotonic()
+    for generation in range(first_generation, max_generations):
+        if checkpoint_path is not None and \
+           monotonic() - last_checkpoint >= checkpoint_interval:
+            state = (generation, population, fitness_sum)
+            __save_checkpoint(checkpoint_path, "genetic", arguments, state)
+            last_checkpoint = monotonic()
+
         for individual in population:
             population[individual] = population[individual] / fitness_sum
 
@@ -240,8 +898,8 @@ def genetic(state_generator,
         population = generation_fitness
         fitness_sum = generation_fitness_sum
 
-    comparer = key = lambda key_value_pair: key_value_pair[1]
-    return max(population, comparer)[0]
+    comparer = lambda key_value_pair: key_value_pair[1]
+    return max(population.items(), key=comparer)[0]
 
 
 def __weighted_choice(choices):
@@ -259,3 +917,505 @@ def __reproduce(father, mother, reproducer):
     first_child = reproducer(father, mother, crossover_point)
     second_child = reproducer(father, mother, len(father) - crossover_point)
     return (first_child, second_child)
+
+
+def and_or_search(problem):
+    # A conditional plan is either [] (the goal is reached) or a pair
+    # (action, {outcome state: plan for that outcome}).
+    # States are memoized once solved, or once failed without the failure
+    # depending on the path taken to reach them.
+    solved = {}
+    failed = set()
+    path = set()
+    plan, _ = __or_search(problem, problem.initial.state,
+                          path, solved, failed)
+    return plan
+
+
+def __or_search(problem, state, path, solved, failed):
+    if problem.goal_test(state):
+        return [], False
+    if state in solved:
+        return solved[state], False
+    if state in failed:
+        return FAILURE, False
+    if state in path:
+        return FAILURE, True
+
+    path.add(state)
+    on_path_failure = False
+    for action in problem.actions_iter(state):
+        outcomes = list(problem.results(state, action))
+        plan, depends_on_path = __and_search(problem, outcomes,
+                                             path, solved, failed)
+        if plan is not FAILURE:
+            path.remove(state)
+            solved[state] = (action, plan)
+            return solved[state], False
+        on_path_failure = on_path_failure or depends_on_path
+    path.remove(state)
+
+    if not on_path_failure:
+        failed.add(state)
+    return FAILURE, on_path_failure
+
+
+def __and_search(problem, states, path, solved, failed):
+    plans = {}
+    for state in states:
+        plan, depends_on_path = __or_search(problem, state,
+                                            path, solved, failed)
+        if plan is FAILURE:
+            return FAILURE, depends_on_path
+        plans[state] = plan
+    return plans, False
+
+
+_NO_ACTION = object()
+
+
+class _OrFrame:
+    def __init__(self, state, actions):
+        self.state = state
+        self.actions = actions
+        self.action = None
+        self.on_path_failure = False
+
+
+class _AndFrame:
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.index = 0
+        self.plans = {}
+
+
+def iterative_and_or_search(problem):
+    # Same as and_or_search, but keeps its own stack of frames instead of
+    # recursing, so plan depth is not bound by the recursion limit
+    solved = {}
+    failed = set()
+    path = set()
+    stack = []
+
+    def enter_or(state):
+        if problem.goal_test(state):
+            return [], False
+        if state in solved:
+            return solved[state], False
+        if state in failed:
+            return FAILURE, False
+        if state in path:
+            return FAILURE, True
+        path.add(state)
+        stack.append(_OrFrame(state, iter(problem.actions_iter(state))))
+        return None
+
+    def leave_or(frame, plan):
+        stack.pop()
+        path.remove(frame.state)
+        if plan is not FAILURE:
+            solved[frame.state] = plan
+            return plan, False
+        if not frame.on_path_failure:
+            failed.add(frame.state)
+        return FAILURE, frame.on_path_failure
+
+    # The value returned by the most recently finished frame
+    returned = enter_or(problem.initial.state)
+    while len(stack) != 0:
+        frame = stack[-1]
+        if isinstance(frame, _OrFrame):
+            if returned is not None:
+                plan, depends_on_path = returned
+                if plan is not FAILURE:
+                    returned = leave_or(frame, (frame.action, plan))
+                    continue
+                frame.on_path_failure |= depends_on_path
+
+            frame.action = next(frame.actions, _NO_ACTION)
+            if frame.action is _NO_ACTION:
+                returned = leave_or(frame, FAILURE)
+                continue
+            outcomes = list(problem.results(frame.state, frame.action))
+            stack.append(_AndFrame(outcomes))
+            returned = None
+        else:
+            if returned is not None:
+                plan, depends_on_path = returned
+                if plan is FAILURE:
+                    stack.pop()
+                    continue
+                frame.plans[frame.outcomes[frame.index]] = plan
+                frame.index += 1
+
+            if frame.index == len(frame.outcomes):
+                stack.pop()
+                returned = (frame.plans, False)
+                continue
+            returned = enter_or(frame.outcomes[frame.index])
+
+    return returned[0]
+
+
+class DStarLite:
+    # Incremental planner which searches backwards from a fixed goal and
+    # repairs its tree when edge costs change or the start moves.
+    # The problem must implement predecessors_iter(state), yielding
+    # (predecessor, action) pairs, and heuristic(first, second) must be an
+    # admissible estimate of the cost between any two states. Blocked moves
+    # should keep their actions and report an infinite step cost.
+    def __init__(self, problem, goal, heuristic):
+        self.problem = problem
+        self.goal = goal
+        self.heuristic = heuristic
+        self.start = problem.initial.state
+        self.key_modifier = 0
+        self.g_values = defaultdict(lambda: float("inf"))
+        self.rhs_values = defaultdict(lambda: float("inf"))
+        self.rhs_values[goal] = 0
+        self.queue = []
+        self.queued_keys = {}
+        self.counter = count()
+        self.__push(goal)
+
+    def __key(self, state):
+        value = min(self.g_values[state], self.rhs_values[state])
+        return (value + self.heuristic(self.start, state) + self.key_modifier,
+                value)
+
+    def __push(self, state):
+        key = self.__key(state)
+        self.queued_keys[state] = key
+        heapq.heappush(self.queue, (key, next(self.counter), state))
+
+    def __top(self):
+        # Entries are deleted lazily; skip those which were updated since
+        while len(self.queue) != 0:
+            key, _, state = self.queue[0]
+            if self.queued_keys.get(state) == key:
+                return key, state
+            heapq.heappop(self.queue)
+        return (float("inf"), float("inf")), None
+
+    def __successors(self, state):
+        for action in self.problem.actions_iter(state):
+            yield (self.problem.result(state, action),
+                   self.problem.step_cost(state, action))
+
+    def __update_vertex(self, state):
+        if state != self.goal:
+            self.rhs_values[state] = min(
+                (cost + self.g_values[successor]
+                 for successor, cost in self.__successors(state)),
+                default=float("inf"))
+        self.queued_keys.pop(state, None)
+        if self.g_values[state] != self.rhs_values[state]:
+            self.__push(state)
+
+    def __compute_shortest_path(self):
+        while True:
+            top_key, state = self.__top()
+            start_consistent = self.rhs_values[self.start] == \
+                self.g_values[self.start]
+            if top_key >= self.__key(self.start) and start_consistent:
+                return
+            if state is None:
+                return
+
+            new_key = self.__key(state)
+            if top_key < new_key:
+                self.__push(state)
+                continue
+
+            heapq.heappop(self.queue)
+            del self.queued_keys[state]
+            if self.g_values[state] > self.rhs_values[state]:
+                self.g_values[state] = self.rhs_values[state]
+                for predecessor, _ in self.problem.predecessors_iter(state):
+                    self.__update_vertex(predecessor)
+            else:
+                self.g_values[state] = float("inf")
+                self.__update_vertex(state)
+                for predecessor, _ in self.problem.predecessors_iter(state):
+                    self.__update_vertex(predecessor)
+
+    def move_to(self, state):
+        self.key_modifier += self.heuristic(self.start, state)
+        self.start = state
+
+    def update(self, changed_states):
+        # Edges into and out of the changed states have new costs; only
+        # those states and their predecessors are reevaluated
+        for state in changed_states:
+            self.__update_vertex(state)
+            for predecessor, _ in self.problem.predecessors_iter(state):
+                self.__update_vertex(predecessor)
+
+    def plan(self):
+        self.__compute_shortest_path()
+        if self.g_values[self.start] == float("inf"):
+            return FAILURE
+
+        state = self.start
+        solution = [(state, None)]
+        visited = {state}
+        while state != self.goal:
+            best_cost = float("inf")
+            best_action = None
+            for action in self.problem.actions_iter(state):
+                cost = self.problem.step_cost(state, action) + \
+                    self.g_values[self.problem.result(state, action)]
+                if cost < best_cost:
+                    best_cost = cost
+                    best_action = action
+            if best_action is None:
+                return FAILURE
+            state = self.problem.result(state, best_action)
+            if state in visited:
+                return FAILURE
+            visited.add(state)
+            solution.append((state, best_action))
+        return solution
+
+
+def alpha_beta_search(game, state, max_depth=float("inf"),
+                      time_limit=float("inf"), table_size=1 << 16):
+    engine = _AlphaBeta(game, table_size, monotonic() + time_limit)
+    return engine.iterative_deepening(state, max_depth)
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class _AlphaBeta:
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+    KILLERS_PER_PLY = 2
+    TIME_CHECK_MASK = 1023
+
+    def __init__(self, game, table_size, deadline):
+        self.game = game
+        self.deadline = deadline
+        # Entries are (key, depth, value, flag, action, generation)
+        self.table = [None] * table_size
+        self.zobrist = {}
+        self.random = random.Random(0)
+        self.killers = defaultdict(list)
+        self.history = defaultdict(int)
+        self.generation = 0
+        self.nodes = 0
+
+    def iterative_deepening(self, state, max_depth):
+        actions = list(self.game.actions_iter(state))
+        best_action = actions[0] if len(actions) != 0 else None
+        root_key = self.zobrist_key(state)
+        depth = 1
+        while depth <= max_depth:
+            self.generation = depth
+            try:
+                value, action, complete = self.negamax(state, root_key,
+                                                       depth, -float("inf"),
+                                                       float("inf"), 0)
+            except _SearchTimeout:
+                break
+            if action is not None:
+                best_action = action
+            # Nothing was cut off by the depth limit, deeper is pointless
+            if complete:
+                break
+            depth += 1
+        return best_action
+
+    def zobrist_key(self, state):
+        key = self.feature_key(("to_move", self.game.to_move(state)))
+        for feature in self.game.features(state):
+            key ^= self.feature_key(feature)
+        return key
+
+    def child_key(self, key, state, action, child):
+        # Only the features changed by the move are XOR-ed in and out
+        removed, added = self.game.feature_delta(state, action, child)
+        for feature in removed:
+            key ^= self.feature_key(feature)
+        for feature in added:
+            key ^= self.feature_key(feature)
+        key ^= self.feature_key(("to_move", self.game.to_move(state)))
+        key ^= self.feature_key(("to_move", self.game.to_move(child)))
+        return key
+
+    def feature_key(self, feature):
+        key = self.zobrist.get(feature)
+        if key is None:
+            key = self.zobrist[feature] = self.random.getrandbits(64)
+        return key
+
+    def ordered_actions(self, state, table_action, ply):
+        killers = self.killers[ply]
+
+        def priority(action):
+            if action == table_action:
+                return (0, 0)
+            if action in killers:
+                return (1, killers.index(action))
+            return (2, -self.history[action])
+
+        return sorted(self.game.actions_iter(state), key=priority)
+
+    def store(self, key, depth, value, flag, action):
+        index = key % len(self.table)
+        entry = self.table[index]
+        # Prefer deeper results, but never keep entries from older iterations
+        if entry is None or entry[5] != self.generation or depth >= entry[1]:
+            self.table[index] = (key, depth, value, flag, action,
+                                 self.generation)
+
+    def record_cutoff(self, action, depth, ply):
+        killers = self.killers[ply]
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[_AlphaBeta.KILLERS_PER_PLY:]
+        self.history[action] += depth * depth
+
+    def negamax(self, state, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & _AlphaBeta.TIME_CHECK_MASK == 0 and \
+           monotonic() > self.deadline:
+            raise _SearchTimeout()
+
+        game = self.game
+        player = game.to_move(state)
+        if game.terminal_test(state):
+            return game.utility(state, player), None, True
+        if depth == 0:
+            return game.evaluate(state, player), None, False
+
+        original_alpha = alpha
+        entry = self.table[key % len(self.table)]
+        table_action = None
+        if entry is not None and entry[0] == key:
+            _, entry_depth, value, flag, table_action, _ = entry
+            if entry_depth >= depth:
+                if flag == _AlphaBeta.EXACT:
+                    return value, table_action, entry_depth == float("inf")
+                elif flag == _AlphaBeta.LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value, table_action, entry_depth == float("inf")
+
+        best_value = -float("inf")
+        best_action = None
+        complete = True
+        for action in self.ordered_actions(state, table_action, ply):
+            child = game.result(state, action)
+            child_key = self.child_key(key, state, action, child)
+            value, _, child_complete = self.negamax(child, child_key,
+                                                    depth - 1, -beta, -alpha,
+                                                    ply + 1)
+            value = -value
+            complete = complete and child_complete
+            if value > best_value:
+                best_value = value
+                best_action = action
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.record_cutoff(action, depth, ply)
+                break
+
+        if best_value <= original_alpha:
+            flag = _AlphaBeta.UPPER
+        elif best_value >= beta:
+            flag = _AlphaBeta.LOWER
+        else:
+            flag = _AlphaBeta.EXACT
+        # Values of fully explored subtrees hold for any depth
+        stored_depth = float("inf") if complete else depth
+        self.store(key, stored_depth, best_value, flag, best_action)
+        return best_value, best_action, complete
+
+
+__CHECKPOINT_MAGIC = b"ADDERCKP"
+__CHECKPOINT_VERSION = 2
+
+
+def resume(checkpoint_path):
+    algorithm, arguments, state = __load_checkpoint(checkpoint_path)
+    if algorithm == "astar":
+        return __astar_loop(arguments, *__unpack_astar(state))
+    if algorithm == "genetic":
+        return __genetic_loop(arguments, *state)
+    raise InvalidArgumentError("Unknown algorithm in checkpoint: " + algorithm)
+
+
+def __check_picklable(arguments):
+    # Fail before the search starts rather than at its first checkpoint
+    try:
+        pickle.dumps(arguments, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        msg = "Checkpointed searches need picklable arguments: {0}"
+        raise InvalidArgumentError(msg.format(error))
+
+
+def __save_checkpoint(path, algorithm, arguments, state):
+    # The arguments (problem, heuristic, etc.) must be picklable so that the
+    # search can be resumed from the checkpoint alone
+    payload = pickle.dumps((algorithm, arguments, state, random.getstate()),
+                           pickle.HIGHEST_PROTOCOL)
+    # Write to a temporary file and atomically swap it in, so that a crash
+    # while checkpointing leaves the previous snapshot intact
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(__CHECKPOINT_MAGIC)
+        file.write(struct.pack("<I", __CHECKPOINT_VERSION))
+        file.write(zlib.compress(payload))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def __load_checkpoint(path):
+    with open(path, "rb") as file:
+        magic = file.read(len(__CHECKPOINT_MAGIC))
+        version_bytes = file.read(4)
+        if magic != __CHECKPOINT_MAGIC or len(version_bytes) != 4:
+            raise InvalidArgumentError(path + " is not a search checkpoint")
+        version, = struct.unpack("<I", version_bytes)
+        if version != __CHECKPOINT_VERSION:
+            msg = "Unsupported checkpoint version {0}".format(version)
+            raise InvalidArgumentError(msg)
+        payload = zlib.decompress(file.read())
+
+    algorithm, arguments, state, random_state = pickle.loads(payload)
+    random.setstate(random_state)
+    return algorithm, arguments, state
+
+
+def __flatten_nodes(*collections):
+    # Nodes are stored as a flat table of (state, parent index, action, cost)
+    # instead of nested objects; pickling long parent chains recursively
+    # would hit the recursion limit
+    nodes = []
+    ids = {}
+    for collection in collections:
+        for node in collection:
+            chain = []
+            while node is not None and id(node) not in ids:
+                chain.append(node)
+                node = node.parent
+            for node in reversed(chain):
+                ids[id(node)] = len(nodes)
+                parent_id = ids[id(node.parent)] if node.parent else None
+                nodes.append((node.state, parent_id,
+                              node.action, node.path_cost))
+    return nodes, ids
+
+
+def __restore_nodes(table):
+    nodes = []
+    for state, parent_id, action, path_cost in table:
+        parent = nodes[parent_id] if parent_id is not None else None
+        nodes.append(Node(state, parent, action, path_cost))
+    return nodes
@@ -1,3 +1,8 @@
+from collections import OrderedDict
+import threading
+import weakref
+
+
 class AdderError(Exception):
     pass
 
@@ -10,11 +15,88 @@ class ParsingError(AdderError):
     pass
 
 
-def memoize(func):
-    cache = {}
+class LruCache:
+    # A size bounded mapping which evicts the least recently used entry.
+    # A max_size of None makes the cache unbounded.
+    def __init__(self, max_size=1024):
+        if max_size is not None and max_size <= 0:
+            raise InvalidArgumentError("The cache size must be positive")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return self.__entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            if self.max_size is not None and \
+               len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def items(self):
+        # A snapshot from the least to the most recently used entry
+        with self.__lock:
+            return list(self.__entries.items())
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
 
-    def memoized(arg):
-        if cache.get(arg) is None:
-            cache[arg] = func(arg)
-        return cache[arg]
+__MISSING = object()
+__memoized = weakref.WeakSet()
+
+
+def memoize(func=None, max_size=1024):
+    # Usable both as @memoize and @memoize(max_size=...)
+    if func is None:
+        return lambda func: memoize(func, max_size)
+
+    cache = LruCache(max_size)
+
+    def memoized(*args, **kwargs):
+        key = args if len(kwargs) == 0 else \
+            (args, frozenset(kwargs.items()))
+        result = cache.get(key, __MISSING)
+        if result is __MISSING:
+            # Computed outside of the lock, so concurrent misses on the same
+            # key may both call func, but a slow call never blocks the rest
+            result = func(*args, **kwargs)
+            cache.put(key, result)
+        return result
+
+    memoized.__name__ = func.__name__
+    memoized.__qualname__ = func.__qualname__
+    memoized.__wrapped__ = func
+    memoized.cache = cache
+    __memoized.add(memoized)
     return memoized
+
+
+def memoized_functions():
+    return list(__memoized)
+
+
+def clear_memoized():
+    for memoized in list(__memoized):
+        memoized.cache.clear()
@@ -2,9 +2,8 @@ import sys
 
 import random
 import time
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
 
-from adder.search import astar
+from adder.search import DStarLite
 from adder.problem import Problem, FAILURE, Node
 
 
@@ -12,62 +11,44 @@ def sum_coords(a, b):
     return (a[0] + b[0], a[1] + b[1])
 
 
+def manhattan(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
 class RouteProblem(Problem):
-    def __init__(self, coords, board_size, obstacles, snake, goal):
-        self.initial = Node((coords, 0, tuple()), None, None, 0)
+    MOVES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+    # The state is just the cell of the snake's head. Blocked cells keep
+    # their moves but make them infinitely expensive, so that the planner
+    # sees a change in cost instead of a change in the graph.
+    def __init__(self, coords, board_size, blocked, goal):
+        self.initial = Node(coords, None, None, 0)
         self.board_size = board_size
-        self.obstacles = obstacles
-        self.snake = snake
+        self.blocked = blocked
         self.goal = goal
 
+    def inside(self, coords):
+        return 0 <= coords[0] < self.board_size and \
+            0 <= coords[1] < self.board_size
+
     def actions_iter(self, state):
-        actions = []
-        obstacles = self.obstacles
-        coords = state[0]
-        time = state[1]
-        path = state[2]
-
-        if coords[0] > 0:
-            actions.append((-1, 0))
-        if coords[0] < self.board_size - 1:
-            actions.append((1, 0))
-        if coords[1] > 0:
-            actions.append((0, -1))
-        if coords[1] < self.board_size - 1:
-            actions.append((0, 1))
-
-        applicable = []
-        snake_len = len(self.snake)
-        for action in actions:
-            result = sum_coords(coords, action)
-            if result not in obstacles and \
-               result not in self.snake[0:snake_len - time] and \
-               result not in path:
-                applicable.append(action)
-
-        return iter(applicable)
+        return (action for action in RouteProblem.MOVES
+                if self.inside(sum_coords(state, action)))
+
+    def predecessors_iter(self, state):
+        for action in self.actions_iter(state):
+            # Every move on the grid can be reversed
+            yield (sum_coords(state, action), (-action[0], -action[1]))
 
     def step_cost(self, state, action):
-        return 1
+        return float("inf") if self.result(state, action) in self.blocked \
+            else 1
 
     def result(self, state, action):
-        coords = sum_coords(state[0], action)
-        time = state[1] + 1
-        path = state[2]
-        if len(path) == len(self.snake):
-            path = path[:1] + (state[0], )
-        else:
-            path = path + (state[0], )
-        return (coords, time, path)
+        return sum_coords(state, action)
 
     def goal_test(self, state):
-        coords = state[0]
-        return coords[0] == self.goal[0] and coords[1] == self.goal[1]
-
-    def heuristic(self, state):
-        # manhattan
-        coords = state[0]
-        return abs(coords[0] - self.goal[0]) + abs(coords[1] - self.goal[1])
+        return state == self.goal
 
 
 class Snake:
@@ -77,46 +58,24 @@ class Snake:
         self.obstacles = obstacles
 
         self.fruit = self.__random_fruit()
-        self.next_fruit = None
-        self.plan = self.__generate_plan(self.body, self.fruit)
-
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self.future = self.executor.submit(self.__generate_future_plan)
-
-    def __random_fruit(self, body=None):
-        body = body if body else self.body
+        self.__start_route()
 
+    def __random_fruit(self):
         fruit = (random.randint(0, self.size - 1),
                  random.randint(0, self.size - 1))
-        while fruit in self.obstacles or fruit in body:
+        while fruit in self.obstacles or fruit in self.body:
             fruit = (random.randint(0, self.size - 1),
                      random.randint(0, self.size - 1))
         return fruit
 
-    def __generate_plan(self, body, fruit):
-        problem = RouteProblem(body[0], self.size,
-                               self.obstacles, body,
-                               fruit)
-        plan = astar(problem, problem.heuristic)
-        if plan != FAILURE:
-            plan.pop(0)
-
-        return plan
-
-    def __generate_future_plan(self):
-        plan, next_body = self.plan[:], self.body[:]
-        for state, action in plan[:-1]:
-            self.execute_action(next_body, action)
-
-        if len(plan) != 0:
-            next_body.append(next_body[-1] + tuple())
-            self.execute_action(next_body, plan[-1][1])
+    def __blocked_cells(self):
+        # The tail moves away as the head moves forward
+        return set(self.obstacles) | set(self.body[:-1])
 
-        next_fruit = self.__random_fruit(next_body)
-        self.next_fruit = next_fruit
-        next_plan = self.__generate_plan(next_body, next_fruit)
-
-        return next_plan
+    def __start_route(self):
+        self.problem = RouteProblem(self.body[0], self.size,
+                                    self.__blocked_cells(), self.fruit)
+        self.planner = DStarLite(self.problem, self.fruit, manhattan)
 
     def execute_action(self, body, action):
         for i in range(len(body) - 1, 0, -1):
@@ -125,27 +84,28 @@ class Snake:
         body[0] = sum_coords(body[0], action)
 
     def try_step(self):
-        if len(self.plan) == 0:
-            self.plan = self.future.result()
-            self.fruit = self.next_fruit
-            self.future = self.executor.submit(self.__generate_future_plan)
-
-            if self.plan == FAILURE:
-                print("No solution from the current position")
-                return False
+        plan = self.planner.plan()
+        if plan == FAILURE:
+            print("No solution from the current position")
+            return False
 
-        next_state, action = self.plan.pop(0)
-
-        tail = self.body[-1] + tuple()
+        next_state, action = plan[1]
+        tail = self.body[-1]
         self.execute_action(self.body, action)
 
         if self.body[0] == self.fruit:
             self.body.append(tail)
-            if self.next_fruit and self.next_fruit != self.fruit:
-                self.fruit = self.next_fruit
-            else:
-                self.fruit = (-1, -1)
-
+            self.fruit = self.__random_fruit()
+            self.__start_route()
+            return True
+
+        # Only the cells the snake entered or left have changed, so the
+        # planner repairs its previous search instead of starting over
+        blocked = self.__blocked_cells()
+        changed = blocked ^ self.problem.blocked
+        self.problem.blocked = blocked
+        self.planner.move_to(self.body[0])
+        self.planner.update(changed)
         return True
 
     def draw(self):
@@ -4,8 +4,11 @@ import adder.proplogic as proplogic
 import cProfile
 import pstats
 import io
+import os
+import tempfile
+import time
 import adder
-from adder import fologic
+from adder import fologic, graphs, problem, search
 
 
 def profile_prop_kb():
@@ -88,6 +91,49 @@ def profile_fo_resolution():
     print("Did anyone kill anything?", kb.ask("E x,y(Kills(x, y))"))
 
 
+def profile_connect_four(time_per_move=1):
+    game = problem.ProblemFactory().from_connect_four()
+    state = game.initial
+    moves = 0
+    while not game.terminal_test(state):
+        action = search.alpha_beta_search(game, state,
+                                          time_limit=time_per_move)
+        state = game.result(state, action)
+        moves += 1
+
+    print("Moves played:", moves)
+    print("Utility for X:", game.utility(state, "X"))
+
+
+def profile_graph_loading(rows=300, columns=300):
+    # About 4 * rows * columns directed edges
+    graph = graphs.road_graph(rows, columns, seed=0, frozen=True)
+    print("Nodes:", graph.node_count(), "Edges:", graph.edge_count())
+    loader = graphs.GraphLoader()
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, "road.graph")
+        binary_path = os.path.join(directory, "road.bin")
+        loader.save_text(graph, text_path)
+        loader.save_binary(graph, binary_path)
+
+        for name, load in (("text", lambda: loader.from_file(text_path)),
+                           ("text, frozen", lambda: loader.from_file(
+                               text_path, frozen=True)),
+                           ("binary", lambda: loader.from_binary(binary_path))):
+            start = time.perf_counter()
+            loaded = load()
+            print("Loading {0}: {1:.3f}s".format(name,
+                                                 time.perf_counter() - start))
+
+        factory = problem.ProblemFactory()
+        goal = "{0}_{1}".format(rows - 1, columns - 1)
+        problem_instance = factory.from_graph(loaded, "0_0", goal)
+        start = time.perf_counter()
+        search.uniform_cost_search(problem_instance)
+        print("Uniform cost search: {0:.3f}s".format(
+            time.perf_counter() - start))
+
+
 def profile():
     import sys
     sys.argv = ["profiler.py", "snake", "10"]
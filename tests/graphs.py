@@ -1,7 +1,15 @@
+import contextlib
+import io
+import math
 import os
+import shutil
+import tempfile
 import unittest
 
-from adder.graphs import Graph, Digraph, GraphLoader
+from adder.graphs import Graph, Digraph, FrozenGraph, GraphLoader
+from adder import graphs
+from adder import problem, search, utils
+from adder.utils import InvalidArgumentError
 
 import tests.config as config
 
@@ -45,12 +53,130 @@ class GraphFactoryTests(unittest.TestCase):
         self.assertCountEqual(g.children_iter("B"), set())
         self.assertCountEqual(g.children_iter("C"), {"A"})
 
+    def test_node_registry(self):
+        dg = Digraph()
+        self.fill_sample_graph(dg)
+        dg.add_edge("A", "B", 2)
+        self.assertEqual((dg.node_count(), dg.edge_count()), (3, 2))
+        self.assertTrue(dg.has_node("B"))
+        self.assertEqual(dg.edge_cost("A", "B"), 2)
+
+        dg.remove_edge("A", "B")
+        self.assertFalse(dg.has_node("B"))
+        self.assertTrue(dg.has_node("A"))
+        self.assertEqual((dg.node_count(), dg.edge_count()), (2, 1))
+        self.assertCountEqual(dg.children_iter("B"), set())
+        self.assertFalse(dg.has_node("B"))
+
+        g = Graph()
+        self.fill_sample_graph(g)
+        self.assertEqual((g.node_count(), g.edge_count()), (3, 4))
+        g.remove_edge("A", "C")
+        g.remove_edge("A", "B")
+        self.assertEqual((g.node_count(), g.edge_count()), (0, 0))
+        self.assertEqual(g.get_nodes(), set())
+
+        frozen = Graph()
+        self.fill_sample_graph(frozen)
+        frozen = frozen.freeze()
+        self.assertTrue(frozen.has_node("C"))
+        self.assertFalse(frozen.has_node("D"))
+        self.assertEqual((frozen.node_count(), frozen.edge_count()), (3, 4))
+
+    def test_update_cost(self):
+        changes = []
+        g = Graph()
+        g.add_listener(lambda *change: changes.append(change))
+        self.fill_sample_graph(g)
+        version = g.version
+        components = g.components()
+        g.update_cost("A", "B", 3)
+        self.assertEqual((g.edge_cost("A", "B"), g.edge_cost("B", "A")),
+                         (3, 3))
+        self.assertGreater(g.version, version)
+        self.assertIs(g.components(), components)
+        g.remove_edge("A", "C")
+        self.assertEqual(changes, [("A", "B", None, 1), ("B", "A", None, 1),
+                                   ("A", "C", None, 1), ("C", "A", None, 1),
+                                   ("A", "B", 1, 3), ("B", "A", 1, 3),
+                                   ("A", "C", 1, None), ("C", "A", 1, None)])
+        self.assertRaises(KeyError, g.update_cost, "A", "C", 1)
+
+    def test_components(self):
+        dg = Digraph()
+        for source, destination in (("A", "B"), ("B", "C"), ("C", "A"),
+                                    ("C", "D"), ("E", "F")):
+            dg.add_edge(source, destination, 1)
+        weak = dg.components()
+        self.assertEqual(len(set(weak.values())), 2)
+        self.assertEqual(weak["A"], weak["D"])
+        self.assertNotEqual(weak["A"], weak["E"])
+
+        strong = dg.components(strong=True)
+        self.assertEqual(len(set(strong.values())), 4)
+        self.assertEqual(strong["A"], strong["C"])
+        self.assertNotEqual(strong["C"], strong["D"])
+        self.assertIs(dg.components(strong=True), strong)
+
+        dg.add_edge("D", "E", 1)
+        self.assertEqual(len(set(dg.components().values())), 1)
+        dg.add_edge("F", "A", 1)
+        self.assertEqual(len(set(dg.components(strong=True).values())), 1)
+        self.assertEqual(dg.freeze().components(strong=True),
+                         dg.components(strong=True))
+
+    def test_deep_components(self):
+        dg = Digraph()
+        size = 5000
+        for i in range(size):
+            dg.add_edge(i, (i + 1) % size, 1)
+        self.assertEqual(len(set(dg.components(strong=True).values())), 1)
+        dg.remove_edge(size - 1, 0)
+        self.assertEqual(len(set(dg.components(strong=True).values())), size)
+
     def test_iterator(self):
         g = Graph()
         self.fill_sample_graph(g)
 
         self.assertCountEqual(set(g), {"A", "B", "C"})
 
+    def test_traversals(self):
+        dg = Digraph()
+        for source, destination in (("A", "B"), ("A", "C"), ("B", "D"),
+                                    ("C", "D"), ("D", "A"), ("E", "F")):
+            dg.add_edge(source, destination, 1)
+
+        bfs = list(dg.bfs_iter("A"))
+        self.assertEqual(bfs[0], "A")
+        self.assertCountEqual(bfs[1:3], ["B", "C"])
+        self.assertEqual(bfs[3], "D")
+        dfs = list(dg.dfs_iter("A"))
+        self.assertEqual(len(dfs), 4)
+        self.assertIn(dfs[1:], (["B", "D", "C"], ["C", "D", "B"]))
+
+        self.assertCountEqual(dg.bfs_iter("A", all_components=True),
+                              "ABCDEF")
+        self.assertEqual(list(dg.dfs_iter("E", all_components=True))[:2],
+                         ["E", "F"])
+        self.assertCountEqual(dg, "ABCDEF")
+        self.assertCountEqual(dg.freeze().bfs_iter(), "ABCDEF")
+
+        edges = list(dg.dfs_iter(edges=True))
+        self.assertCountEqual(edges, [(source, destination, 1)
+                                      for source in dg.get_nodes()
+                                      for destination in
+                                      dg.children_iter(source)])
+        self.assertRaises(InvalidArgumentError, next, dg.bfs_iter("Z"))
+
+    def test_long_chain(self):
+        dg = Digraph()
+        size = 20000
+        for i in range(size):
+            dg.add_edge(i, i + 1, 1)
+            dg.add_edge(i, -i - 1, 1)
+        self.assertEqual(sum(1 for _ in dg.dfs_iter(0)), 2 * size + 1)
+        self.assertEqual(sum(1 for _ in dg.bfs_iter(0)), 2 * size + 1)
+
 class GraphLoadingTests(unittest.TestCase):
     def assert_graph_loaded(self, graph, nodes, edges, is_directed=False):
         self.assertIsInstance(graph, Graph if not is_directed else Digraph)
@@ -134,6 +260,449 @@ class GraphLoadingTests(unittest.TestCase):
             test_func = getattr(self, "assert_{0}_loaded".format(test_name))
             test_func(graph)
 
+    def test_graph_load_frozen(self):
+        loader = GraphLoader()
+        for path in config.TEST_GRAPHS.values():
+            graph = loader.from_file(path)
+            frozen = loader.from_file(path, frozen=True)
+            self.assertIsInstance(frozen, FrozenGraph)
+            self.assertFalse(frozen.is_directed)
+            self.assertEqual(frozen.get_nodes(), graph.get_nodes())
+            for node in graph.get_nodes():
+                for child in graph.children_iter(node):
+                    self.assertEqual(frozen.edge_cost(node, child),
+                                     graph.edge_cost(node, child))
+
+    def test_mixed_directions(self):
+        text = "# comment\nA -> B 1, C 2\nB <-> C 3\nD <->\n\n"
+        loader = GraphLoader()
+        for frozen in (False, True):
+            graph = loader.from_string(text, frozen)
+            self.assertNotIsInstance(graph, Graph)
+            self.assertCountEqual(graph.get_nodes(), {"A", "B", "C"})
+            self.assertCountEqual(graph.children_iter("C"), {"B"})
+            self.assertCountEqual(graph.children_iter("B"), {"C"})
+            self.assertEqual(graph.edge_cost("C", "B"), 3)
+
+    def test_parsing_errors(self):
+        loader = GraphLoader()
+        for text, line in (("A <-> B 1\nB <-> C", 2),
+                           ("A <-> B 1\n\nC <-> D x", 3),
+                           ("A <-> B <-> C 1", 1),
+                           (" <-> B 1", 1),
+                           ("A B 1", 1)):
+            with self.assertRaisesRegex(utils.ParsingError,
+                                        "line {0}:".format(line)):
+                loader.from_string(text)
+
+
+class FrozenGraphTests(unittest.TestCase):
+    def assert_same_graph(self, graph, frozen):
+        self.assertCountEqual(frozen.get_nodes(), graph.get_nodes())
+        for node in graph.get_nodes():
+            self.assertCountEqual(frozen.children_iter(node),
+                                  graph.children_iter(node))
+            for child in graph.children_iter(node):
+                self.assertEqual(frozen.edge_cost(node, child),
+                                 graph.edge_cost(node, child))
+
+    def test_freeze(self):
+        loader = GraphLoader()
+        for path in config.TEST_GRAPHS.values():
+            graph = loader.from_file(path)
+            frozen = graph.freeze()
+            self.assertIsInstance(frozen, FrozenGraph)
+            self.assertFalse(frozen.is_directed)
+            self.assertEqual(frozen.names, sorted(frozen.names))
+            self.assert_same_graph(graph, frozen)
+
+    def test_digraph(self):
+        dg = Digraph()
+        dg.add_edge("C", "A", 3)
+        dg.add_edge("A", "C", 1)
+        dg.add_edge("A", "B", 2)
+        dg.remove_edge("C", "A")
+        frozen = dg.freeze()
+        self.assertTrue(frozen.is_directed)
+        self.assert_same_graph(dg, frozen)
+        self.assertEqual(list(frozen.children_iter("A")), ["B", "C"])
+        self.assertRaises(KeyError, frozen.edge_cost, "C", "A")
+        self.assertRaises(KeyError, frozen.edge_cost, "A", "D")
+
+    def test_duplicate_edges(self):
+        frozen = FrozenGraph.from_edges([("A", "B", 1), ("B", "A", 2),
+                                         ("A", "B", 3)], nodes=["D"])
+        self.assertEqual(frozen.names, ["A", "B", "D"])
+        self.assertEqual(frozen.edge_cost("A", "B"), 3)
+        self.assertEqual(list(frozen.offsets), [0, 1, 2, 2])
+        self.assertEqual(list(frozen.children_ids(0)), [(1, 3.0)])
+
+    def test_graph_problem(self):
+        loader = GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["romania_map"]).freeze()
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Arad", "Bucharest")
+        solution = search.uniform_cost_search(problem_instance)
+        self.assertEqual([state for state, _ in solution],
+                         ["Arad", "Sibiu", "RimnicuVilcea", "Pitesti",
+                          "Bucharest"])
+        self.assertEqual(problem_instance.solution_cost(solution), 418)
+
+class BinaryGraphTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "graph.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_round_trip(self, graph):
+        loader = GraphLoader()
+        loader.save_binary(graph, self.path)
+        for mmap in (True, False):
+            loaded = loader.from_binary(self.path, mmap=mmap, verify=True)
+            self.assertEqual(loaded.is_directed, not isinstance(graph, Graph))
+            self.assertEqual(loaded.get_nodes(), graph.get_nodes())
+            self.assertEqual(loaded.edge_count(), graph.edge_count())
+            self.assertFalse(loaded.has_node("Nowhere"))
+            for node in graph.get_nodes():
+                self.assertCountEqual(loaded.children_iter(node),
+                                      graph.children_iter(node))
+                for child in graph.children_iter(node):
+                    self.assertEqual(loaded.edge_cost(node, child),
+                                     graph.edge_cost(node, child))
+
+    def test_round_trip(self):
+        loader = GraphLoader()
+        for path in config.TEST_GRAPHS.values():
+            self.assert_round_trip(loader.from_file(path))
+
+        digraph = Digraph()
+        digraph.add_edge("Zürich", "Ägypten", 0.5)
+        digraph.add_edge("A", "Zürich", 2)
+        self.assert_round_trip(digraph)
+        self.assert_round_trip(Digraph())
+
+    def test_search_on_mapped_graph(self):
+        loader = GraphLoader()
+        loader.save_binary(loader.from_file(config.TEST_GRAPHS["romania_map"]),
+                           self.path)
+        graph = loader.from_binary(self.path)
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Arad", "Bucharest")
+        solution = search.uniform_cost_search(problem_instance)
+        self.assertEqual(problem_instance.solution_cost(solution), 418)
+
+    def test_stored_components(self):
+        loader = GraphLoader()
+        original = loader.from_file(
+            config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        loader.save_binary(original, self.path)
+        graph = loader.from_binary(self.path)
+        # The labels come from the file, no edge is looked at
+        graph.children_ids = graph.children_iter = None
+        labels = graph.components()
+        self.assertCountEqual(labels, original.get_nodes())
+        for node in original.get_nodes():
+            for other in original.get_nodes():
+                self.assertEqual(labels[node] == labels[other],
+                                 original.components()[node] ==
+                                 original.components()[other])
+        self.assertRaises(KeyError, labels.__getitem__, "Nowhere")
+
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Pernik", "Varna")
+        self.assertTrue(problem_instance.goal_unreachable())
+        self.assertEqual(search.astar(problem_instance, lambda state: 0),
+                         problem.FAILURE)
+
+    def test_corrupted_files(self):
+        loader = GraphLoader()
+        loader.save_binary(loader.from_file(config.TEST_GRAPHS["germany_map"]),
+                           self.path)
+        with open(self.path, "rb") as file:
+            content = bytearray(file.read())
+
+        content[-1] ^= 0xFF
+        with open(self.path, "wb") as file:
+            file.write(content)
+        loader.from_binary(self.path)
+        self.assertRaises(utils.ParsingError, loader.from_binary, self.path,
+                          verify=True)
+
+        for corrupted in (content[:-1], b"NOTAGRAPH" + content[9:],
+                          content[:10]):
+            with open(self.path, "wb") as file:
+                file.write(corrupted)
+            self.assertRaises(utils.ParsingError, loader.from_binary,
+                              self.path)
+
+    def test_command_line(self):
+        source = config.TEST_GRAPHS["Bulgaria_map"]
+        self.assertEqual(graphs.main([source, self.path]), 0)
+        graph = GraphLoader().from_binary(self.path)
+        self.assertEqual(graph.node_count(), 37)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(graphs.main([source]), 1)
+
+class GeneratorTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "generated.graph")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_same_graph(self, graph, other):
+        self.assertEqual(graph.get_nodes(), other.get_nodes())
+        self.assertEqual(graph.edge_count(), other.edge_count())
+        for node in graph.get_nodes():
+            for child in graph.children_iter(node):
+                self.assertAlmostEqual(graph.edge_cost(node, child),
+                                       other.edge_cost(node, child))
+
+    def test_seeded(self):
+        makers = (lambda seed, frozen: graphs.grid_graph(20, 30, 0.2, True,
+                                                         seed, frozen),
+                  lambda seed, frozen: graphs.random_geometric_graph(
+                      300, 1.5, seed, frozen),
+                  lambda seed, frozen: graphs.scale_free_graph(300, 2, seed,
+                                                               frozen),
+                  lambda seed, frozen: graphs.road_graph(15, 20, seed, frozen))
+        loader = GraphLoader()
+        for make in makers:
+            graph = make(7, False)
+            self.assertGreater(graph.edge_count(), 300)
+            self.assert_same_graph(graph, make(7, False))
+            self.assert_same_graph(graph, make(7, True))
+
+            loader.save_text(graph, self.path)
+            self.assert_same_graph(graph, loader.from_file(self.path))
+            loader.save_text(make(7, True), self.path)
+            self.assert_same_graph(graph, loader.from_file(self.path,
+                                                           frozen=True))
+
+    def test_shapes(self):
+        grid = graphs.grid_graph(10, 10)
+        self.assertEqual((grid.node_count(), grid.edge_count()),
+                         (100, 2 * 2 * 10 * 9))
+
+        scale_free = graphs.scale_free_graph(1000, 3, seed=1)
+        self.assertEqual(scale_free.edge_count(), 2 * (3 * 996 + 6))
+        degrees = [len(list(scale_free.children_iter(node)))
+                   for node in scale_free.get_nodes()]
+        self.assertGreaterEqual(min(degrees), 3)
+        self.assertGreater(max(degrees), 30)
+        self.assertRaises(InvalidArgumentError, graphs.scale_free_graph, 3, 3)
+
+        road = graphs.road_graph(20, 20, seed=2)
+        for node in road.get_nodes():
+            for child in road.children_iter(node):
+                distance = math.dist(road.coordinates[node],
+                                     road.coordinates[child])
+                self.assertGreaterEqual(road.edge_cost(node, child), distance)
+                self.assertLessEqual(distance, 2.3)
+
+        geometric = graphs.random_geometric_graph(500, 1, seed=3)
+        for node in geometric.get_nodes():
+            for child in geometric.children_iter(node):
+                self.assertLessEqual(geometric.edge_cost(node, child), 1)
+
+    def test_directed_text(self):
+        dg = Digraph()
+        dg.add_edge("A", "B", 1.5)
+        dg.add_edge("B", "A", 2)
+        dg.add_edge("B", "C", 3)
+        loader = GraphLoader()
+        loader.save_text(dg, self.path)
+        loaded = loader.from_file(self.path)
+        self.assertNotIsInstance(loaded, Graph)
+        self.assert_same_graph(dg, loaded)
+
+
+class CoordinatesTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "coordinates.graph")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_same_coordinates(self, coordinates, other):
+        self.assertEqual(coordinates.metric, other.metric)
+        self.assertEqual(dict(coordinates.items()), dict(other.items()))
+
+    def test_haversine(self):
+        coordinates = graphs.Coordinates(graphs.HAVERSINE)
+        coordinates.add("Sofia", 42.6977, 23.3219)
+        coordinates.add("Varna", 43.2141, 27.9147)
+        self.assertAlmostEqual(coordinates.distance("Sofia", "Varna"), 377.8,
+                               delta=1)
+        self.assertEqual(coordinates.distance("Sofia", "Sofia"), 0)
+        self.assertRaises(KeyError, coordinates.__getitem__, "Burgas")
+        self.assertRaises(InvalidArgumentError, graphs.Coordinates, "manhattan")
+
+    def test_text_section(self):
+        graph = GraphLoader().from_string("""
+            A <-> B 2, C 3
+            [coordinates haversine]
+            A 42.5 23.25
+            B 43 27.5
+        """)
+        self.assertEqual(graph.get_nodes(), {"A", "B", "C"})
+        self.assertEqual(graph.coordinates.metric, graphs.HAVERSINE)
+        self.assertEqual(graph.coordinates["B"], (43, 27.5))
+        self.assertNotIn("C", graph.coordinates)
+
+        loader = GraphLoader()
+        for frozen in (False, True):
+            loader.save_text(graph, self.path)
+            loaded = loader.from_file(self.path, frozen)
+            self.assert_same_coordinates(graph.coordinates, loaded.coordinates)
+
+        self.assertRaises(utils.ParsingError, loader.from_string,
+                          "A -> B 1\n[coordinates]\nA 1\n")
+        self.assertRaises(utils.ParsingError, loader.from_string,
+                          "A -> B 1\n[coordinates polar]\n")
+
+    def test_binary_round_trip(self):
+        loader = GraphLoader()
+        graph = graphs.road_graph(6, 7, seed=3)
+        graph.coordinates.add("Nowhere", 1, 1)
+        graph.add_edge("Isolated", "Other", 1)
+        for mmap in (True, False):
+            loader.save_binary(graph, self.path)
+            loaded = loader.from_binary(self.path, mmap=mmap, verify=True)
+            # Coordinates of nodes outside the graph are not stored
+            self.assertNotIn("Nowhere", loaded.coordinates)
+            self.assertNotIn("Isolated", loaded.coordinates)
+            self.assertEqual(len(loaded.coordinates), 42)
+            for node, point in loaded.coordinates.items():
+                self.assertEqual(graph.coordinates[node], point)
+
+        graph.coordinates = None
+        loader.save_binary(graph, self.path)
+        self.assertIsNone(loader.from_binary(self.path).coordinates)
+
+    def test_spatial_grid(self):
+        for metric in (graphs.EUCLIDEAN, graphs.HAVERSINE):
+            coordinates = graphs.Coordinates(metric)
+            for index in range(200):
+                coordinates.add(index, math.sin(index) * 3 + 42,
+                                math.cos(index * 1.7) * 5 + 23)
+            grid = coordinates.spatial_index()
+            self.assertIs(coordinates.spatial_index(), grid)
+            for point in ((42, 23), (45.5, 28.1), (30, 10)):
+                nearest = grid.nearest(point)
+                expected = min(range(200), key=lambda node:
+                               coordinates.point_distance(
+                                   point, coordinates[node]))
+                self.assertAlmostEqual(
+                    coordinates.point_distance(point, coordinates[nearest]),
+                    coordinates.point_distance(point, coordinates[expected]),
+                    delta=1e-3 if metric == graphs.EUCLIDEAN else 5)
+            if metric == graphs.EUCLIDEAN:
+                within = grid.within((42, 23), 1.5)
+                self.assertCountEqual(within, [
+                    node for node in range(200) if coordinates.point_distance(
+                        (42, 23), coordinates[node]) <= 1.5])
+        self.assertIsNone(graphs.Coordinates().spatial_index().nearest((0, 0)))
+
+
+class DistanceMatrixTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "distances.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_exact(self, graph, matrix):
+        factory = problem.ProblemFactory()
+        nodes = sorted(graph.get_nodes())
+        self.assertEqual(matrix.node_count(), len(nodes))
+        for source in nodes[::3]:
+            for target in nodes:
+                problem_instance = factory.from_graph(graph, source, target)
+                solution = search.uniform_cost_search(problem_instance)
+                distance = matrix.distance(source, target)
+                if solution == problem.FAILURE:
+                    self.assertEqual(distance, float("inf"))
+                    continue
+                expected = problem_instance.solution_cost(solution)
+                # float32 values are rounded down
+                self.assertLessEqual(distance, expected)
+                self.assertAlmostEqual(distance, expected,
+                                       delta=1e-6 * expected)
+
+    def test_methods_agree(self):
+        loader = GraphLoader()
+        test_graphs = [loader.from_file(path)
+                       for path in config.TEST_GRAPHS.values()]
+        test_graphs += [graphs.road_graph(5, 6, seed=1, frozen=True),
+                        graphs.random_geometric_graph(40, 1.2, seed=2)]
+        for graph in test_graphs:
+            dense = graphs.all_pairs_distances(graph, dense=True)
+            self.assert_exact(graph, dense)
+            for processes in (1, 2):
+                sparse = graphs.all_pairs_distances(graph, dense=False,
+                                                    processes=processes)
+                self.assertEqual(list(sparse.values), list(dense.values))
+
+    @unittest.skipIf(graphs.numpy is None, "NumPy is not installed")
+    def test_numpy_matches_python(self):
+        graph = graphs.random_geometric_graph(60, 1.5, seed=3)
+        vectorised = graphs.all_pairs_distances(graph, dense=True)
+        python = graphs.all_pairs_distances(graph, dense=False)
+        self.assertEqual(list(vectorised.values), list(python.values))
+
+    def test_save_and_load(self):
+        graph = GraphLoader().from_file(config.TEST_GRAPHS["Bulgaria_map"])
+        matrix = graphs.all_pairs_distances(graph)
+        matrix.save(self.path)
+        for mmap in (True, False):
+            loaded = graphs.DistanceMatrix.load(self.path, mmap=mmap,
+                                                verify=True)
+            self.assertEqual(loaded.names, matrix.names)
+            self.assertEqual(list(loaded.values), list(matrix.values))
+            self.assertEqual(loaded.distance("Sofia", "Varna"),
+                             matrix.distance("Sofia", "Varna"))
+
+        other = GraphLoader().from_file(config.TEST_GRAPHS["romania_map"])
+        self.assertRaises(InvalidArgumentError, graphs.DistanceMatrix.load,
+                          self.path, other)
+        with open(self.path, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"?")
+        self.assertRaises(utils.ParsingError, graphs.DistanceMatrix.load,
+                          self.path, verify=True)
+        with open(self.path, "r+b") as file:
+            file.truncate(100)
+        self.assertRaises(utils.ParsingError, graphs.DistanceMatrix.load,
+                          self.path)
+
+    def test_perfect_heuristic(self):
+        graph = GraphLoader().from_file(config.TEST_GRAPHS["Bulgaria_map"])
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Vidin", "Burgas")
+        expected = search.uniform_cost_search(problem_instance)
+
+        path = os.path.join(self.directory, "other.bin")
+        graphs.all_pairs_distances(graph.freeze()).save(path)
+        graphs.DistanceMatrix.load(path, graph)
+        self.assertIsNotNone(graphs.distance_matrix_for(graph))
+        heuristic = factory.heuristic_for(problem_instance)
+        self.assertEqual(heuristic("Vidin"),
+                         problem_instance.solution_cost(expected))
+        solution = search.astar(problem_instance, heuristic)
+        self.assertEqual(problem_instance.solution_cost(solution),
+                         problem_instance.solution_cost(expected))
+
+        # A changed graph no longer uses the matrix
+        graph.add_edge("Vidin", "Burgas", 1)
+        self.assertIsNone(graphs.distance_matrix_for(graph))
+        self.assertLessEqual(factory.heuristic_for(problem_instance)("Vidin"),
+                             1)
 
 if __name__ == "__main__":
     unittest.main()
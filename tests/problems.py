@@ -1,7 +1,7 @@
 import os
 import unittest
 
-from adder import problem
+from adder import problem, utils
 
 import tests.config as config
 
@@ -34,6 +34,44 @@ class NQueensTest(unittest.TestCase):
         self.assertActions((4, 5, 6, 3, 4, 5, 6, 5))
         self.assertActions((7, 2, 6, 3, 1, 4, 0, 5))
 
-        
+
+
+class GridTest(unittest.TestCase):
+    def test_obstacles(self):
+        factory = problem.ProblemFactory()
+        grid = factory.from_grid(3, 4, {(1, 1), (2, 3)}, (0, 0), (2, 0))
+        free_cells = [(row, col) for row in range(3) for col in range(4)
+                      if grid.is_free(row, col)]
+        self.assertEqual(len(free_cells), 10)
+        self.assertFalse(grid.is_free(1, 1))
+        self.assertFalse(grid.is_free(2, 3))
+        self.assertFalse(grid.is_free(-1, 0))
+        self.assertFalse(grid.is_free(0, 4))
+        self.assertTrue(grid.is_free(2, 2))
+
+        self.assertRaises(utils.InvalidArgumentError, factory.from_grid,
+                          3, 4, {(1, 1)}, (1, 1), (2, 0))
+
+    def test_actions(self):
+        factory = problem.ProblemFactory()
+        grid = factory.from_grid(3, 3, {(0, 1)}, (1, 1), (2, 2))
+        self.assertCountEqual(grid.actions_iter((1, 1)),
+                              {(1, 0), (0, -1), (0, 1)})
+
+        grid = factory.from_grid(3, 3, {(0, 1)}, (1, 1), (2, 2),
+                                 diagonal=True)
+        # Diagonals next to the obstacle would cut its corner
+        self.assertCountEqual(grid.actions_iter((1, 1)),
+                              {(1, 0), (0, -1), (0, 1), (1, -1), (1, 1)})
+
+    def test_heuristic(self):
+        factory = problem.ProblemFactory()
+        grid = factory.from_grid(5, 5, set(), (0, 0), (4, 2))
+        self.assertEqual(factory.heuristic_for(grid)((0, 0)), 6)
+        grid = factory.from_grid(5, 5, set(), (0, 0), (4, 2), diagonal=True)
+        self.assertAlmostEqual(factory.heuristic_for(grid)((0, 0)),
+                               2 + 2 * 2 ** 0.5)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,482 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from adder import graphs, problem, routing, search, utils
+
+import tests.config as config
+
+
+def random_digraph(seed, size=30, edges=90):
+    generator = random.Random(seed)
+    graph = graphs.Digraph()
+    for _ in range(edges):
+        source = "n{0}".format(generator.randrange(size))
+        destination = "n{0}".format(generator.randrange(size))
+        if source != destination:
+            graph.add_edge(source, destination, generator.randint(1, 20))
+    return graph
+
+
+class LandmarkTests(unittest.TestCase):
+    def assert_admissible(self, graph, landmarks):
+        backward = routing.backward_neighbours(graph)
+        for goal in graph.get_nodes():
+            distances, _ = routing.dijkstra(backward, goal)
+            heuristic = landmarks.heuristic(goal)
+            for node in graph.get_nodes():
+                self.assertLessEqual(heuristic(node),
+                                     distances.get(node, float("inf")))
+
+    def test_admissible(self):
+        # Seeded for repeatable landmarks without fixing the random sequence
+        # of the tests that run after this one
+        self.addCleanup(random.setstate, random.getstate())
+        random.seed(0)
+        loader = graphs.GraphLoader()
+        test_graphs = [loader.from_file(path)
+                       for path in config.TEST_GRAPHS.values()]
+        test_graphs += [random_digraph(seed) for seed in range(3)]
+        for graph in test_graphs:
+            for strategy in (routing.FARTHEST, routing.AVOID):
+                landmarks = routing.Landmarks(graph, 4, strategy)
+                self.assertEqual(len(set(landmarks.landmarks)), 4)
+                self.assert_admissible(graph, landmarks)
+
+    def test_astar(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["Bulgaria_map"])
+        factory = problem.ProblemFactory()
+        for source in ("Varna", "Vidin", "Silistra"):
+            problem_instance = factory.from_graph(graph, source, "Pernik")
+            heuristic = factory.heuristic_for(problem_instance)
+            expected = search.uniform_cost_search(problem_instance)
+            solution = search.astar(problem_instance, heuristic)
+            self.assertEqual(problem_instance.solution_cost(solution),
+                             problem_instance.solution_cost(expected))
+
+    def test_unreachable_goal(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(
+            config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Pernik", "Varna")
+        heuristic = factory.heuristic_for(problem_instance)
+        self.assertEqual(heuristic("Pernik"), float("inf"))
+        self.assertEqual(search.astar(problem_instance, heuristic),
+                         problem.FAILURE)
+
+    def test_cache_invalidation(self):
+        graph = random_digraph(1)
+        landmarks = routing.landmarks_for(graph)
+        self.assertIs(routing.landmarks_for(graph), landmarks)
+        graph.add_edge("n0", "n1", 1)
+        self.assertIsNot(routing.landmarks_for(graph), landmarks)
+        self.assertRaises(utils.InvalidArgumentError, routing.Landmarks,
+                          graph, 0)
+
+
+class LandmarkPersistenceTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "romania.graph")
+        shutil.copy(config.TEST_GRAPHS["romania_map"], self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sidecar(self):
+        loader = graphs.GraphLoader()
+        saved = routing.save_landmarks(loader.from_file(self.path), 3)
+        self.assertTrue(os.path.exists(routing.sidecar_path(self.path)))
+
+        graph = loader.from_file(self.path)
+        loaded = routing.Landmarks.load(graph, routing.sidecar_path(self.path),
+                                        self.path)
+        self.assertEqual(loaded.landmarks, saved.landmarks)
+        self.assertEqual(routing.landmarks_for(graph, 3).landmarks,
+                         saved.landmarks)
+
+        # A changed graph file makes the sidecar stale
+        with open(self.path, "a") as file:
+            file.write("\nArad <-> Nowhere 1\n")
+        graph = loader.from_file(self.path)
+        self.assertIsNone(routing.Landmarks.load(
+            graph, routing.sidecar_path(self.path), self.path))
+        self.assertEqual(len(routing.landmarks_for(graph).landmarks), 8)
+
+    def test_count_mismatch(self):
+        loader = graphs.GraphLoader()
+        routing.save_landmarks(loader.from_file(self.path), 3)
+        graph = loader.from_file(self.path)
+        self.assertIsNone(routing.Landmarks.load(
+            graph, routing.sidecar_path(self.path), self.path, 5))
+        self.assertEqual(len(routing.landmarks_for(graph, 5).landmarks), 5)
+        self.assertEqual(len(routing.landmarks_for(graph, 3).landmarks), 3)
+
+    def test_damaged_sidecar(self):
+        loader = graphs.GraphLoader()
+        saved = routing.save_landmarks(loader.from_file(self.path), 3)
+        sidecar = routing.sidecar_path(self.path)
+        with open(sidecar, "rb") as file:
+            data = file.read()
+        graph = loader.from_file(self.path)
+        for damaged in (data[:10], data[:len(data) // 2], data[:-1],
+                        data[:-1] + b"?", b"", b"ADDERLMK\x01" + data[9:]):
+            with open(sidecar, "wb") as file:
+                file.write(damaged)
+            self.assertIsNone(routing.Landmarks.load(graph, sidecar,
+                                                     self.path))
+            self.assertEqual(len(routing.landmarks_for(graph, 3).landmarks),
+                             3)
+            graph = loader.from_file(self.path)
+        with open(sidecar, "wb") as file:
+            file.write(data)
+        loaded = routing.Landmarks.load(graph, sidecar, self.path)
+        self.assertEqual(loaded.distances_from, saved.distances_from)
+        self.assertEqual(loaded.distances_to, saved.distances_to)
+
+    def test_graph_without_file(self):
+        self.assertRaises(utils.InvalidArgumentError, routing.save_landmarks,
+                          graphs.Graph())
+
+
+class StraightLineHeuristicTests(unittest.TestCase):
+    def test_admissible(self):
+        test_graphs = (graphs.road_graph(8, 9, seed=2),
+                       graphs.random_geometric_graph(150, 1.5, seed=4),
+                       graphs.grid_graph(8, 8, 0.2, True, seed=1, frozen=True))
+        for graph in test_graphs:
+            straight_line = routing.straight_line_for(graph)
+            self.assertIs(routing.straight_line_for(graph), straight_line)
+            self.assertGreater(straight_line.scale, 0)
+            backward = routing.backward_neighbours(graph)
+            for goal in sorted(graph.get_nodes())[::10]:
+                distances, _ = routing.dijkstra(backward, goal)
+                heuristic = straight_line.heuristic(goal)
+                for node, distance in distances.items():
+                    self.assertLessEqual(heuristic(node), distance + 1e-9)
+
+    def test_astar(self):
+        graph = graphs.road_graph(10, 10, seed=5)
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "0_0", "9_9")
+        heuristic = factory.heuristic_for(problem_instance)
+        self.assertGreater(heuristic("0_0"), 0)
+        expected = search.uniform_cost_search(problem_instance)
+        solution = search.astar(problem_instance, heuristic)
+        self.assertAlmostEqual(problem_instance.solution_cost(solution),
+                               problem_instance.solution_cost(expected))
+
+    def test_missing_coordinates(self):
+        graph = graphs.road_graph(3, 3, seed=0)
+        graph.add_edge("0_0", "Elsewhere", 1)
+        self.assertIsNone(routing.straight_line_for(graph))
+        self.assertIsNone(routing.straight_line_for(graphs.Graph()))
+        # Graphs without complete coordinates fall back to landmarks
+        factory = problem.ProblemFactory()
+        heuristic = factory.heuristic_for(
+            factory.from_graph(graph, "0_0", "Elsewhere"))
+        self.assertLessEqual(heuristic("0_0"), 1)
+
+    def test_cached_until_changed(self):
+        graph = graphs.road_graph(3, 3, seed=0)
+        graph.add_edge("0_0", "Elsewhere", 1)
+        self.assertIsNone(routing.straight_line_for(graph))
+        # The missing coordinates are only looked for once per version
+        scans = []
+        get_nodes = graph.get_nodes
+        graph.get_nodes = lambda: scans.append(None) or get_nodes()
+        self.assertIsNone(routing.straight_line_for(graph))
+        self.assertEqual(scans, [])
+        graph.coordinates.add("Elsewhere", 0, -1)
+        straight_line = routing.straight_line_for(graph)
+        self.assertIsNotNone(straight_line)
+        self.assertIs(routing.straight_line_for(graph), straight_line)
+        self.assertEqual(len(scans), 1)
+        graph.coordinates = None
+        self.assertIsNone(routing.straight_line_for(graph))
+
+
+class ContractionHierarchyTests(unittest.TestCase):
+    def assert_shortest_paths(self, graph):
+        hierarchy = routing.ContractionHierarchy(graph)
+        factory = problem.ProblemFactory()
+        forward = routing.forward_neighbours(graph)
+        nodes = graph.get_nodes()
+        for source in nodes:
+            distances, _ = routing.dijkstra(forward, source)
+            for target in nodes:
+                solution = hierarchy.shortest_path(source, target)
+                if target not in distances:
+                    self.assertEqual(solution, problem.FAILURE)
+                    continue
+                problem_instance = factory.from_graph(graph, source, target)
+                self.assertEqual(solution[0], (source, None))
+                self.assertEqual(solution[-1][0], target)
+                # Unpacked paths only use edges of the original graph
+                self.assertAlmostEqual(
+                    problem_instance.solution_cost(solution),
+                    distances[target])
+
+    def test_maps(self):
+        loader = graphs.GraphLoader()
+        for path in config.TEST_GRAPHS.values():
+            self.assert_shortest_paths(loader.from_file(path))
+
+    def test_digraphs(self):
+        for seed in range(5):
+            self.assert_shortest_paths(random_digraph(seed))
+
+    def test_same_path_as_astar(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["romania_map"])
+        hierarchy = routing.ContractionHierarchy(graph)
+        self.assertGreater(hierarchy.shortcut_count, 0)
+        self.assertEqual([state for state, _ in
+                          hierarchy.shortest_path("Arad", "Bucharest")],
+                         ["Arad", "Sibiu", "RimnicuVilcea", "Pitesti",
+                          "Bucharest"])
+
+    def test_invalid_queries(self):
+        graph = random_digraph(0)
+        hierarchy = routing.ContractionHierarchy(graph)
+        self.assertRaises(utils.InvalidArgumentError,
+                          hierarchy.shortest_path, "n0", "Nowhere")
+        graph.add_edge("n0", "n1", 1)
+        self.assertRaises(utils.InvalidArgumentError,
+                          hierarchy.shortest_path, "n0", "n1")
+
+class ShortestPathServiceTests(unittest.TestCase):
+    def test_paths(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["Bulgaria_map"])
+        service = routing.ShortestPathService(graph, max_trees=2)
+        factory = problem.ProblemFactory()
+        for source in ("Varna", "Vidin", "Silistra"):
+            for target in ("Pernik", "Burgas", source):
+                problem_instance = factory.from_graph(graph, source, target)
+                expected = search.uniform_cost_search(problem_instance)
+                solution = service.path(source, target)
+                self.assertEqual(solution[0], (source, None))
+                self.assertEqual(solution[-1][0], target)
+                self.assertEqual(problem_instance.solution_cost(solution),
+                                 problem_instance.solution_cost(expected))
+                self.assertEqual(service.distance(source, target),
+                                 problem_instance.solution_cost(expected))
+        # Three sources were queried, one tree per source
+        self.assertEqual(service.trees.misses, 3)
+        self.assertEqual(service.trees.evictions, 1)
+        self.assertRaises(utils.InvalidArgumentError, service.path,
+                          "Nowhere", "Pernik")
+
+    def test_unreachable(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(
+            config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        service = routing.ShortestPathService(graph)
+        self.assertEqual(service.path("Pernik", "Varna"), problem.FAILURE)
+        self.assertEqual(service.distance_table(["Pernik", "Varna"],
+                                                ["Sofia", "Burgas"]),
+                         [[28, float("inf")], [float("inf"), 128]])
+
+    def test_invalidation(self):
+        graph = graphs.Digraph()
+        graph.add_edge("A", "B", 5)
+        service = routing.ShortestPathService(graph)
+        self.assertEqual(service.distance("A", "B"), 5)
+        graph.add_edge("A", "C", 1)
+        graph.add_edge("C", "B", 1)
+        self.assertEqual(service.distance("A", "B"), 2)
+        self.assertEqual([state for state, _ in service.path("A", "B")],
+                         ["A", "C", "B"])
+
+    def test_backward_trees(self):
+        # A -> B -> C has no path back
+        graph = graphs.Digraph()
+        graph.add_edge("A", "B", 1)
+        graph.add_edge("B", "C", 1)
+        graph.add_edge("A", "C", 5)
+        for backward in (False, True):
+            service = routing.ShortestPathService(graph, backward=backward)
+            self.assertEqual(service.distance("A", "C"), 2)
+            self.assertEqual(service.distance("C", "A"), float("inf"))
+            self.assertEqual(service.path("A", "C"),
+                             [("A", None), ("B", "B"), ("C", "C")])
+            self.assertEqual(service.path("C", "A"), problem.FAILURE)
+            self.assertEqual(service.distance_table(["A", "B"], ["C"]),
+                             [[2], [1]])
+        # Backward services keep one tree per target, never one for B
+        self.assertCountEqual([root for root, _ in service.trees.items()],
+                              ["A", "C"])
+
+        for seed in range(3):
+            graph = random_digraph(seed, 15, 40)
+            forward = routing.ShortestPathService(graph)
+            backward = routing.ShortestPathService(graph, backward=True)
+            factory = problem.ProblemFactory()
+            for source in sorted(graph.get_nodes()):
+                for target in sorted(graph.get_nodes()):
+                    self.assertEqual(backward.distance(source, target),
+                                     forward.distance(source, target))
+                    solution = backward.path(source, target)
+                    if solution == problem.FAILURE:
+                        self.assertEqual(forward.path(source, target),
+                                         problem.FAILURE)
+                        continue
+                    self.assertEqual(solution[0], (source, None))
+                    self.assertEqual(solution[-1][0], target)
+                    self.assertEqual(
+                        factory.from_graph(graph, source, target)
+                        .solution_cost(solution),
+                        forward.distance(source, target))
+
+class DynamicShortestPathsTests(unittest.TestCase):
+    def assert_trees_valid(self, graph, service, source):
+        expected, _ = routing.dijkstra(routing.forward_neighbours(graph),
+                                       source)
+        distances, parents = service.tree(source)
+        self.assertCountEqual(distances, expected)
+        for node, distance in expected.items():
+            self.assertAlmostEqual(distances[node], distance)
+            if parents[node] is not None:
+                self.assertAlmostEqual(
+                    distances[parents[node]] +
+                    graph.edge_cost(parents[node], node), distance)
+
+    def test_random_updates(self):
+        for seed in range(6):
+            generator = random.Random(seed)
+            graph = random_digraph(seed, 20, 60) if seed % 2 == 1 \
+                else graphs.road_graph(4, 5, seed)
+            service = routing.DynamicShortestPaths(graph, max_trees=3)
+            nodes = sorted(graph.get_nodes())
+            for _ in range(100):
+                source = generator.choice(nodes)
+                if graph.has_node(source):
+                    self.assert_trees_valid(graph, service, source)
+
+                edges = list(graph.dfs_iter(edges=True))
+                first, second = generator.sample(nodes, 2)
+                operation = generator.random()
+                if operation < 0.5 and len(edges) != 0:
+                    source, destination, cost = generator.choice(edges)
+                    graph.update_cost(source, destination,
+                                      cost * generator.uniform(0.3, 2.5))
+                elif operation < 0.75:
+                    graph.add_edge(first, second, generator.randint(1, 20))
+                elif len(edges) != 0:
+                    source, destination, _ = generator.choice(edges)
+                    graph.remove_edge(source, destination)
+
+    def test_repairs_without_rebuilding(self):
+        graph = graphs.Digraph()
+        graph.add_edge("A", "B", 1)
+        graph.add_edge("B", "C", 1)
+        graph.add_edge("A", "C", 5)
+        graph.add_edge("D", "A", 1)
+        service = routing.DynamicShortestPaths(graph)
+        self.assertEqual(service.distance("A", "C"), 2)
+
+        graph.update_cost("B", "C", 10)
+        self.assertEqual(service.distance("A", "C"), 5)
+        self.assertEqual([state for state, _ in service.path("A", "C")],
+                         ["A", "C"])
+        graph.update_cost("A", "B", 0.5)
+        graph.update_cost("B", "C", 1)
+        self.assertEqual(service.distance("A", "C"), 1.5)
+        graph.remove_edge("A", "C")
+        graph.remove_edge("A", "B")
+        self.assertEqual(service.path("A", "C"), problem.FAILURE)
+        self.assertEqual(service.trees.misses, 1)
+
+        # Once closed, changes drop the trees like in ShortestPathService
+        service.close()
+        graph.add_edge("A", "C", 1)
+        self.assertEqual(service.distance("A", "C"), 1)
+
+class KShortestPathsTests(unittest.TestCase):
+    def simple_path_costs(self, graph, source, target):
+        costs = []
+
+        def extend(node, visited, cost):
+            if node == target:
+                costs.append(cost)
+                return
+            for child in graph.children_iter(node):
+                if child not in visited:
+                    visited.add(child)
+                    extend(child, visited, cost + graph.edge_cost(node, child))
+                    visited.remove(child)
+        extend(source, {source}, 0)
+        return sorted(costs)
+
+    def test_all_simple_paths(self):
+        factory = problem.ProblemFactory()
+        for seed in range(4):
+            graph = random_digraph(seed, 8, 20) if seed % 2 == 0 \
+                else graphs.road_graph(3, 3, seed)
+            nodes = sorted(graph.get_nodes())
+            for source in nodes:
+                for target in nodes:
+                    expected = self.simple_path_costs(graph, source, target)
+                    paths = list(routing.k_shortest_paths(graph, source,
+                                                          target))
+                    self.assertEqual(len(paths), len(expected))
+                    for (cost, solution), expected_cost in zip(paths,
+                                                               expected):
+                        self.assertAlmostEqual(cost, expected_cost)
+                        states = [state for state, _ in solution]
+                        self.assertEqual(len(set(states)), len(states))
+                        self.assertEqual(solution[0], (source, None))
+                        self.assertEqual(states[-1], target)
+                        problem_instance = factory.from_graph(graph, source,
+                                                              target)
+                        self.assertAlmostEqual(
+                            problem_instance.solution_cost(solution), cost)
+
+    def test_lazy_alternatives(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["romania_map"])
+        paths = routing.k_shortest_paths(graph, "Arad", "Bucharest")
+        cost, solution = next(paths)
+        self.assertEqual([state for state, _ in solution],
+                         ["Arad", "Sibiu", "RimnicuVilcea", "Pitesti",
+                          "Bucharest"])
+        cost, solution = next(paths)
+        self.assertEqual(cost, 450)
+        self.assertEqual([state for state, _ in solution],
+                         ["Arad", "Sibiu", "Fagaras", "Bucharest"])
+
+        # The backward tree of the target is shared between queries
+        service = routing.ShortestPathService(graph, backward=True)
+        for source in ("Arad", "Iasi", "Craiova"):
+            next(routing.k_shortest_paths(graph, source, "Bucharest",
+                                          service))
+        self.assertEqual(service.trees.misses, 1)
+        self.assertRaises(utils.InvalidArgumentError, next,
+                          routing.k_shortest_paths(
+                              graph, "Arad", "Bucharest",
+                              routing.ShortestPathService(graph)))
+
+    def test_unreachable_and_changes(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(
+            config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        self.assertEqual(list(routing.k_shortest_paths(graph, "Pernik",
+                                                       "Varna")), [])
+        self.assertEqual(list(routing.k_shortest_paths(graph, "Varna",
+                                                       "Varna")),
+                         [(0, [("Varna", None)])])
+        self.assertRaises(utils.InvalidArgumentError, next,
+                          routing.k_shortest_paths(graph, "Nowhere", "Varna"))
+
+        paths = routing.k_shortest_paths(graph, "Pernik", "Sofia")
+        next(paths)
+        graph.add_edge("Pernik", "Varna", 1)
+        self.assertRaises(utils.InvalidArgumentError, next, paths)
+
+if __name__ == "__main__":
+    unittest.main()
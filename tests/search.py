@@ -1,9 +1,11 @@
 import functools
 import os
+import shutil
+import tempfile
 import unittest
 import random
 
-from adder import graphs, problem, search
+from adder import graphs, problem, search, utils
 import tests.config as config
 
 class SearchTest(unittest.TestCase):
@@ -231,6 +233,357 @@ class AStarNPuzzleTests(SearchTest):
         self.assert_npuzzle("4 2 5 3 6 8 1 7 0", "0 1 2 3 4 5 6 7 8", 15)
 
 
+class UniformCostTests(SearchTest):
+    def test_Bulgaria_disconnected(self):
+        self.assert_Bulgaria_disconnected(search.uniform_cost_search)
+
+    def test_romania(self):
+        assert_ucs = functools.partial(self.assert_solution,
+                                       search.uniform_cost_search,
+                                       "romania_map")
+        assert_ucs("Arad", "Bucharest",
+                   ["Arad", "Sibiu", "RimnicuVilcea", "Pitesti", "Bucharest"])
+
+    def test_integer_grid(self):
+        factory = problem.ProblemFactory()
+        wall = {(row, 3) for row in range(5)}
+        grid = factory.from_grid(6, 6, wall, (0, 0), (0, 5))
+        for tie_breaking in (search.FIFO, search.LIFO):
+            solution = search.uniform_cost_search(grid, tie_breaking)
+            self.assertEqual(grid.solution_cost(solution), 15)
+
+
+class BucketFrontierTests(unittest.TestCase):
+    def test_frontier_selection(self):
+        factory = problem.ProblemFactory()
+        frontier_for = getattr(search, "__frontier_for")
+        puzzle = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                      "0 1 2 3 4 5 6 7 8")
+        heuristic = factory.heuristic_for(puzzle)
+        self.assertIsInstance(frontier_for(puzzle, heuristic, search.FIFO),
+                              search._BucketFrontier)
+        self.assertIsInstance(frontier_for(puzzle, lambda state: 0,
+                                           search.FIFO),
+                              search._HeapFrontier)
+
+        grid = factory.from_grid(3, 3, set(), (0, 0), (2, 2), diagonal=True)
+        self.assertIsInstance(frontier_for(grid, factory.heuristic_for(grid),
+                                           search.FIFO),
+                              search._HeapFrontier)
+
+    def test_tie_breaking(self):
+        for frontier_type in (search._BucketFrontier, search._HeapFrontier):
+            fifo = frontier_type()
+            lifo = frontier_type(lifo=True)
+            for priority, item in ((3, "a"), (1, "b"), (3, "c"), (1, "d")):
+                fifo.push(priority, item)
+                lifo.push(priority, item)
+            self.assertEqual([fifo.pop() for _ in range(4)],
+                             ["b", "d", "a", "c"])
+            self.assertEqual([lifo.pop() for _ in range(4)],
+                             ["d", "b", "c", "a"])
+            self.assertEqual(len(fifo), 0)
+
+    def test_npuzzle_tie_breaking(self):
+        factory = problem.ProblemFactory()
+        puzzle = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                      "0 1 2 3 4 5 6 7 8")
+        heuristic = factory.heuristic_for(puzzle)
+        for tie_breaking in (search.FIFO, search.LIFO):
+            solution = search.astar(puzzle, heuristic,
+                                    tie_breaking=tie_breaking)
+            self.assertEqual(len(solution), 15)
+
+
+class BreadthFirstHeuristicSearchTests(unittest.TestCase):
+    def assert_valid_solution(self, problem_instance, solution, length):
+        self.assertEqual(len(solution), length)
+        self.assertEqual(solution[0], (problem_instance.initial.state, None))
+        self.assertTrue(problem_instance.goal_test(solution[-1][0]))
+        for (state, _), (next_state, action) in zip(solution, solution[1:]):
+            self.assertEqual(problem_instance.result(state, action),
+                             next_state)
+
+    def test_npuzzle(self):
+        factory = problem.ProblemFactory()
+        puzzle = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                      "0 1 2 3 4 5 6 7 8")
+        heuristic = factory.heuristic_for(puzzle)
+        solution = search.breadth_first_heuristic_search(puzzle, heuristic)
+        self.assert_valid_solution(puzzle, solution, 15)
+
+        solution = search.breadth_first_heuristic_search(puzzle, heuristic,
+                                                         upper_bound=14)
+        self.assert_valid_solution(puzzle, solution, 15)
+        solution = search.breadth_first_heuristic_search(puzzle, heuristic,
+                                                         upper_bound=13)
+        self.assertEqual(solution, problem.FAILURE)
+
+    def test_grids(self):
+        factory = problem.ProblemFactory()
+        for seed in range(20):
+            generator = random.Random(seed)
+            size = generator.randint(3, 15)
+            obstacles = {(generator.randrange(size), generator.randrange(size))
+                         for _ in range(size * size // 4)}
+            obstacles -= {(0, 0), (size - 1, size - 1)}
+            grid = factory.from_grid(size, size, obstacles, (0, 0),
+                                     (size - 1, size - 1))
+            heuristic = factory.heuristic_for(grid)
+            expected = search.astar(grid, heuristic)
+
+            for solution in (search.breadth_first_heuristic_search(grid,
+                                                                   heuristic),
+                             search.frontier_search(grid)):
+                if expected == problem.FAILURE:
+                    self.assertEqual(solution, problem.FAILURE)
+                else:
+                    self.assert_valid_solution(grid, solution, len(expected))
+
+
+class DepthFirstBranchAndBoundTests(SearchTest):
+    def test_romania(self):
+        heuristic_dict = {
+            "Arad": 366, "Bucharest": 0, "Craiova": 160,
+            "Drobeta": 242, "Eforie": 161, "Fagaras": 176,
+            "Giurgiu": 77, "Hirsova": 151, "Iasi": 226, "Lugoj": 244,
+            "Mehadia": 241, "Neamt": 234, "Oradea": 380, "Pitesti": 100,
+            "RimnicuVilcea": 193, "Sibiu": 253, "Timisoara": 329,
+            "Urziceni": 80, "Vaslui": 199, "Zerind": 374
+        }
+        pruned = []
+
+        def dfbnb(problem_instance):
+            solution, pruned_count = search.depth_first_branch_and_bound(
+                problem_instance, lambda state: heuristic_dict[state])
+            pruned.append(pruned_count)
+            return solution
+
+        assert_dfbnb = functools.partial(self.assert_solution, dfbnb,
+                                         "romania_map")
+        assert_dfbnb("Arad", "Bucharest",
+                     ["Arad", "Sibiu", "RimnicuVilcea", "Pitesti", "Bucharest"])
+        self.assertGreater(pruned[0], 0)
+
+    def test_Bulgaria_disconnected(self):
+        dfbnb = lambda problem_instance: search.depth_first_branch_and_bound(
+            problem_instance, lambda state: 0)[0]
+        self.assert_Bulgaria_disconnected(dfbnb)
+
+    def test_npuzzle(self):
+        factory = problem.ProblemFactory()
+        puzzle = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                      "0 1 2 3 4 5 6 7 8")
+        heuristic = factory.heuristic_for(puzzle)
+        solution, _ = search.depth_first_branch_and_bound(puzzle, heuristic,
+                                                          upper_bound=14)
+        self.assertEqual(len(solution), 15)
+        solution, pruned = search.depth_first_branch_and_bound(
+            puzzle, heuristic, upper_bound=13)
+        self.assertEqual(solution, problem.FAILURE)
+        self.assertGreater(pruned, 0)
+
+
+class UnreachableGoalTests(unittest.TestCase):
+    def test_searches_fail_without_expanding(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(
+            config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Pernik", "Varna")
+        self.assertTrue(problem_instance.goal_unreachable())
+        self.assertFalse(factory.from_graph(graph, "Pernik",
+                                            "Sofia").goal_unreachable())
+
+        expanded = []
+        actions_iter = problem_instance.actions_iter
+        problem_instance.actions_iter = lambda state: \
+            expanded.append(state) or actions_iter(state)
+        zero = lambda state: 0
+        for search_algorithm in (search.bfs, search.dfs,
+                                 search.iterative_deepening_dfs,
+                                 search.uniform_cost_search,
+                                 search.frontier_search,
+                                 lambda p: search.astar(p, zero),
+                                 lambda p: search.depth_first_branch_and_bound(
+                                     p, zero)[0]):
+            self.assertEqual(search_algorithm(problem_instance),
+                             problem.FAILURE)
+        self.assertEqual(expanded, [])
+
+
+class ExternalBfsTests(SearchTest):
+    def run_external_bfs(self, problem_instance, encode, decode, **kwargs):
+        layers = []
+        report = lambda depth, size: layers.append(size)
+        depth = search.external_bfs(problem_instance, encode, decode,
+                                    report_layer=report, **kwargs)
+        return depth, layers
+
+    def test_romania(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["romania_map"])
+        names = sorted(graph.get_nodes())
+        encode = names.index
+        decode = names.__getitem__
+
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Arad", "Bucharest")
+        depth, layers = self.run_external_bfs(problem_instance, encode, decode)
+        self.assertEqual(depth, 3)
+        self.assertEqual(layers, [1, 3, 4, 4])
+
+    def test_Bulgaria_disconnected(self):
+        loader = graphs.GraphLoader()
+        graph = loader.from_file(config.TEST_GRAPHS["Bulgaria_disconnected_map"])
+        names = sorted(graph.get_nodes())
+
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_graph(graph, "Pernik", "Varna")
+        depth, layers = self.run_external_bfs(problem_instance, names.index,
+                                              names.__getitem__)
+        self.assertEqual(depth, problem.FAILURE)
+        # The component index proves the goal unreachable up front
+        self.assertEqual(layers, [])
+
+    def test_npuzzle(self):
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                                "0 1 2 3 4 5 6 7 8")
+        encode = lambda state: int("".join(state))
+        decode = lambda code: tuple(str(code).zfill(9))
+
+        # A tiny buffer forces many sorted runs and multi-pass merging
+        depth, layers = self.run_external_bfs(problem_instance, encode,
+                                              decode, buffer_size=16)
+        self.assertEqual(depth, 14)
+        self.assertEqual(layers[:4], [1, 2, 4, 8])
+
+    def test_max_depth(self):
+        # A directed cycle longer than two layers is never deduplicated
+        factory = problem.ProblemFactory()
+        cycle = factory.from_functions(0, lambda state: [1],
+                                       lambda state, action: 1,
+                                       lambda state, action: (state + 1) % 5,
+                                       lambda state: False)
+        depth, layers = self.run_external_bfs(cycle, int, int, max_depth=12)
+        self.assertEqual(depth, problem.SOLUTION_UNKNOWN)
+        self.assertEqual(layers, [1] * 13)
+
+    def test_directed_graph(self):
+        # A -> B -> C -> A is a cycle longer than the two deduplicated
+        # layers, so A comes back in layer 3
+        graph = graphs.Digraph()
+        for source, destination in (("A", "B"), ("B", "C"), ("C", "A"),
+                                    ("C", "D"), ("D", "E"), ("E", "F"),
+                                    ("G", "A")):
+            graph.add_edge(source, destination, 1)
+        names = sorted(graph.get_nodes())
+        factory = problem.ProblemFactory()
+
+        problem_instance = factory.from_graph(graph, "A", "F")
+        depth, layers = self.run_external_bfs(problem_instance, names.index,
+                                              names.__getitem__)
+        self.assertEqual(depth, 5)
+        self.assertEqual(layers, [1, 1, 1, 2, 2, 2])
+
+        # G is in the same weak component but cannot be reached from A
+        problem_instance = factory.from_graph(graph, "A", "G")
+        depth, layers = self.run_external_bfs(problem_instance, names.index,
+                                              names.__getitem__, max_depth=9)
+        self.assertEqual(depth, problem.SOLUTION_UNKNOWN)
+        self.assertEqual(layers, [1, 1, 1, 2, 2, 2, 2, 2, 2, 2])
+
+    def test_npuzzle_all_layers(self):
+        if not config.HARD_TESTS:
+            return
+        factory = problem.ProblemFactory()
+        # The goal has the wrong parity and is never reached
+        problem_instance = factory.from_npuzzle("0 1 2 3 4 5 6 7 8",
+                                                "0 2 1 3 4 5 6 7 8")
+        encode = lambda state: int("".join(state))
+        decode = lambda code: tuple(str(code).zfill(9))
+        depth, layers = self.run_external_bfs(problem_instance, encode, decode)
+        self.assertEqual(depth, problem.FAILURE)
+        self.assertEqual(sum(layers), 181440)
+        self.assertEqual(len(layers), 32)
+
+
+class JumpPointSearchTests(unittest.TestCase):
+    def random_grid(self, seed, diagonal):
+        generator = random.Random(seed)
+        rows = generator.randint(3, 12)
+        columns = generator.randint(3, 12)
+        count = int(rows * columns * generator.random() * 0.4)
+        obstacles = {(generator.randrange(rows), generator.randrange(columns))
+                     for _ in range(count)}
+        obstacles -= {(0, 0), (rows - 1, columns - 1)}
+        factory = problem.ProblemFactory()
+        return factory.from_grid(rows, columns, obstacles, (0, 0),
+                                 (rows - 1, columns - 1), diagonal)
+
+    def assert_same_as_astar(self, grid):
+        heuristic = problem.ProblemFactory().heuristic_for(grid)
+        expected = search.astar(grid, heuristic)
+        solution = search.jump_point_search(grid, heuristic)
+        if expected == problem.FAILURE:
+            self.assertEqual(solution, problem.FAILURE)
+            return
+
+        self.assertAlmostEqual(grid.solution_cost(solution),
+                               grid.solution_cost(expected))
+        self.assertEqual(solution[0], (grid.initial.state, None))
+        self.assertEqual(solution[-1][0], grid.goal)
+        for (state, _), (next_state, action) in zip(solution, solution[1:]):
+            self.assertTrue(grid.can_move(state, action))
+            self.assertEqual(grid.result(state, action), next_state)
+
+    def test_random_grids(self):
+        for seed in range(40):
+            self.assert_same_as_astar(self.random_grid(seed, diagonal=True))
+            self.assert_same_as_astar(self.random_grid(seed, diagonal=False))
+
+    def test_open_grid(self):
+        factory = problem.ProblemFactory()
+        grid = factory.from_grid(200, 200, set(), (0, 0), (199, 150),
+                                 diagonal=True)
+        solution = search.jump_point_search(grid, factory.heuristic_for(grid))
+        self.assertAlmostEqual(grid.solution_cost(solution),
+                               49 + 150 * 2 ** 0.5)
+
+    def count_expansions(self, grid):
+        # Nodes astar expands against jump points JPS generates, which is an
+        # upper bound on the ones it expands
+        heuristic = problem.ProblemFactory().heuristic_for(grid)
+        expanded = []
+        actions_iter = grid.actions_iter
+        grid.actions_iter = lambda state: expanded.append(state) or \
+            actions_iter(state)
+        search.astar(grid, heuristic)
+        generated = []
+        search.jump_point_search(grid, lambda state: generated.append(state)
+                                 or heuristic(state))
+        return len(expanded), len(generated)
+
+    def test_fewer_expansions(self):
+        factory = problem.ProblemFactory()
+        for diagonal in (True, False):
+            grid = factory.from_grid(100, 100, set(), (0, 0), (99, 99),
+                                     diagonal)
+            astar_expanded, jps_generated = self.count_expansions(grid)
+            self.assertLess(10 * jps_generated, astar_expanded)
+
+            # Random obstacles leave many forced neighbours, so the gain is
+            # much smaller there
+            generator = random.Random(1)
+            obstacles = {(generator.randrange(100), generator.randrange(100))
+                         for _ in range(2000)} - {(0, 0), (99, 99)}
+            grid = factory.from_grid(100, 100, obstacles, (0, 0), (99, 99),
+                                     diagonal)
+            astar_expanded, jps_generated = self.count_expansions(grid)
+            self.assertLess(jps_generated, astar_expanded)
+
+
 class HillClimbingQueensTests(unittest.TestCase):
     def test_local_minima(self):
         factory = problem.ProblemFactory()
@@ -300,6 +653,65 @@ class SimulatedAnnealingTests(unittest.TestCase):
         self.assertLessEqual(heuristic(final_state), 1)
 
 
+class BeamSearchTests(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        factory = problem.ProblemFactory()
+        self.queens8_gen = functools.partial(factory.from_nqueens, 8)
+        self.heuristic = factory.heuristic_for(self.queens8_gen())
+
+    def assert_solves_queens(self, beam_search, expected_ratio):
+        problem_count = 10
+        found_solutions = 0
+        for _ in range(problem_count):
+            solution = beam_search(self.queens8_gen, 10, self.heuristic,
+                                   max_iterations=100,
+                                   local_minima_acceptable=False)
+            if solution != problem.FAILURE:
+                self.assertEqual(self.heuristic(solution[-1][0]), 0)
+                found_solutions += 1
+        self.assertGreaterEqual(found_solutions,
+                                expected_ratio * problem_count)
+
+    def test_local_beam_search(self):
+        self.assert_solves_queens(search.local_beam_search, 0.8)
+
+    def test_stochastic_beam_search(self):
+        self.assert_solves_queens(search.stochastic_beam_search, 0.8)
+
+    def test_batched_heuristic(self):
+        batch_sizes = []
+
+        def batched(states):
+            batch_sizes.append(len(states))
+            return [self.heuristic(state) for state in states]
+
+        for beam_search in (search.local_beam_search,
+                            search.stochastic_beam_search):
+            batch_sizes.clear()
+            solution = beam_search(self.queens8_gen, 4, batched,
+                                   batched=True, max_iterations=3)
+            self.assertNotEqual(solution, problem.FAILURE)
+            self.assertEqual(batch_sizes[0], 4)
+            # All successors of the 4 beams are scored in a single call
+            for size in batch_sizes[1:]:
+                self.assertLessEqual(size, 4 * 8 * 8)
+                self.assertGreaterEqual(size, 8 * 7)
+
+    def test_budget(self):
+        solution = search.local_beam_search(self.queens8_gen, 3,
+                                            self.heuristic, max_iterations=0)
+        self.assertEqual(len(solution), 1)
+        solution = search.local_beam_search(self.queens8_gen, 3,
+                                            self.heuristic, time_limit=-1,
+                                            local_minima_acceptable=False)
+        if solution != problem.FAILURE:
+            self.assertEqual(len(solution), 1)
+        self.assertRaises(utils.InvalidArgumentError,
+                          search.local_beam_search, self.queens8_gen, 0,
+                          self.heuristic)
+
+
 class GeneticTests(unittest.TestCase):
     def __reproduce_nqueens(self, father, mother, crossover):
         child = [father[i] if i < crossover else mother[i]
@@ -328,3 +740,340 @@ class GeneticTests(unittest.TestCase):
                              self.__reproduce_nqueens, self.__mutate_nqueens,
                              population_size)
         self.assertEqual(heuristic(res), 0)
+
+
+class AndOrSearchTests(unittest.TestCase):
+    def erratic_vacuum_world(self, initial):
+        # State is (location, is A dirty, is B dirty)
+        def results(state, action):
+            location, dirt_a, dirt_b = state
+            if action == "Left":
+                return [("A", dirt_a, dirt_b)]
+            if action == "Right":
+                return [("B", dirt_a, dirt_b)]
+            is_dirty = dirt_a if location == "A" else dirt_b
+            if not is_dirty:
+                # Sucking a clean square sometimes deposits dirt on it
+                dirty = (location, location == "A" or dirt_a,
+                         location == "B" or dirt_b)
+                return [state, dirty]
+            clean = (location, location != "A" and dirt_a,
+                     location != "B" and dirt_b)
+            # Sucking a dirty square sometimes cleans the adjacent one too
+            return [clean, (location, False, False)]
+
+        actions = lambda state: ["Suck", "Left", "Right"]
+        goal_test = lambda state: not state[1] and not state[2]
+        factory = problem.ProblemFactory()
+        return factory.from_nondeterministic_functions(initial, actions,
+                                                       results, goal_test)
+
+    def chain(self, length):
+        # Moving forward advances by one or two states; the goal is the end
+        actions = lambda state: ["Forward"] if state < length else []
+        results = lambda state, action: [state + 1, min(state + 2, length)]
+        goal_test = lambda state: state == length
+        factory = problem.ProblemFactory()
+        return factory.from_nondeterministic_functions(0, actions,
+                                                       results, goal_test)
+
+    def assert_plan_succeeds(self, problem_instance, plan):
+        self.assertNotEqual(plan, problem.FAILURE)
+        # Plans share subplans, so each (state, subplan) is checked once
+        pending = [(problem_instance.initial.state, plan)]
+        checked = set()
+        while len(pending) != 0:
+            state, plan = pending.pop()
+            if (state, id(plan)) in checked:
+                continue
+            checked.add((state, id(plan)))
+            if plan == []:
+                self.assertTrue(problem_instance.goal_test(state))
+                continue
+            action, branches = plan
+            outcomes = problem_instance.results(state, action)
+            self.assertCountEqual(branches.keys(), set(outcomes))
+            pending.extend(branches.items())
+
+    def test_vacuum_world(self):
+        for search_algorithm in (search.and_or_search,
+                                 search.iterative_and_or_search):
+            for location in ("A", "B"):
+                for dirt_a in (False, True):
+                    for dirt_b in (False, True):
+                        state = (location, dirt_a, dirt_b)
+                        world = self.erratic_vacuum_world(state)
+                        plan = search_algorithm(world)
+                        self.assert_plan_succeeds(world, plan)
+
+    def test_failure(self):
+        factory = problem.ProblemFactory()
+        # The only action may loop forever without reaching the goal
+        unsolvable = factory.from_nondeterministic_functions(
+            0, lambda state: ["Go"], lambda state, action: [0, 1],
+            lambda state: False)
+        self.assertEqual(search.and_or_search(unsolvable), problem.FAILURE)
+        self.assertEqual(search.iterative_and_or_search(unsolvable),
+                         problem.FAILURE)
+
+    def test_shared_subplans(self):
+        world = self.chain(200)
+        plan = search.and_or_search(world)
+        self.assert_plan_succeeds(world, plan)
+
+        plan = search.iterative_and_or_search(world)
+        self.assert_plan_succeeds(world, plan)
+
+    def test_deep_plan(self):
+        world = self.chain(20000)
+        plan = search.iterative_and_or_search(world)
+        self.assert_plan_succeeds(world, plan)
+
+
+class GridRoute(problem.Problem):
+    MOVES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+    def __init__(self, start, goal, size, blocked):
+        self.initial = problem.Node(start, None, None, 0)
+        self.goal = goal
+        self.size = size
+        self.blocked = blocked
+
+    def actions_iter(self, state):
+        return (move for move in GridRoute.MOVES
+                if 0 <= state[0] + move[0] < self.size and
+                0 <= state[1] + move[1] < self.size)
+
+    def predecessors_iter(self, state):
+        for move in self.actions_iter(state):
+            yield (self.result(state, move), (-move[0], -move[1]))
+
+    def step_cost(self, state, action):
+        return float("inf") if self.result(state, action) in self.blocked \
+            else 1
+
+    def result(self, state, action):
+        return (state[0] + action[0], state[1] + action[1])
+
+    def goal_test(self, state):
+        return state == self.goal
+
+
+def grid_distance(first, second):
+    return abs(first[0] - second[0]) + abs(first[1] - second[1])
+
+
+class DStarLiteTests(unittest.TestCase):
+    def assert_optimal(self, route, plan):
+        # A fresh search on the current grid gives the optimal cost
+        expected = search.DStarLite(route, route.goal, grid_distance).plan()
+        if expected == problem.FAILURE:
+            self.assertEqual(plan, problem.FAILURE)
+            return
+        self.assertNotEqual(plan, problem.FAILURE)
+        self.assertEqual(plan[0][0], route.initial.state)
+        self.assertEqual(plan[-1][0], route.goal)
+        self.assertEqual(len(plan), len(expected))
+        for state, _ in plan:
+            self.assertNotIn(state, route.blocked)
+
+    def test_plan(self):
+        wall = {(row, 5) for row in range(9)}
+        route = GridRoute((0, 0), (0, 9), 10, wall)
+        plan = search.DStarLite(route, route.goal, grid_distance).plan()
+        self.assertEqual(route.solution_cost(plan), 27)
+
+        route.blocked = wall | {(9, 5)}
+        plan = search.DStarLite(route, route.goal, grid_distance).plan()
+        self.assertEqual(plan, problem.FAILURE)
+
+    def test_replanning(self):
+        generator = random.Random(7)
+        size = 12
+        route = GridRoute((0, 0), (size - 1, size - 1), size, set())
+        planner = search.DStarLite(route, route.goal, grid_distance)
+        position = route.initial.state
+        while position != route.goal:
+            plan = planner.plan()
+            self.assert_optimal(route, plan)
+            if plan == problem.FAILURE:
+                break
+
+            # Toggle some cells, then take a step along the plan
+            changed = set()
+            for _ in range(5):
+                cell = (generator.randrange(size), generator.randrange(size))
+                if cell not in (position, route.goal):
+                    changed.add(cell)
+            route.blocked = route.blocked ^ changed
+            planner.update(changed)
+
+            next_state = plan[1][0]
+            if next_state not in route.blocked:
+                position = next_state
+                route.initial = problem.Node(position, None, None, 0)
+                planner.move_to(position)
+
+
+class AlphaBetaTests(unittest.TestCase):
+    def minimax_value(self, game, state, player):
+        if game.terminal_test(state):
+            return game.utility(state, player)
+        values = (self.minimax_value(game, game.result(state, action), player)
+                  for action in game.actions_iter(state))
+        return max(values) if game.to_move(state) == player else min(values)
+
+    def test_tictactoe_self_play_draws(self):
+        game = problem.ProblemFactory().from_tictactoe()
+        state = game.initial
+        while not game.terminal_test(state):
+            state = game.result(state, search.alpha_beta_search(game, state))
+        self.assertEqual(game.utility(state, "X"), 0)
+
+    def test_tictactoe_optimal_moves(self):
+        game = problem.ProblemFactory().from_tictactoe()
+        states = [
+            ("X", "X", "-", "O", "O", "-", "-", "-", "-"),
+            ("X", "-", "-", "-", "O", "-", "-", "-", "X"),
+            ("X", "O", "-", "-", "-", "-", "-", "-", "-"),
+            ("-", "-", "-", "-", "X", "-", "-", "-", "-"),
+        ]
+        for state in states:
+            player = game.to_move(state)
+            best = self.minimax_value(game, state, player)
+            action = search.alpha_beta_search(game, state)
+            child = game.result(state, action)
+            self.assertEqual(self.minimax_value(game, child, player), best)
+
+    def test_connect_four_takes_win(self):
+        game = problem.ProblemFactory().from_connect_four()
+        state = game.initial
+        for column in (3, 0, 3, 0, 3, 1):
+            state = game.result(state, column)
+        action = search.alpha_beta_search(game, state, time_limit=1)
+        self.assertEqual(action, 3)
+
+    def test_connect_four_blocks(self):
+        game = problem.ProblemFactory().from_connect_four()
+        state = game.initial
+        for column in (0, 3, 0, 4, 6, 5):
+            state = game.result(state, column)
+        action = search.alpha_beta_search(game, state, max_depth=4)
+        self.assertEqual(action, 2)
+
+    def test_incremental_zobrist_keys(self):
+        game = problem.ProblemFactory().from_connect_four()
+        engine = search._AlphaBeta(game, 1, float("inf"))
+        state = game.initial
+        key = engine.zobrist_key(state)
+        generator = random.Random(3)
+        while not game.terminal_test(state):
+            action = generator.choice(list(game.actions_iter(state)))
+            child = game.result(state, action)
+            key = engine.child_key(key, state, action, child)
+            state = child
+            self.assertEqual(key, engine.zobrist_key(state))
+
+    def test_time_budget(self):
+        game = problem.ProblemFactory().from_connect_four()
+        action = search.alpha_beta_search(game, game.initial, time_limit=0.2)
+        self.assertIn(action, range(7))
+
+
+class Interrupting:
+    # Raises after a number of calls to simulate a crashed process. The
+    # countdown lives on the class so that it is not part of checkpoints.
+    remaining_calls = None
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args):
+        if Interrupting.remaining_calls is not None:
+            if Interrupting.remaining_calls == 0:
+                raise KeyboardInterrupt()
+            Interrupting.remaining_calls -= 1
+        return self.func(*args)
+
+
+def nqueens_state(size):
+    return problem.ProblemFactory().from_nqueens(size).initial.state
+
+
+def nqueens_fitness(state):
+    return sum(range(len(state))) - problem._NQueensProblem.attacking(state)
+
+
+def nqueens_reproduce(father, mother, crossover):
+    return tuple(father[i] if i < crossover else mother[i]
+                 for i in range(len(father)))
+
+
+def nqueens_mutate(state):
+    column = random.randint(0, len(state) - 1)
+    row = random.randint(0, len(state) - 1)
+    return tuple(state[i] if i != column else row for i in range(len(state)))
+
+
+class CheckpointTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "search.ckp")
+
+    def tearDown(self):
+        Interrupting.remaining_calls = None
+        shutil.rmtree(self.directory)
+
+    def interrupt(self, calls, search_call):
+        Interrupting.remaining_calls = calls
+        self.assertRaises(KeyboardInterrupt, search_call)
+        Interrupting.remaining_calls = None
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_astar_resume(self):
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_npuzzle("4 2 5 3 6 8 1 7 0",
+                                                "0 1 2 3 4 5 6 7 8")
+        heuristic = Interrupting(factory.heuristic_for(problem_instance))
+        expected = search.astar(problem_instance, heuristic)
+
+        search_call = functools.partial(search.astar, problem_instance,
+                                        heuristic, checkpoint_path=self.path,
+                                        checkpoint_interval=0)
+        self.interrupt(100, search_call)
+        self.assertEqual(search.resume(self.path), expected)
+
+    def test_genetic_resume(self):
+        size = 6
+        fitness = Interrupting(nqueens_fitness)
+        # A generation cap keeps the per-generation checkpoints cheap
+        arguments = (functools.partial(nqueens_state, size), fitness,
+                     sum(range(size)), nqueens_reproduce, nqueens_mutate,
+                     10, 20)
+
+        random.seed(42)
+        expected = search.genetic(*arguments)
+
+        random.seed(42)
+        search_call = functools.partial(search.genetic, *arguments,
+                                        checkpoint_path=self.path,
+                                        checkpoint_interval=0)
+        self.interrupt(25, search_call)
+        self.assertEqual(search.resume(self.path), expected)
+
+    def test_unpicklable_arguments(self):
+        factory = problem.ProblemFactory()
+        problem_instance = factory.from_functions(0, lambda state: [1],
+                                                  lambda state, action: 1,
+                                                  lambda state, action: 1,
+                                                  lambda state: state == 1)
+        self.assertRaises(utils.InvalidArgumentError, search.astar,
+                          problem_instance, lambda state: 0,
+                          checkpoint_path=self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_invalid_checkpoint(self):
+        with open(self.path, "wb") as file:
+            file.write(b"definitely not a checkpoint")
+        self.assertRaises(utils.InvalidArgumentError, search.resume, self.path)
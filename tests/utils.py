@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+from adder import utils
+
+
+class LruCacheTests(unittest.TestCase):
+    def test_eviction_order(self):
+        cache = utils.LruCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (1, 0, 1))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.misses, 1)
+
+    def test_invalid_size(self):
+        self.assertRaises(utils.InvalidArgumentError, utils.LruCache, 0)
+
+
+class MemoizeTests(unittest.TestCase):
+    def test_none_is_cached(self):
+        calls = []
+
+        @utils.memoize
+        def nothing(arg):
+            calls.append(arg)
+            return None
+
+        self.assertIsNone(nothing(1))
+        self.assertIsNone(nothing(1))
+        self.assertEqual(calls, [1])
+        self.assertEqual(nothing.cache.hits, 1)
+
+    def test_multiple_arguments(self):
+        @utils.memoize(max_size=2)
+        def add(first, second, third=0):
+            return first + second + third
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(add(2, 1), 3)
+        self.assertEqual(add(1, 2, third=3), 6)
+        self.assertEqual(add.cache.misses, 3)
+        self.assertEqual(add.cache.evictions, 1)
+        self.assertEqual(add(1, 2, third=3), 6)
+        self.assertEqual(add.cache.hits, 1)
+
+    def test_registry(self):
+        @utils.memoize
+        def square(x):
+            return x * x
+
+        square(3)
+        self.assertIn(square, utils.memoized_functions())
+        utils.clear_memoized()
+        self.assertEqual(len(square.cache), 0)
+        self.assertEqual(square.__name__, "square")
+
+    def test_threads(self):
+        @utils.memoize(max_size=64)
+        def identity(x):
+            return x
+
+        def worker():
+            for i in range(1000):
+                self.assertEqual(identity(i % 100), i % 100)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(identity.cache), 64)
+        cache = identity.cache
+        self.assertEqual(cache.hits + cache.misses, 4000)